@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AcceuilConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'acceuil'
+
+    def ready(self) -> None:
+        """Branche l'invalidation du cache des pages detail."""
+        from . import signals  # noqa: F401
@@ -2,13 +2,30 @@
 
 from __future__ import annotations
 
+import hashlib
+import json
+import re
+import uuid
+from collections.abc import Iterable, Sequence
+from datetime import datetime
 from typing import Any
 
-from django.db.models import Avg, Count, Prefetch
-from django.http import Http404
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db.models import Prefetch, QuerySet, prefetch_related_objects
+from django.http import Http404, HttpRequest
+from django.middleware.csrf import get_token
+from django.template.defaultfilters import truncatechars
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import SafeString, mark_safe
+from django.utils.timesince import timesince
 
 from annonces.models import ImageProduit, Produit
-from profil.models import AvisConfiance, ProfilUtilisateur
+from kzone.routers import lecture_replica
+from profil.models import ProfilUtilisateur
 
 
 class AnnonceDetailService:
@@ -21,13 +38,30 @@ class AnnonceDetailService:
     }
 
     @staticmethod
+    @lecture_replica()
     def get_detail_context(*, produit_id: int) -> dict[str, Any]:
         """Retourne le contexte complet de la page detail annonce."""
-        produit = (
+        return AnnonceDetailService._construire_contexte(
+            AnnonceDetailService._requete_produit(produit_id).first()
+        )
+
+    @staticmethod
+    async def aget_detail_context(*, produit_id: int) -> dict[str, Any]:
+        """Variante asynchrone de ``get_detail_context`` (ORM asynchrone)."""
+        with lecture_replica():
+            produit = await AnnonceDetailService._requete_produit(produit_id).afirst()
+        return AnnonceDetailService._construire_contexte(produit)
+
+    @staticmethod
+    def _requete_produit(produit_id: int) -> QuerySet[Produit]:
+        """Produit de la page detail et tout ce qu'elle affiche."""
+        # Une jointure pour le produit, le vendeur, son profil (reputation
+        # denormalisee comprise) et sa localisation; une requete pour les images.
+        return (
             Produit.objects.select_related(
                 "categorie",
                 "lieu_vente",
-                "vendeur",
+                "vendeur__profil_utilisateur__localisation_defaut",
                 "produit_agricole",
                 "produit_retail",
             )
@@ -35,19 +69,16 @@ class AnnonceDetailService:
                 Prefetch("images", queryset=ImageProduit.objects.order_by("ordre", "id"))
             )
             .filter(id=produit_id)
-            .first()
         )
+
+    @staticmethod
+    def _construire_contexte(produit: Produit | None) -> dict[str, Any]:
+        """Contexte de la page a partir du produit charge, sans requete SQL."""
         if produit is None:
             raise Http404("Annonce introuvable.")
 
-        profil_vendeur = ProfilUtilisateur.objects.select_related("localisation_defaut").filter(
-            utilisateur=produit.vendeur
-        ).first()
-        reputation = AvisConfiance.objects.filter(cible=produit.vendeur).aggregate(
-            note_moyenne=Avg("note"),
-            total_avis=Count("id"),
-        )
-        note_moyenne = float(reputation["note_moyenne"] or 0)
+        profil_vendeur = getattr(produit.vendeur, "profil_utilisateur", None)
+        note_moyenne = profil_vendeur.note_moyenne if profil_vendeur else 0.0
         etoiles_pleines = int(round(note_moyenne))
         numero_contact_vendeur = (
             profil_vendeur.numero_paiement.strip()
@@ -73,12 +104,319 @@ class AnnonceDetailService:
                 else produit.lieu_vente.ville
             ),
             "note_moyenne": round(note_moyenne, 2),
-            "total_avis": int(reputation["total_avis"] or 0),
+            "total_avis": profil_vendeur.total_avis if profil_vendeur else 0,
             "etoiles": [index < etoiles_pleines for index in range(5)],
             "membre_depuis": produit.vendeur.date_joined.year,
+            "maj_depuis": CachePageDetail.SENTINELLE_MAJ,
             "numero_contact_disponible": bool(numero_contact_vendeur),
             "statut_badge_class": AnnonceDetailService.STATUT_STYLES.get(
                 produit.statut, "text-bg-light"
             ),
         }
 
+
+class CachePageDetail:
+    """Cache des pages detail rendues pour les visiteurs anonymes.
+
+    Une entree par produit, supprimee par les signaux de l'application quand
+    le produit, ses images, son vendeur ou son profil changent. Les libelles
+    partages (categories, localisations) invalident toutes les pages d'un coup
+    via une generation commune lue dans le meme aller-retour. Le jeton CSRF et
+    la duree "Mis a jour il y a" sont remplaces par des sentinelles et
+    substitues a chaque reponse. Ces suppressions ne sont vues par tous les
+    workers qu'avec un cache partage: le cache n'est actif qu'avec
+    ``CACHE_PARTAGE``.
+    """
+
+    PREFIXE = "catalogue:page_detail"
+    CLE_GENERATION = "catalogue:page_detail:generation"
+    VERSION_GABARIT = 1
+    SENTINELLE_CSRF = "__KZONE_CSRF__"
+    SENTINELLE_MAJ = "__KZONE_MAJ_DEPUIS__"
+    CHAMP_CSRF = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+    @staticmethod
+    def cle(produit_id: int) -> str:
+        """Cle de cache de la page d'un produit."""
+        return f"{CachePageDetail.PREFIXE}:v{CachePageDetail.VERSION_GABARIT}:{produit_id}"
+
+    @staticmethod
+    def est_cacheable(request: HttpRequest) -> bool:
+        """Seules les pages identiques pour tous les anonymes sont mises en cache."""
+        return (
+            settings.CACHE_PARTAGE
+            and request.method == "GET"
+            and not request.GET
+            and not request.user.is_authenticated
+            and not len(messages.get_messages(request))
+        )
+
+    @staticmethod
+    def lire(produit_id: int) -> dict[str, Any] | None:
+        """Retourne l'entree en cache si elle appartient a la generation courante."""
+        cle = CachePageDetail.cle(produit_id)
+        return CachePageDetail._valider(cle, cache.get_many([cle, CachePageDetail.CLE_GENERATION]))
+
+    @staticmethod
+    async def alire(produit_id: int) -> dict[str, Any] | None:
+        """Variante asynchrone de ``lire``."""
+        cle = CachePageDetail.cle(produit_id)
+        return CachePageDetail._valider(
+            cle, await cache.aget_many([cle, CachePageDetail.CLE_GENERATION])
+        )
+
+    @staticmethod
+    def _valider(cle: str, valeurs: dict[str, Any]) -> dict[str, Any] | None:
+        """Ecarte une entree absente ou d'une generation perimee."""
+        entree = valeurs.get(cle)
+        if entree is None or entree["generation"] != valeurs.get(CachePageDetail.CLE_GENERATION):
+            return None
+        return entree
+
+    @staticmethod
+    def ecrire(produit_id: int, html: str, mise_a_jour: datetime) -> None:
+        """Memorise une page rendue avec sentinelles."""
+        cache.set(
+            CachePageDetail.cle(produit_id),
+            {
+                "html": CachePageDetail.CHAMP_CSRF.sub(
+                    rf"\g<1>{CachePageDetail.SENTINELLE_CSRF}\g<2>", html
+                ),
+                "mise_a_jour": mise_a_jour,
+                "generation": cache.get(CachePageDetail.CLE_GENERATION),
+            },
+        )
+
+    @staticmethod
+    def personnaliser(html: str, mise_a_jour: datetime, request: HttpRequest) -> str:
+        """Substitue le jeton CSRF du visiteur et la duree depuis la mise a jour."""
+        return html.replace(CachePageDetail.SENTINELLE_CSRF, get_token(request)).replace(
+            CachePageDetail.SENTINELLE_MAJ, escape(timesince(mise_a_jour))
+        )
+
+    @staticmethod
+    def invalider(produit_ids: Iterable[int]) -> None:
+        """Supprime les pages des produits donnes."""
+        cache.delete_many([CachePageDetail.cle(produit_id) for produit_id in produit_ids])
+
+    @staticmethod
+    def invalider_tout() -> None:
+        """Change la generation: toutes les pages deja en cache sont ignorees."""
+        cache.set(CachePageDetail.CLE_GENERATION, uuid.uuid4().hex, None)
+
+
+class CarteProduitService:
+    """Rend les cartes produit du catalogue depuis un cache de fragments HTML.
+
+    Une carte ne change que si le produit est modifie (``date_mise_a_jour``),
+    si son jeu d'images change (``version_images``) ou si un libelle lie
+    affiche sur la carte change (signature). La duree relative "Maj il y a"
+    est substituee a chaque rendu pour que le fragment reste valide dans le
+    temps.
+    """
+
+    TEMPLATE = "acceuil/partials/catalog_product_card.html"
+    VERSION_GABARIT = 3
+    SENTINELLE_MAJ = "__KZONE_MAJ_DEPUIS__"
+
+    @staticmethod
+    def rendre_cartes(
+        produits: Sequence[Produit], request: HttpRequest | None = None
+    ) -> SafeString:
+        """Retourne le HTML des cartes, en un aller-retour cache et un rendu par absente."""
+        if not produits:
+            return mark_safe("")
+        cles = {produit.id: CarteProduitService.cle_cache(produit) for produit in produits}
+        fragments = cache.get_many(list(cles.values()))
+
+        manquants = [produit for produit in produits if cles[produit.id] not in fragments]
+        if manquants:
+            CarteProduitService.precharger_images(manquants)
+            nouveaux = {
+                cles[produit.id]: CarteProduitService._rendre_carte(produit, request)
+                for produit in manquants
+            }
+            cache.set_many(nouveaux)
+            fragments.update(nouveaux)
+
+        return mark_safe(
+            "".join(
+                fragments[cles[produit.id]].replace(
+                    CarteProduitService.SENTINELLE_MAJ,
+                    escape(timesince(produit.date_mise_a_jour or produit.date_creation)),
+                )
+                for produit in produits
+            )
+        )
+
+    @staticmethod
+    def cle_cache(produit: Produit) -> str:
+        """Construit la cle de la carte: id, version du produit, des images et des libelles."""
+        horodatage = (produit.date_mise_a_jour or produit.date_creation).timestamp()
+        return (
+            f"catalogue:carte:v{CarteProduitService.VERSION_GABARIT}:{produit.id}:"
+            f"{horodatage:.6f}:{produit.version_images}:{CarteProduitService._signature(produit)}"
+        )
+
+    @staticmethod
+    def _signature(produit: Produit) -> str:
+        """Empreinte des donnees liees affichees par la carte (deja chargees par jointure)."""
+        produit_retail = getattr(produit, "produit_retail", None)
+        produit_agricole = getattr(produit, "produit_agricole", None)
+        valeurs = (
+            CarteProduitService._type_vendeur(produit),
+            "{:.1f}/{}".format(*CarteProduitService._reputation(produit)),
+            produit.categorie.nom,
+            produit.lieu_vente.ville,
+            produit.lieu_vente.quartier,
+            produit_retail.etat if produit_retail else "",
+            produit_agricole.region_origine if produit_agricole else "",
+        )
+        return hashlib.md5("\x1f".join(valeurs).encode("utf-8"), usedforsecurity=False).hexdigest()[:12]
+
+    @staticmethod
+    def precharger_images(produits: Sequence[Produit]) -> None:
+        """Precharge en une requete les images des produits qui ne viennent pas d'une carte."""
+        prefetch_related_objects(
+            [produit for produit in produits if not hasattr(produit, "images_carte")],
+            Prefetch("images", queryset=ImageProduit.objects.order_by("ordre", "id")),
+        )
+
+    @staticmethod
+    def images(produit: Produit) -> list[Any]:
+        """Images affichees: resolues par le modele de lecture, sinon prechargees."""
+        images = getattr(produit, "images_carte", None)
+        return images if images is not None else list(produit.images.all())
+
+    @staticmethod
+    def _type_vendeur(produit: Produit) -> str:
+        """Retourne le type du vendeur, vide si le vendeur n'a pas de profil."""
+        profil = getattr(produit.vendeur, "profil_utilisateur", None)
+        return profil.type_vendeur if profil else ""
+
+    @staticmethod
+    def _reputation(produit: Produit) -> tuple[float, int]:
+        """Retourne (note moyenne, nombre d'avis) du vendeur, lus sur son profil."""
+        profil = getattr(produit.vendeur, "profil_utilisateur", None)
+        return (profil.note_moyenne, profil.total_avis) if profil else (0.0, 0)
+
+    @staticmethod
+    def _rendre_carte(produit: Produit, request: HttpRequest | None) -> str:
+        """Rend une carte avec la duree relative remplacee par la sentinelle."""
+        return render_to_string(
+            CarteProduitService.TEMPLATE,
+            context={
+                "produit": produit,
+                "images": CarteProduitService.images(produit),
+                "type_vendeur": CarteProduitService._type_vendeur(produit),
+                "reputation": CarteProduitService._reputation(produit),
+                "maj_depuis": CarteProduitService.SENTINELLE_MAJ,
+            },
+            request=request,
+        )
+
+
+class CatalogueDonneesService:
+    """Construit la reponse compacte ``format=data`` du catalogue.
+
+    Le client rend lui-meme les cartes et les compteurs. Il annonce les cartes
+    qu'il detient (``connus``: jetons ``id.rev``) et la revision des facettes
+    deja affichees (``facettes_rev``): seules les cartes inconnues et les
+    facettes modifiees sont renvoyees.
+    """
+
+    CONNUS_MAX = 240
+
+    @staticmethod
+    def construire(
+        context: dict[str, Any], params: dict[str, Any], avec_facettes: bool = True
+    ) -> dict[str, Any]:
+        """Retourne la charge utile JSON compacte d'une page de catalogue."""
+        connus = CatalogueDonneesService.parse_connus(params.get("connus"))
+        produits = context["produits"]
+        revisions = {produit.id: CatalogueDonneesService.revision(produit) for produit in produits}
+        nouveaux = [produit for produit in produits if f"{produit.id}.{revisions[produit.id]}" not in connus]
+        CarteProduitService.precharger_images(nouveaux)
+
+        donnees: dict[str, Any] = {
+            "curseur": context["curseur_suivant"],
+            "produits": [[produit.id, revisions[produit.id]] for produit in produits],
+            "cartes": {
+                produit.id: CatalogueDonneesService._champs_carte(produit) for produit in nouveaux
+            },
+        }
+        if not avec_facettes:
+            return donnees
+
+        facettes = CatalogueDonneesService._facettes(context)
+        revision_facettes = hashlib.md5(
+            json.dumps(facettes, sort_keys=True).encode("utf-8"), usedforsecurity=False
+        ).hexdigest()[:12]
+        donnees["total"] = context["total_produits"]
+        donnees["facettes_rev"] = revision_facettes
+        donnees["facettes"] = None if params.get("facettes_rev") == revision_facettes else facettes
+        return donnees
+
+    @staticmethod
+    def parse_connus(valeur: str | None) -> set[str]:
+        """Decoupe la liste des jetons ``id.rev`` annonces par le client."""
+        jetons = (valeur or "").split(",")[: CatalogueDonneesService.CONNUS_MAX]
+        return {jeton.strip() for jeton in jetons if jeton.strip()}
+
+    @staticmethod
+    def revision(produit: Produit) -> str:
+        """Revision courte d'une carte, alignee sur la cle du cache de fragments."""
+        cle = CarteProduitService.cle_cache(produit)
+        return hashlib.md5(cle.encode("utf-8"), usedforsecurity=False).hexdigest()[:8]
+
+    @staticmethod
+    def _champs_carte(produit: Produit) -> dict[str, Any]:
+        """Champs affiches par une carte produit."""
+        produit_retail = getattr(produit, "produit_retail", None)
+        produit_agricole = getattr(produit, "produit_agricole", None)
+        note, total_avis = CarteProduitService._reputation(produit)
+        return {
+            "titre": produit.titre,
+            "prix": f"{produit.prix:.0f}",
+            "lieu": f"{produit.lieu_vente.ville}, {produit.lieu_vente.quartier}",
+            "maj": (produit.date_mise_a_jour or produit.date_creation).isoformat(),
+            "description": truncatechars(produit.description, 70) if produit.description else "",
+            "categorie": produit.categorie.nom,
+            "pro": CarteProduitService._type_vendeur(produit)
+            == ProfilUtilisateur.TypeVendeurChoices.PROFESSIONNEL,
+            "reputation": [round(note, 1), total_avis] if total_avis else None,
+            "detail": produit_retail.etat.title()
+            if produit_retail
+            else (produit_agricole.region_origine if produit_agricole else ""),
+            "images": [
+                [image.url_affichage, image.srcset_webp, image.srcset_jpeg]
+                for image in CarteProduitService.images(produit)
+            ],
+            "url": reverse("acceuil:annonce_detail", args=[produit.id]),
+        }
+
+    @staticmethod
+    def _facettes(context: dict[str, Any]) -> dict[str, Any]:
+        """Comptes des facettes et categories actives, en listes [valeur, total]."""
+        categories, actives = [], []
+        for parent in context["categories_sidebar"]:
+            for element in [parent, *parent["children"]]:
+                categories.append([element["categorie"].slug, element["count"]])
+                if element["is_active"]:
+                    actives.append(element["categorie"].slug)
+        return {
+            "categories": categories,
+            "actives": actives,
+            "region": [[option["valeur"], option["total"]] for option in context["regions"]],
+            "ville": [[option["valeur"], option["total"]] for option in context["villes"]],
+            "etat": (
+                [[option["valeur"], option["total"]] for option in context["etat_options"]]
+                if context["show_retail_filters"]
+                else None
+            ),
+            "region_origine": (
+                [[option["valeur"], option["total"]] for option in context["region_origine_options"]]
+                if context["show_agricole_filters"]
+                else None
+            ),
+        }
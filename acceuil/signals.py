@@ -0,0 +1,71 @@
+"""Invalidation du cache des pages detail apres les ecritures qui s'y affichent.
+
+Les suppressions de cache attendent la validation de la transaction: un
+lecteur concurrent ne peut pas remettre en cache l'etat precedent.
+"""
+
+from __future__ import annotations
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from annonces.models import Produit
+
+from .services import CachePageDetail
+
+User = get_user_model()
+
+
+def _invalider_produits_vendeurs(*vendeur_ids: int | None) -> None:
+    """Invalide les pages de tous les produits des vendeurs donnes."""
+    ids = [vendeur_id for vendeur_id in vendeur_ids if vendeur_id is not None]
+    if ids:
+        produit_ids = list(Produit.objects.filter(vendeur_id__in=ids).values_list("id", flat=True))
+        transaction.on_commit(lambda: CachePageDetail.invalider(produit_ids))
+
+
+def invalider_page_produit(sender, instance, raw: bool = False, **kwargs) -> None:
+    """Produit ou donnee rattachee modifie: invalide sa page."""
+    if raw:
+        return
+    produit_id = instance.pk if sender is Produit else instance.produit_id
+    transaction.on_commit(lambda: CachePageDetail.invalider([produit_id]))
+
+
+def invalider_pages_vendeur(sender, instance, raw: bool = False, update_fields=None, **kwargs) -> None:
+    """Vendeur ou profil modifie: invalide les pages de ses produits."""
+    if raw or (sender is User and update_fields is not None and set(update_fields) <= {"last_login"}):
+        return
+    _invalider_produits_vendeurs(instance.pk if sender is User else instance.utilisateur_id)
+
+
+def invalider_pages_reputation(sender, instance, raw: bool = False, **kwargs) -> None:
+    """Avis modifie: la reputation affichee de la cible (et de l'ancienne cible) change."""
+    if raw:
+        return
+    initial = getattr(instance, "_avis_initial", None)
+    _invalider_produits_vendeurs(instance.cible_id, initial[0] if initial else None)
+
+
+def invalider_toutes_les_pages(sender, raw: bool = False, **kwargs) -> None:
+    """Libelle partage modifie (categorie, localisation): invalide toutes les pages."""
+    if not raw:
+        transaction.on_commit(CachePageDetail.invalider_tout)
+
+
+INVALIDATIONS = (
+    (
+        invalider_page_produit,
+        ("catalogue.Produit", "catalogue.ImageProduit", "catalogue.ProduitRetail", "catalogue.ProduitAgricole"),
+    ),
+    (invalider_pages_vendeur, (User, "profil.ProfilUtilisateur")),
+    (invalider_pages_reputation, ("profil.AvisConfiance",)),
+    (invalider_toutes_les_pages, ("catalogue.Categorie", "catalogue.Localisation")),
+)
+
+for receveur, modeles in INVALIDATIONS:
+    for modele in modeles:
+        nom = modele if isinstance(modele, str) else modele._meta.label
+        post_save.connect(receveur, sender=modele, dispatch_uid=f"acceuil_page_detail_{nom}_save")
+        post_delete.connect(receveur, sender=modele, dispatch_uid=f"acceuil_page_detail_{nom}_delete")
@@ -39,12 +39,26 @@
             }
             this.$mainImage.attr("src", imageUrl);
             this.$mainImage.attr("alt", imageAlt);
+            this.$mainImage.attr("data-image-original", $button.data("image-original") || imageUrl);
+            this.setSrcset(this.$mainImage, $button.data("image-srcset"));
+            this.setSrcset($("#annonce-main-image-webp"), $button.data("image-srcset-webp"));
             $(".js-detail-thumb").removeClass("is-active");
             $button.addClass("is-active");
         },
 
+        setSrcset: function ($element, srcset) {
+            if (srcset) {
+                $element.attr("srcset", srcset);
+            } else {
+                $element.removeAttr("srcset");
+            }
+        },
+
         handleFullscreenOpen: function () {
-            this.$fullscreenImage.attr("src", this.$mainImage.attr("src"));
+            this.$fullscreenImage.attr(
+                "src",
+                this.$mainImage.attr("data-image-original") || this.$mainImage.attr("src")
+            );
             this.$fullscreenImage.attr("alt", this.$mainImage.attr("alt"));
         },
 
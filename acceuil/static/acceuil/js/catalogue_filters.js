@@ -8,10 +8,18 @@
             this.$container = $("section[data-filter-url]");
             this.filterUrl = this.$container.data("filter-url");
             this.favoritesStorageKey = "kzone_favorites";
+            this.isLoadingPage = false;
+            this.cardCache = {};
+            this.cardCacheOrder = [];
+            this.cardCacheLimit = 240;
+            this.facetsRevision = "";
+            this.localisations = null;
             this.bindEvents();
+            this.loadLocalisations();
             this.setupCsrfForAjax();
             this.syncFavoriteButtons();
             this.reinitCarousels();
+            this.setupInfiniteScroll();
         },
 
         bindEvents: function () {
@@ -35,10 +43,41 @@
             this.fetchAndRender();
         },
 
-        handleAutoFilter: function () {
+        handleAutoFilter: function (event) {
+            if (event.target.id === "catalog-region") {
+                this.syncCitiesWithRegion();
+            }
             this.fetchAndRender();
         },
 
+        loadLocalisations: function () {
+            // URL a empreinte: le navigateur sert l'arbre depuis son cache.
+            var self = this;
+            var url = this.$form.data("localisations-url");
+            if (!url) {
+                return;
+            }
+            $.ajax({url: url, dataType: "json", cache: true}).done(function (tree) {
+                self.localisations = tree;
+            });
+        },
+
+        syncCitiesWithRegion: function () {
+            // Les villes de la region choisie s'affichent sans attendre les facettes.
+            var region = $("#catalog-region").val() || "";
+            if (!this.localisations || !region) {
+                return;
+            }
+            var cities = Object.keys(this.localisations[region] || {});
+            var $city = $("#catalog-city");
+            if (cities.indexOf($city.val() || "") === -1) {
+                $city.val("");
+            }
+            this.renderOptions($city, "Toutes les villes", cities.map(function (city) {
+                return [city, null];
+            }));
+        },
+
         handleCategoryClick: function (event) {
             event.preventDefault();
             var slug = $(event.currentTarget).data("category-slug") || "";
@@ -46,20 +85,28 @@
             this.fetchAndRender();
         },
 
+        buildDataQuery: function (extra) {
+            return this.$form.serialize() + "&format=data&connus=" +
+                encodeURIComponent(this.cardCacheOrder.join(",")) + (extra || "");
+        },
+
         fetchAndRender: function () {
             var self = this;
             $.ajax({
                 url: this.filterUrl,
                 method: "GET",
-                data: this.$form.serialize(),
+                data: this.buildDataQuery("&facettes_rev=" + encodeURIComponent(this.facetsRevision)),
                 success: function (response) {
-                    $("#catalog-sidebar").html(response.sidebar_html);
-                    $("#catalog-products").html(response.products_html);
-                    $("#catalog-context-filters").html(response.context_filters_html);
-                    $("#catalog-city").html(response.city_options_html);
-                    $("#catalog-result-count").text(response.total_produits + " produits");
+                    if (response.facettes) {
+                        self.renderFacets(response.facettes);
+                    }
+                    self.facetsRevision = response.facettes_rev || "";
+                    $("#catalog-products-grid").empty();
+                    self.renderCards(response);
+                    $("#catalog-result-count").text(response.total + " produits");
                     self.syncFavoriteButtons();
                     self.reinitCarousels();
+                    self.observeSentinel();
                 },
                 error: function () {
                     self.showTemporaryError();
@@ -67,6 +114,239 @@
             });
         },
 
+        setupInfiniteScroll: function () {
+            if (!("IntersectionObserver" in window)) {
+                return;
+            }
+            this.sentinelObserver = new IntersectionObserver(this.handleSentinelVisible.bind(this), {
+                rootMargin: "600px 0px"
+            });
+            this.observeSentinel();
+        },
+
+        observeSentinel: function () {
+            if (!this.sentinelObserver) {
+                return;
+            }
+            this.sentinelObserver.disconnect();
+            var sentinel = document.getElementById("catalog-products-sentinel");
+            if (sentinel) {
+                this.sentinelObserver.observe(sentinel);
+            }
+        },
+
+        handleSentinelVisible: function (entries) {
+            var isVisible = entries.some(function (entry) {
+                return entry.isIntersecting;
+            });
+            if (isVisible) {
+                this.fetchNextPage();
+            }
+        },
+
+        fetchNextPage: function () {
+            var self = this;
+            var $sentinel = $("#catalog-products-sentinel");
+            var cursor = $sentinel.attr("data-next-cursor") || "";
+            if (!cursor || this.isLoadingPage) {
+                return;
+            }
+
+            this.isLoadingPage = true;
+            $.ajax({
+                url: this.filterUrl,
+                method: "GET",
+                data: this.buildDataQuery("&mode=page&curseur=" + encodeURIComponent(cursor)),
+                success: function (response) {
+                    self.renderCards(response);
+                    self.syncFavoriteButtons();
+                    self.reinitCarousels();
+                },
+                error: function () {
+                    self.showTemporaryError();
+                },
+                complete: function () {
+                    self.isLoadingPage = false;
+                    self.observeSentinel();
+                }
+            });
+        },
+
+        renderCards: function (response) {
+            var self = this;
+            var $grid = $("#catalog-products-grid");
+            $grid.find(".js-catalog-empty").remove();
+            $.each(response.produits, function (index, entry) {
+                var token = entry[0] + "." + entry[1];
+                var card = response.cartes[entry[0]] || self.cardCache[token];
+                if (!card) {
+                    return;
+                }
+                self.rememberCard(token, card);
+                $grid.append(self.buildCard(entry[0], card));
+            });
+            if ($grid.children().length === 0) {
+                $grid.append(
+                    $("<div class='col-12 js-catalog-empty'>").append(
+                        $("<div class='alert alert-light border mb-0'>").text("Aucun produit ne correspond aux filtres selectionnes.")
+                    )
+                );
+            }
+            var $sentinel = $("#catalog-products-sentinel");
+            $sentinel.attr("data-next-cursor", response.curseur || "");
+            $sentinel.toggleClass("d-none", !response.curseur);
+        },
+
+        rememberCard: function (token, card) {
+            if (!this.cardCache[token]) {
+                this.cardCacheOrder.push(token);
+            }
+            this.cardCache[token] = card;
+            while (this.cardCacheOrder.length > this.cardCacheLimit) {
+                delete this.cardCache[this.cardCacheOrder.shift()];
+            }
+        },
+
+        buildCard: function (productId, card) {
+            var carouselId = "product-carousel-" + productId;
+            var images = card.images.length ? card.images : [["https://placehold.co/640x420/e9ecef/6c757d?text=K-Zone", "", ""]];
+            var sizes = "(min-width: 1400px) 20vw, (min-width: 992px) 25vw, 50vw";
+            var $inner = $("<div class='carousel-inner'>");
+            $.each(images, function (index, image) {
+                var $picture = $("<picture>");
+                if (image[1]) {
+                    $picture.append($("<source type='image/webp'>").attr({srcset: image[1], sizes: sizes}));
+                }
+                var $img = $("<img class='d-block w-100 home-page__product-image' loading='lazy'>").attr({
+                    src: image[0],
+                    alt: card.images.length ? card.titre : "Image par defaut"
+                });
+                if (image[2]) {
+                    $img.attr({srcset: image[2], sizes: sizes});
+                }
+                $inner.append(
+                    $("<div class='carousel-item'>").toggleClass("active", index === 0).append($picture.append($img))
+                );
+            });
+            var $carousel = $("<div class='carousel slide home-page__product-carousel' data-bs-touch='true' data-bs-interval='false'>")
+                .attr("id", carouselId)
+                .append($inner);
+            if (card.images.length > 1) {
+                $.each([["prev", "Image precedente"], ["next", "Image suivante"]], function (index, control) {
+                    $carousel.append(
+                        $("<button type='button'>")
+                            .addClass("carousel-control-" + control[0])
+                            .attr({"data-bs-target": "#" + carouselId, "data-bs-slide": control[0], "aria-label": control[1]})
+                            .append($("<span aria-hidden='true'>").addClass("carousel-control-" + control[0] + "-icon"))
+                    );
+                });
+            }
+            var $favorite = $("<button type='button' class='btn btn-light rounded-circle shadow-sm home-page__favorite-btn js-favorite-toggle' aria-label='Basculer favori' aria-pressed='false'>")
+                .attr("data-product-id", productId)
+                .append("<i class='bi bi-heart' aria-hidden='true'></i>");
+
+            var $body = $("<div class='card-body d-flex flex-column'>").append(
+                $("<div class='d-flex justify-content-between align-items-start gap-2 mb-2'>").append(
+                    $("<h3 class='h6 card-title mb-0 fw-bold'>").text(card.titre),
+                    card.pro
+                        ? $("<span class='badge text-bg-primary'>").text("Professionnel")
+                        : $("<span class='badge text-bg-light'>").text("Particulier")
+                ),
+                $("<p class='home-page__price mb-1'>").text(card.prix + " FCFA"),
+                card.reputation
+                    ? $("<p class='small mb-1'>").append(
+                        "<i class='bi bi-star-fill text-warning' aria-hidden='true'></i> ",
+                        document.createTextNode(card.reputation[0].toFixed(1) + " "),
+                        $("<span class='text-muted'>").text("(" + card.reputation[1] + " avis)")
+                    )
+                    : null,
+                $("<p class='text-muted small mb-1'>").text(card.lieu),
+                $("<p class='text-muted small mb-2'>").text("Maj il y a " + this.formatElapsed(card.maj))
+            );
+            if (card.description) {
+                $body.append($("<p class='small text-body-secondary mb-2'>").text(card.description));
+            }
+            var $footer = $("<div class='mt-auto d-flex justify-content-between align-items-center'>").append(
+                $("<span class='badge rounded-pill text-bg-light'>").text(card.categorie)
+            );
+            if (card.detail) {
+                $footer.append($("<span class='small fw-semibold'>").text(card.detail));
+            }
+            $body.append(
+                $footer,
+                $("<a class='btn btn-sm btn-outline-success mt-2'>").attr("href", card.url).text("Voir details")
+            );
+
+            return $("<div class='col-6 col-lg-4 col-xxl-3'>").append(
+                $("<article class='card h-100 border-0 shadow-sm rounded-4 overflow-hidden home-page__product-card'>").append(
+                    $("<div class='position-relative'>").append($carousel, $favorite),
+                    $body
+                )
+            );
+        },
+
+        formatElapsed: function (isoDate) {
+            var minutes = Math.max(0, Math.floor((Date.now() - new Date(isoDate).getTime()) / 60000));
+            var units = [[525600, "an", "ans"], [43200, "mois", "mois"], [1440, "jour", "jours"], [60, "heure", "heures"], [1, "minute", "minutes"]];
+            for (var i = 0; i < units.length; i += 1) {
+                var value = Math.floor(minutes / units[i][0]);
+                if (value >= 1) {
+                    return value + " " + (value > 1 ? units[i][2] : units[i][1]);
+                }
+            }
+            return "0 minutes";
+        },
+
+        renderFacets: function (facets) {
+            $.each(facets.categories, function (index, entry) {
+                $("[data-category-count='" + entry[0] + "']").text(entry[1]);
+            });
+            $(".js-category-parent").each(function () {
+                $(this).toggleClass("active", facets.actives.indexOf($(this).data("category-slug")) !== -1);
+            });
+            $(".js-category-child").each(function () {
+                var isActive = facets.actives.indexOf($(this).data("category-slug")) !== -1;
+                $(this).toggleClass("fw-bold text-success", isActive);
+            });
+            this.renderOptions($("#catalog-region"), "Toutes les regions", facets.region);
+            this.renderOptions($("#catalog-city"), "Toutes les villes", facets.ville);
+            this.renderContextFilter("etat", "catalog-retail-state", "Etat du produit (Retail)", "Tous les etats", facets.etat, true);
+            this.renderContextFilter("region_origine", "catalog-origin-region", "Region d'origine (Agricole)", "Toutes les origines", facets.region_origine, false);
+        },
+
+        renderOptions: function ($select, placeholder, options, titleCase) {
+            var selected = $select.val() || "";
+            $select.empty().append($("<option value=''>").text(placeholder));
+            $.each(options, function (index, entry) {
+                var label = titleCase ? entry[0].charAt(0).toUpperCase() + entry[0].slice(1) : entry[0];
+                $select.append(
+                    $("<option>").val(entry[0]).text(entry[1] === null ? label : label + " (" + entry[1] + ")").prop("selected", entry[0] === selected)
+                );
+            });
+        },
+
+        renderContextFilter: function (name, selectId, label, placeholder, options, titleCase) {
+            var $select = $("#" + selectId);
+            if (options === null) {
+                $select.closest(".col-md-4").remove();
+                return;
+            }
+            if ($select.length === 0) {
+                $select = $("<select class='form-select'>").attr({id: selectId, name: name});
+                var $column = $("<div class='col-md-4'>").append(
+                    $("<label class='form-label'>").attr("for", selectId).text(label),
+                    $select
+                );
+                var $row = $("#catalog-context-filters > .row");
+                if (name === "etat") {
+                    $row.prepend($column);
+                } else {
+                    $row.append($column);
+                }
+            }
+            this.renderOptions($select, placeholder, options, titleCase);
+        },
+
         handleFavoriteToggle: function (event) {
             var button = $(event.currentTarget);
             var productId = String(button.data("product-id") || "");
@@ -1,19 +1,58 @@
+import json
+import re
+import tempfile
+import threading
+from contextlib import ExitStack
+from functools import partial
+from unittest import mock
+
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.contrib.sessions.models import Session
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache
+from django.db import connection, connections
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from annonces.models import (
     Categorie,
+    ImageProduit,
     Localisation,
     Produit,
     ProduitAgricole,
     ProduitRetail,
+    VersionCatalogue,
+)
+from annonces.localisations import RegistreLocalisations
+from kzone.concurrence import en_parallele
+from kzone.database import configuration_base, configuration_replica, statistiques_connexions
+from kzone.instrumentation import BudgetRequetesDepasse, InstrumentationSQLMiddleware
+from kzone.routers import (
+    COOKIE_EPINGLAGE,
+    EpinglagePrimaireMiddleware,
+    RouteurReplica,
+    lecture_replica,
+    noter_ecriture,
+    portee_requete,
 )
 from profil.models import AvisConfiance, ProfilUtilisateur
+from .services import CachePageDetail, CarteProduitService
+from .views import (
+    AccueilView,
+    CatalogueFiltreAjaxAsyncView,
+    CatalogueFiltreAjaxView,
+    DetailAnnonceAsyncView,
+    DetailAnnonceView,
+)
 
 
-class TestFonctionnelCase(TestCase):
-    """Base de tests avec sortie concise par fonctionnalite."""
+class TraceFonctionnelle:
+    """Sortie concise par fonctionnalite, commune aux bases de tests."""
 
     def setUp(self):
         """Affiche la fonctionnalite en cours de test."""
@@ -51,12 +90,21 @@ class TestFonctionnelCase(TestCase):
         return True
 
 
+class TestFonctionnelCase(TraceFonctionnelle, TestCase):
+    """Base de tests avec sortie concise par fonctionnalite."""
+
+
+class TestFonctionnelTransactionCase(TraceFonctionnelle, TransactionTestCase):
+    """Base des tests dont les ecritures doivent etre validees (plusieurs connexions)."""
+
+
 class TestsFonctionnelsAccueil(TestFonctionnelCase):
     """Tests fonctionnels des parcours accueil et annonces."""
 
     def setUp(self):
-        """Preparation des donnees de navigation annonces."""
+        """Preparation des donnees de navigation annonces et d'un cache vide."""
         super().setUp()
+        cache.clear()
         self.url_accueil = reverse("acceuil:accueil")
         self.url_filtre_ajax = reverse("acceuil:catalogue_filtrer")
         self.vendeur = User.objects.create_user(
@@ -136,6 +184,15 @@ class TestsFonctionnelsAccueil(TestFonctionnelCase):
         self.assertIn("total_produits", response.json())
         self.assertEqual(response.json()["total_produits"], 1)
 
+    def test_filtrage_ajax_mode_page_retourne_cartes_seules(self):
+        """Chargement AJAX de la page suivante du catalogue."""
+        response = self.client.get(self.url_filtre_ajax, {"mode": "page"})
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertIn("iPhone 12", payload["products_html"])
+        self.assertNotIn("sidebar_html", payload)
+        self.assertEqual(payload["curseur_suivant"], "")
+
     def test_filtrage_region_exclut_hors_zone(self):
         """Filtrage par region exclut les annonces hors zone."""
         response = self.client.get(self.url_accueil, {"region": Localisation.RegionChoices.CENTRE})
@@ -195,3 +252,715 @@ class TestsFonctionnelsAccueil(TestFonctionnelCase):
         self.assertTrue(response.json()["ok"])
         self.assertEqual(response.json()["redirect_url"], reverse("profil:dashboard"))
 
+
+
+class TestsCacheCartesProduit(TestFonctionnelCase):
+    """Valide le cache de fragments des cartes produit."""
+
+    def setUp(self):
+        """Preparation d'un produit et d'un cache vide."""
+        super().setUp()
+        cache.clear()
+        self.url_filtre_ajax = reverse("acceuil:catalogue_filtrer")
+        vendeur = User.objects.create_user(username="alice", password="StrongPass123!")
+        self.produit = Produit.objects.create(
+            vendeur=vendeur,
+            categorie=Categorie.objects.create(nom="Telephones", slug="telephones"),
+            lieu_vente=Localisation.objects.create(
+                region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"
+            ),
+            titre="Tecno Spark",
+            prix=60000,
+        )
+
+    def _cartes_html(self) -> tuple[str, list[str]]:
+        """Retourne les cartes de la page AJAX et les requetes SQL executees."""
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(self.url_filtre_ajax, {"mode": "page"})
+        return response.json()["products_html"], [requete["sql"] for requete in requetes]
+
+    @override_settings(CATALOGUE_MOTEUR="sql")
+    def test_carte_servie_depuis_le_cache(self):
+        """Second rendu sans chargement des images."""
+        premier_html, premieres = self._cartes_html()
+        second_html, secondes = self._cartes_html()
+        self.assertEqual(premier_html, second_html)
+        self.assertTrue(any("catalogue_imageproduit" in sql for sql in premieres))
+        self.assertFalse(any("catalogue_imageproduit" in sql for sql in secondes))
+        self.assertNotIn(CarteProduitService.SENTINELLE_MAJ, second_html)
+        self.assertIn("Maj il y a 0", second_html)
+
+    def test_invalidation_par_produit_et_images(self):
+        """Carte recalculee apres modification du produit ou de ses images."""
+        self._cartes_html()
+        self.produit.titre = "Tecno Spark 20"
+        self.produit.save()
+        self.assertIn("Tecno Spark 20", self._cartes_html()[0])
+
+        ImageProduit.objects.create(produit=self.produit, image="catalogue/produits/a.jpg")
+        ImageProduit.objects.create(produit=self.produit, image="catalogue/produits/b.jpg")
+        html = self._cartes_html()[0]
+        self.assertIn("catalogue/produits/b.jpg", html)
+        self.assertIn("carousel-control-next", html)
+
+    def test_invalidation_par_libelle_lie(self):
+        """Carte recalculee apres changement du type de vendeur."""
+        self.assertIn("Particulier", self._cartes_html()[0])
+        ProfilUtilisateur.objects.create(
+            utilisateur=self.produit.vendeur,
+            type_vendeur=ProfilUtilisateur.TypeVendeurChoices.PROFESSIONNEL,
+        )
+        self.assertIn("Professionnel", self._cartes_html()[0])
+
+
+class TestsEtagCatalogue(TestFonctionnelCase):
+    """Valide les ETags et les reponses 304 de l'endpoint AJAX."""
+
+    def setUp(self):
+        """Preparation d'un produit et d'un cache vide."""
+        super().setUp()
+        cache.clear()
+        self.url_filtre_ajax = reverse("acceuil:catalogue_filtrer")
+        self.localisation = Localisation.objects.create(
+            region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"
+        )
+        self.produit = Produit.objects.create(
+            vendeur=User.objects.create_user(username="alice", password="StrongPass123!"),
+            categorie=Categorie.objects.create(nom="Telephones", slug="telephones"),
+            lieu_vente=self.localisation,
+            titre="Tecno Spark",
+            prix=60000,
+        )
+
+    @override_settings(CACHE_PARTAGE=True)
+    def test_reponse_304_sans_requete(self):
+        """Requete conditionnelle a jour servie en 304 sans SQL."""
+        response = self.client.get(self.url_filtre_ajax, {"ville": "Douala"})
+        etag = response["ETag"]
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertFalse(etag.startswith("W/"))
+
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(
+                self.url_filtre_ajax, {"ville": "Douala"}, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(requetes), 0)
+
+        autre = self.client.get(self.url_filtre_ajax, {"ville": "Douala", "mode": "page"})
+        self.assertNotEqual(autre["ETag"], etag)
+
+    def test_version_relue_sans_cache_partage(self):
+        """En cache local, une version incrementee par un autre processus change l'ETag."""
+        etag = self.client.get(self.url_filtre_ajax)["ETag"]
+        # Autre processus: la ligne change, le cache local n'est pas publie.
+        VersionCatalogue.objects.update_or_create(pk=1, defaults={"valeur": VersionCatalogue.courante() + 1})
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(self.url_filtre_ajax, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertTrue(any(VersionCatalogue._meta.db_table in requete["sql"] for requete in requetes))
+
+    def test_ecriture_catalogue_change_etag(self):
+        """ETag renouvele apres modification d'une localisation."""
+        etag = self.client.get(self.url_filtre_ajax)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.localisation.quartier = "Bonapriso"
+            self.localisation.save()
+        response = self.client.get(self.url_filtre_ajax, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class TestsFormatDonneesCatalogue(TestFonctionnelCase):
+    """Valide le mode compact format=data de l'endpoint AJAX."""
+
+    def setUp(self):
+        """Preparation de deux produits dans deux villes."""
+        super().setUp()
+        cache.clear()
+        self.url_filtre_ajax = reverse("acceuil:catalogue_filtrer")
+        vendeur = User.objects.create_user(username="alice", password="StrongPass123!")
+        categorie = Categorie.objects.create(nom="Telephones", slug="telephones")
+        for ville, titre in (("Douala", "Tecno Spark"), ("Yaounde", "Itel A70")):
+            Produit.objects.create(
+                vendeur=vendeur,
+                categorie=categorie,
+                lieu_vente=Localisation.objects.create(
+                    region=Localisation.RegionChoices.LITTORAL, ville=ville, quartier="Centre"
+                ),
+                titre=titre,
+                description="Tres bon etat",
+                prix=60000,
+            )
+
+    def test_donnees_compactes_et_delta(self):
+        """Cartes et facettes omises quand le client les detient deja."""
+        donnees = self.client.get(self.url_filtre_ajax, {"format": "data"}).json()
+        self.assertEqual(donnees["total"], 2)
+        self.assertEqual(len(donnees["cartes"]), 2)
+        self.assertEqual(donnees["facettes"]["categories"], [["telephones", 2]])
+        self.assertEqual(donnees["facettes"]["ville"], [["Douala", 1], ["Yaounde", 1]])
+        self.assertNotIn("products_html", donnees)
+
+        connus = ",".join(f"{produit_id}.{revision}" for produit_id, revision in donnees["produits"])
+        suite = self.client.get(
+            self.url_filtre_ajax,
+            {"format": "data", "connus": connus, "facettes_rev": donnees["facettes_rev"]},
+        ).json()
+        self.assertEqual(suite["produits"], donnees["produits"])
+        self.assertEqual(suite["cartes"], {})
+        self.assertIsNone(suite["facettes"])
+
+    def test_donnees_filtrees_et_champs_carte(self):
+        """Champs de carte et facettes disjonctives d'un filtre ville."""
+        donnees = self.client.get(self.url_filtre_ajax, {"format": "data", "ville": "Douala"}).json()
+        self.assertEqual(donnees["total"], 1)
+        carte = next(iter(donnees["cartes"].values()))
+        self.assertEqual(carte["titre"], "Tecno Spark")
+        self.assertEqual(carte["prix"], "60000")
+        self.assertEqual(carte["lieu"], "Douala, Centre")
+        self.assertFalse(carte["pro"])
+        self.assertEqual(donnees["facettes"]["ville"], [["Douala", 1], ["Yaounde", 1]])
+
+
+class TestsInstrumentationSQL(TestFonctionnelCase):
+    """Valide la mesure SQL par requete et les budgets des vues."""
+
+    def setUp(self):
+        """Preparation d'un produit consultable et d'un cache vide."""
+        super().setUp()
+        cache.clear()
+        self.produit = Produit.objects.create(
+            vendeur=User.objects.create_user(username="alice", password="StrongPass123!"),
+            categorie=Categorie.objects.create(nom="Telephones", slug="telephones"),
+            lieu_vente=Localisation.objects.create(
+                region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"
+            ),
+            titre="Tecno Spark",
+            prix=60000,
+        )
+        self.url_detail = reverse("acceuil:annonce_detail", kwargs={"produit_id": self.produit.id})
+
+    def test_en_tete_server_timing(self):
+        """Nombre et duree des requetes exposes par Server-Timing."""
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(self.url_detail)
+        self.assertIn(f'desc="{len(requetes)} requetes"', response["Server-Timing"])
+        self.assertEqual(response.wsgi_request.mesure_sql.nombre, len(requetes))
+        self.assertTrue(response.wsgi_request.mesure_sql.plus_lente_sql)
+
+    def test_lanceur_de_tests_strict(self):
+        """Le lanceur de tests du projet rend les budgets bloquants."""
+        self.assertEqual(settings.TEST_RUNNER, "kzone.testing.LanceurTests")
+        self.assertTrue(settings.SQL_BUDGETS_STRICTS)
+
+    @override_settings(SQL_BUDGETS_STRICTS=True)
+    def test_budget_depasse_fait_echouer(self):
+        """Budget de requetes depasse en mode strict."""
+        with mock.patch.object(DetailAnnonceView, "budget_requetes", 1):
+            with self.assertRaises(BudgetRequetesDepasse):
+                self.client.get(self.url_detail)
+
+    @override_settings(SQL_BUDGETS_STRICTS=True)
+    def test_budget_filtre_categorie(self):
+        """Filtres et detail, registre des lieux froid, dans le budget anonyme ou connecte."""
+        racine = Categorie.objects.create(nom="Electronique", slug="electronique")
+        self.produit.categorie = Categorie.objects.create(nom="Chargeurs", slug="chargeurs", parent=racine)
+        self.produit.save()
+        ProduitRetail.objects.create(produit=self.produit, etat=ProduitRetail.EtatChoices.NEUF)
+        ImageProduit.objects.create(produit=self.produit, image="annonces/produits/chargeur.jpg")
+        filtres = {"q": "tecno", "categorie": "chargeurs", "prix_min": "1000", "etat": "neuf"}
+        cas = [
+            (AccueilView, reverse("acceuil:accueil"), {"categorie": "chargeurs"}),
+            (CatalogueFiltreAjaxView, reverse("acceuil:catalogue_filtrer"), {"categorie": "chargeurs"}),
+            (AccueilView, reverse("acceuil:accueil"), filtres),
+            (CatalogueFiltreAjaxView, reverse("acceuil:catalogue_filtrer"), filtres),
+            (DetailAnnonceView, self.url_detail, {}),
+        ]
+        for connecte in (False, True):
+            if connecte:
+                self.client.force_login(self.produit.vendeur)
+            marge = settings.SQL_BUDGET_AUTHENTIFICATION if connecte else 0
+            for vue, url, params in cas:
+                with self.subTest(vue=vue.__name__, params=params, connecte=connecte):
+                    cache.clear()
+                    RegistreLocalisations.reinitialiser()
+                    response = self.client.get(url, params)
+                    self.assertContains(response, "Tecno Spark")
+                    self.assertLessEqual(response.wsgi_request.mesure_sql.nombre, vue.budget_requetes + marge)
+
+    @override_settings(SQL_BUDGETS_STRICTS=False)
+    def test_budget_depasse_journalise(self):
+        """Budget de requetes depasse hors mode strict."""
+        with mock.patch.object(DetailAnnonceView, "budget_requetes", 1):
+            with self.assertLogs("kzone.sql", level="WARNING") as journaux:
+                response = self.client.get(self.url_detail)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("DetailAnnonceView", journaux.output[0])
+
+
+@override_settings(CACHE_PARTAGE=True)
+class TestsCachePageDetail(TestFonctionnelCase):
+    """Valide la lecture en une jointure et le cache des pages detail anonymes."""
+
+    def setUp(self):
+        """Preparation d'un produit, du profil vendeur et d'un cache vide."""
+        super().setUp()
+        cache.clear()
+        self.vendeur = User.objects.create_user(username="alice", password="StrongPass123!")
+        self.profil = ProfilUtilisateur.objects.create(utilisateur=self.vendeur, numero_paiement="699001122")
+        self.produit = Produit.objects.create(
+            vendeur=self.vendeur,
+            categorie=Categorie.objects.create(nom="Telephones", slug="telephones"),
+            lieu_vente=Localisation.objects.create(
+                region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"
+            ),
+            titre="Tecno Spark",
+            prix=60000,
+        )
+        self.url_detail = reverse("acceuil:annonce_detail", kwargs={"produit_id": self.produit.id})
+
+    def _page(self, client=None) -> tuple:
+        """Retourne la reponse et le nombre de requetes SQL executees."""
+        with CaptureQueriesContext(connection) as requetes:
+            response = (client or self.client).get(self.url_detail)
+        return response, len(requetes)
+
+    def test_lecture_en_une_jointure(self):
+        """Produit, vendeur et profil en une requete, images en une seconde."""
+        response, requetes = self._page()
+        self.assertEqual(requetes, 2)
+        self.assertEqual(response.context["profil_vendeur"], self.profil)
+
+        with CaptureQueriesContext(connection) as numero:
+            reponse_numero = self.client.post(
+                reverse("acceuil:annonce_action_ajax", args=[self.produit.id]), {"action": "show_phone"}
+            )
+        self.assertEqual(reponse_numero.json()["phone_number"], "699001122")
+        self.assertEqual(len(numero), 1)
+
+    def test_page_anonyme_servie_depuis_le_cache(self):
+        """Seconde visite anonyme sans SQL, jeton CSRF et duree propres a la reponse."""
+        premiere, _ = self._page()
+        seconde, requetes = self._page(Client())
+        self.assertEqual(requetes, 0)
+        self.assertContains(seconde, "Tecno Spark")
+        self.assertNotContains(seconde, CachePageDetail.SENTINELLE_CSRF)
+        self.assertNotContains(seconde, CachePageDetail.SENTINELLE_MAJ)
+        self.assertContains(seconde, "Mis a jour il y a 0")
+        self.assertIn("csrftoken", seconde.cookies)
+
+        self.client.force_login(self.vendeur)
+        self.assertGreater(self._page()[1], 0)
+
+    @override_settings(CACHE_PARTAGE=False)
+    def test_cache_local_au_processus_desactive(self):
+        """Sans cache partage, chaque visite relit le produit: pas de page perimee ailleurs."""
+        self._page()
+        response, requetes = self._page(Client())
+        self.assertGreater(requetes, 0)
+        self.assertFalse(cache.get(CachePageDetail.cle(self.produit.id)))
+
+    def test_invalidation_par_produit_images_et_profil(self):
+        """Page recalculee apres modification du produit, de ses images ou du profil vendeur."""
+        self._page()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produit.titre = "Tecno Spark 20"
+            self.produit.save()
+        self.assertContains(self._page()[0], "Tecno Spark 20")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ImageProduit.objects.create(produit=self.produit, image="catalogue/produits/a.jpg")
+        self.assertContains(self._page()[0], "catalogue/produits/a.jpg")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profil.type_vendeur = ProfilUtilisateur.TypeVendeurChoices.PROFESSIONNEL
+            self.profil.save()
+        response, requetes = self._page()
+        self.assertGreater(requetes, 0)
+        self.assertEqual(response.context["type_vendeur_label"], "Professionnel")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Categorie.objects.filter(pk=self.produit.categorie_id).get().save()
+        self.assertGreater(self._page()[1], 0)
+
+
+class TestsSessionsAnonymes(TestFonctionnelCase):
+    """Valide l'absence de session pour la navigation anonyme du catalogue."""
+
+    def setUp(self):
+        """Preparation d'un utilisateur et d'un cache vide."""
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(username="alice", password="StrongPass123!")
+        self.url_filtre = reverse("acceuil:catalogue_filtrer")
+        self.url_accueil = reverse("acceuil:accueil")
+
+    def test_lecture_anonyme_sans_session_ni_vary_cookie(self):
+        """Catalogue et accueil anonymes: aucune ligne de session, reponse privee."""
+        response = self.client.get(self.url_filtre)
+        self.assertNotIn("Cookie", response.get("Vary", ""))
+
+        response = self.client.get(self.url_accueil)
+        self.assertNotIn("Cookie", response.get("Vary", ""))
+        self.assertIn("private", response["Cache-Control"])
+        self.assertNotIn("csrfmiddlewaretoken", response.content.decode())
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+        self.assertEqual(Session.objects.count(), 0)
+
+    def test_utilisateur_connecte_garde_vary_cookie(self):
+        """Visiteur connecte ou porteur d'une session: comportement standard."""
+        self.client.force_login(self.user)
+        response = self.client.get(self.url_accueil)
+        self.assertIn("Cookie", response["Vary"])
+        self.assertNotIn("private", response.get("Cache-Control", ""))
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.cached_db")
+    def test_session_connectee_lue_depuis_le_cache(self):
+        """Session cached_db: les lectures suivantes ne touchent pas la table des sessions."""
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(self.url_filtre)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any("django_session" in requete["sql"] for requete in requetes))
+        self.assertEqual(Session.objects.count(), 1)
+
+
+class TestsConfigurationConnexions(TestFonctionnelCase):
+    """Valide la configuration des connexions pilotee par l'environnement."""
+
+    def test_sqlite_connexion_persistante_verifiee(self):
+        """Par defaut: SQLite, connexion persistante et verifiee avant reutilisation."""
+        configuration = configuration_base({})
+        self.assertEqual(configuration["ENGINE"], "django.db.backends.sqlite3")
+        self.assertEqual(configuration["CONN_MAX_AGE"], 60)
+        self.assertTrue(configuration["CONN_HEALTH_CHECKS"])
+
+    def test_postgres_avec_pool(self):
+        """DB_POOL=1: options du pool transmises et persistance desactivee."""
+        env = {
+            "USE_POSTGRES": "1",
+            "DB_POOL": "1",
+            "DB_POOL_MIN_SIZE": "4",
+            "DB_POOL_MAX_SIZE": "16",
+            "DB_POOL_TIMEOUT": "2.5",
+        }
+        with mock.patch("kzone.database.importlib.util.find_spec", return_value=object()):
+            configuration = configuration_base(env)
+        self.assertEqual(configuration["CONN_MAX_AGE"], 0)
+        pool = configuration["OPTIONS"]["pool"]
+        self.assertEqual((pool["min_size"], pool["max_size"], pool["timeout"]), (4, 16, 2.5))
+
+        with mock.patch("kzone.database.importlib.util.find_spec", return_value=None):
+            with self.assertRaises(ImproperlyConfigured):
+                configuration_base(env)
+        with self.assertRaises(ImproperlyConfigured):
+            configuration_base({"USE_POSTGRES": "1", "DB_CONN_MAX_AGE": "longtemps"})
+
+    def test_statistiques_dans_le_journal(self):
+        """Le journal par requete rapporte l'etat des connexions."""
+        self.assertEqual(statistiques_connexions()["default"]["ouverte"], True)
+        with self.assertLogs("kzone.sql", level="INFO") as journaux:
+            self.client.get(reverse("acceuil:accueil"))
+        self.assertIn('"connexions": {"default"', journaux.output[0])
+
+
+@mock.patch("kzone.routers.replica_disponible", return_value=True)
+class TestsRouteurReplica(TestFonctionnelCase):
+    """Valide le routage des lectures du catalogue vers le replica."""
+
+    def setUp(self):
+        """Preparation du routeur et d'une fabrique de requetes."""
+        super().setUp()
+        self.routeur = RouteurReplica()
+        self.fabrique = RequestFactory()
+
+    def test_lectures_du_catalogue_seules_au_replica(self, _replica):
+        """Replica dans la portee de lecture, primaire ailleurs et pour les ecritures."""
+        with portee_requete():
+            self.assertIsNone(self.routeur.db_for_read(Produit))
+            with lecture_replica():
+                self.assertEqual(self.routeur.db_for_read(Produit), "replica")
+            self.assertEqual(self.routeur.db_for_write(Produit), "default")
+            with lecture_replica():
+                self.assertEqual(self.routeur.db_for_read(Produit), "replica")
+            noter_ecriture()
+            with lecture_replica():
+                self.assertIsNone(self.routeur.db_for_read(Produit))
+        self.assertFalse(self.routeur.allow_migrate("replica", "catalogue"))
+        self.assertTrue(self.routeur.allow_migrate("default", "catalogue"))
+
+    def test_epinglage_apres_ecriture(self, _replica):
+        """Une requete qui ecrit pose le cookie; la suivante lit le primaire."""
+        lectures = []
+
+        def vue(request):
+            with lecture_replica():
+                lectures.append(self.routeur.db_for_read(Produit))
+            if request.GET.get("ecrire"):
+                Categorie.objects.create(nom="Montres", slug="montres")
+            return HttpResponse()
+
+        middleware = EpinglagePrimaireMiddleware(vue)
+        response = middleware(self.fabrique.get("/"))
+        self.assertNotIn(COOKIE_EPINGLAGE, response.cookies)
+        response = middleware(self.fabrique.get("/", {"ecrire": "1"}))
+        self.assertEqual(response.cookies[COOKIE_EPINGLAGE]["max-age"], settings.REPLICA_EPINGLAGE_SECONDES)
+        requete = self.fabrique.get("/")
+        requete.COOKIES[COOKIE_EPINGLAGE] = "1"
+        middleware(requete)
+        middleware(self.fabrique.post("/"))
+        self.assertEqual(lectures, ["replica", "replica", None, None])
+
+    def test_configuration_replica_sqlite(self, _replica):
+        """DB_REPLICA=1: second fichier SQLite aux reglages du primaire."""
+        self.assertIsNone(configuration_replica({}))
+        configuration = configuration_replica({"DB_REPLICA": "1", "DB_REPLICA_NAME": "/tmp/replica.sqlite3"})
+        self.assertEqual(configuration["NAME"], "/tmp/replica.sqlite3")
+        self.assertEqual(configuration["CONN_MAX_AGE"], configuration_base({})["CONN_MAX_AGE"])
+        self.assertEqual(configuration["TEST"], {"MIRROR": "default"})
+
+
+class TestsReplicaSqlite(TestFonctionnelTransactionCase):
+    """Valide le routage de bout en bout avec un second fichier SQLite.
+
+    L'alias est declare apres la preparation des bases de test: le lanceur
+    ne cree ni ne vide ce fichier, recopie du primaire par l'API de
+    sauvegarde SQLite pour simuler un replica en retard.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Declare l'alias ``replica`` sur un fichier SQLite temporaire."""
+        if "replica" in settings.DATABASES:
+            # DB_REPLICA=1: l'alias en miroir du primaire est remplace le temps de la classe.
+            cls.databases = {"default", "replica"}
+        super().setUpClass()
+        cls.dossier = tempfile.TemporaryDirectory()
+        configuration = configuration_replica(
+            {"DB_REPLICA": "1", "DB_REPLICA_NAME": f"{cls.dossier.name}/replica.sqlite3"}
+        )
+        cls.alias = ExitStack()
+        cls.alias.enter_context(mock.patch.dict(settings.DATABASES, {"replica": configuration}))
+        cls.alias.enter_context(
+            mock.patch.dict(
+                connections.settings,
+                {
+                    "replica": connections.configure_settings(
+                        {"default": dict(connections.settings["default"]), "replica": configuration}
+                    )["replica"]
+                },
+            )
+        )
+        # Autorise l'alias une fois declare; en miroir du primaire, il n'est pas vide entre les tests.
+        cls.databases = {"default", "replica"}
+        cls._retirer_connexion()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Ferme et retire l'alias temporaire."""
+        cls._retirer_connexion()
+        cls.alias.close()
+        cls.dossier.cleanup()
+        if "replica" not in settings.DATABASES:
+            cls.databases = {"default"}
+        super().tearDownClass()
+
+    @staticmethod
+    def _retirer_connexion():
+        """Ferme la connexion ``replica`` du thread, recreee depuis les reglages au prochain acces."""
+        connections["replica"].close()
+        del connections["replica"]
+
+    def setUp(self):
+        """Produit ecrit sur le primaire puis recopie sur le replica, qui prend du retard."""
+        super().setUp()
+        cache.clear()
+        self.produit = Produit.objects.create(
+            vendeur=User.objects.create_user(username="alice", password="StrongPass123!"),
+            categorie=Categorie.objects.create(nom="Telephones", slug="telephones"),
+            lieu_vente=Localisation.objects.create(
+                region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"
+            ),
+            titre="Tecno Spark",
+            prix=60000,
+        )
+        replica = connections["replica"]
+        replica.ensure_connection()
+        connection.ensure_connection()
+        connection.connection.backup(replica.connection)
+        # Replication en retard: le titre ne change que sur le primaire.
+        Produit.objects.filter(pk=self.produit.pk).update(titre="Tecno Spark 20")
+        self.url_detail = reverse("acceuil:annonce_detail", args=[self.produit.id])
+
+    def test_lecture_au_replica_puis_epinglage(self):
+        """Lecture anonyme au replica; le cookie pose par une ecriture ramene au primaire."""
+        self.assertContains(self.client.get(self.url_detail), '<h1 class="h3 mb-1">Tecno Spark</h1>')
+        with lecture_replica():
+            self.assertEqual(Produit.objects.get(pk=self.produit.pk).titre, "Tecno Spark")
+        self.assertEqual(Produit.objects.get(pk=self.produit.pk).titre, "Tecno Spark 20")
+
+        response = self.client.post(
+            reverse("acceuil:annonce_action_ajax", args=[self.produit.id]), {"action": "show_phone"}
+        )
+        self.assertIn(COOKIE_EPINGLAGE, response.cookies)
+        self.assertContains(self.client.get(self.url_detail), '<h1 class="h3 mb-1">Tecno Spark 20</h1>')
+
+    def test_etag_suit_la_version_du_replica(self):
+        """L'ETag porte la version du replica qui sert le corps, pas celle du primaire."""
+        url = reverse("acceuil:catalogue_filtrer")
+        etag = self.client.get(url)["ETag"]
+        for cache_partage in (False, True):
+            with self.subTest(cache_partage=cache_partage), override_settings(CACHE_PARTAGE=cache_partage):
+                # Version incrementee et publiee sur le primaire seulement.
+                VersionCatalogue.incrementer()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+        # Le primaire, lui, sert la nouvelle version sous un nouvel ETag.
+        with mock.patch.dict(settings.DATABASES):
+            del settings.DATABASES["replica"]
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_ecriture_epingle_la_suite_de_la_requete(self):
+        """Apres une ecriture detectee sur le primaire, la meme requete relit le primaire."""
+        with portee_requete() as a_ecrit, ExitStack() as pile:
+            EpinglagePrimaireMiddleware._detecter(pile)
+            with lecture_replica():
+                self.assertEqual(Produit.objects.get(pk=self.produit.pk).titre, "Tecno Spark")
+            Categorie.objects.create(nom="Montres", slug="montres")
+            self.assertTrue(a_ecrit())
+            with lecture_replica():
+                self.assertEqual(Produit.objects.get(pk=self.produit.pk).titre, "Tecno Spark 20")
+
+    def test_primaire_sans_alias_replica(self):
+        """Sans alias replica declare, la portee de lecture reste sur le primaire."""
+        with mock.patch.dict(settings.DATABASES), lecture_replica():
+            del settings.DATABASES["replica"]
+            self.assertEqual(Produit.objects.get(pk=self.produit.pk).titre, "Tecno Spark 20")
+
+
+class TestsVuesAsynchrones(TestFonctionnelCase):
+    """Valide les variantes asynchrones des vues catalogue et detail."""
+
+    def setUp(self):
+        """Preparation d'un petit catalogue et d'un cache vide."""
+        super().setUp()
+        cache.clear()
+        self.fabrique = RequestFactory()
+        vendeur = User.objects.create_user(username="alice", password="StrongPass123!")
+        ProfilUtilisateur.objects.create(utilisateur=vendeur, numero_paiement="699001122")
+        categorie = Categorie.objects.create(nom="Telephones", slug="telephones")
+        lieux = [
+            Localisation.objects.create(region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"),
+            Localisation.objects.create(region=Localisation.RegionChoices.CENTRE, ville="Yaounde", quartier="Bastos"),
+        ]
+        self.produits = [
+            Produit.objects.create(
+                vendeur=vendeur, categorie=categorie, lieu_vente=lieux[index % 2],
+                titre=f"Tecno Spark {index}", prix=50000 + index,
+            )
+            for index in range(3)
+        ]
+
+    def _appeler(self, vue, chemin="/", params=None, **kwargs):
+        """Appelle une vue (synchrone ou non) sur une requete anonyme."""
+        requete = self.fabrique.get(chemin, params or {})
+        requete.user = AnonymousUser()
+        if vue.view_is_async:
+            return async_to_sync(vue.as_view())(requete, **kwargs)
+        return vue.as_view()(requete, **kwargs)
+
+    def test_catalogue_async_identique_a_la_vue_synchrone(self):
+        """Memes fragments, donnees, ETag et en-tetes de cache que la vue synchrone."""
+        for params in [{}, {"region": Localisation.RegionChoices.LITTORAL}, {"format": "data"}, {"mode": "page"}]:
+            with self.subTest(params=params):
+                synchrone = self._appeler(CatalogueFiltreAjaxView, params=params)
+                asynchrone = self._appeler(CatalogueFiltreAjaxAsyncView, params=params)
+                self.assertEqual(asynchrone.status_code, 200)
+                self.assertEqual(json.loads(asynchrone.content), json.loads(synchrone.content))
+                self.assertEqual(asynchrone["ETag"], synchrone["ETag"])
+                self.assertEqual(asynchrone["Cache-Control"], "no-cache")
+
+        requete = self.fabrique.get("/", HTTP_IF_NONE_MATCH=synchrone["ETag"], data={"mode": "page"})
+        requete.user = AnonymousUser()
+        self.assertEqual(async_to_sync(CatalogueFiltreAjaxAsyncView.as_view())(requete).status_code, 304)
+
+    @override_settings(CACHE_PARTAGE=True)
+    def test_detail_async_identique_et_mis_en_cache(self):
+        """Meme page que la vue synchrone, puis servie depuis le cache sans SQL."""
+        produit_id = self.produits[0].id
+        jeton = re.compile(r'name="csrfmiddlewaretoken" value="[^"]*"')
+        synchrone = self._appeler(DetailAnnonceView, produit_id=produit_id)
+        cache.clear()
+        asynchrone = self._appeler(DetailAnnonceAsyncView, produit_id=produit_id)
+        self.assertEqual(
+            jeton.sub("", asynchrone.content.decode()), jeton.sub("", synchrone.content.decode())
+        )
+        with CaptureQueriesContext(connection) as requetes:
+            self.assertContains(self._appeler(DetailAnnonceAsyncView, produit_id=produit_id), "Tecno Spark 0")
+        self.assertEqual(len(requetes), 0)
+
+    def test_en_parallele_sequentiel_dans_une_transaction(self):
+        """Sous TestCase (transaction ouverte): taches dans l'ordre, sur la connexion de la requete."""
+        threads = []
+
+        def tache(valeur):
+            threads.append(threading.get_ident())
+            return Produit.objects.filter(titre=f"Tecno Spark {valeur}").count() * valeur
+
+        resultats = async_to_sync(en_parallele)(*(partial(tache, valeur) for valeur in range(3)))
+        self.assertEqual(resultats, [0, 1, 2])
+        self.assertEqual(set(threads), {threading.get_ident()})
+
+    def test_instrumentation_sous_asgi(self):
+        """Le middleware mesure aussi les requetes d'une chaine asynchrone."""
+
+        async def vue(request):
+            await sync_to_async(lambda: list(Produit.objects.all()))()
+            return HttpResponse()
+
+        middleware = InstrumentationSQLMiddleware(vue)
+        requete = self.fabrique.get("/")
+        response = async_to_sync(middleware)(requete)
+        self.assertEqual(requete.mesure_sql.nombre, 1)
+        self.assertIn('desc="1 requetes"', response["Server-Timing"])
+
+
+class TestsLocalisationsStatiques(TestFonctionnelCase):
+    """Valide l'arbre des localisations servi sous une URL a empreinte."""
+
+    def setUp(self):
+        """Preparation de deux localisations."""
+        super().setUp()
+        RegistreLocalisations.reinitialiser()
+        Localisation.objects.create(region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa")
+        Localisation.objects.create(region=Localisation.RegionChoices.CENTRE, ville="Yaounde", quartier="Bastos")
+
+    def test_url_a_empreinte_cacheable(self):
+        """L'accueil reference l'arbre, servi immuable et sans session."""
+        url = reverse("acceuil:localisations", kwargs={"empreinte": RegistreLocalisations.empreinte()})
+        self.assertContains(self.client.get(reverse("acceuil:accueil")), f'data-localisations-url="{url}"')
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content),
+            {"Centre": {"Yaounde": ["Bastos"]}, "Littoral": {"Douala": ["Akwa"]}},
+        )
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("public", response["Cache-Control"])
+        self.assertNotIn("Cookie", response.get("Vary", ""))
+        self.assertFalse(response.cookies)
+
+    def test_empreinte_perimee_redirigee(self):
+        """Une empreinte perimee redirige vers la version courante."""
+        ancienne = RegistreLocalisations.empreinte()
+        with self.captureOnCommitCallbacks(execute=True):
+            Localisation.objects.create(region=Localisation.RegionChoices.OUEST, ville="Dschang", quartier="Foto")
+
+        response = self.client.get(reverse("acceuil:localisations", kwargs={"empreinte": ancienne}))
+        courante = reverse("acceuil:localisations", kwargs={"empreinte": RegistreLocalisations.empreinte()})
+        self.assertRedirects(response, courante, fetch_redirect_response=False)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertIn("Dschang", self.client.get(courante).json()["Ouest"])
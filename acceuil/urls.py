@@ -1,12 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'acceuil'
 
+# Sous ASGI (VUES_ASYNC), catalogue et detail passent par leurs variantes asynchrones.
+if settings.VUES_ASYNC:
+    VueCatalogue, VueDetail = views.CatalogueFiltreAjaxAsyncView, views.DetailAnnonceAsyncView
+else:
+    VueCatalogue, VueDetail = views.CatalogueFiltreAjaxView, views.DetailAnnonceView
+
 urlpatterns = [
     path('', views.AccueilView.as_view(), name='accueil'),
-    path('catalogue/filtrer/', views.CatalogueFiltreAjaxView.as_view(), name='catalogue_filtrer'),
-    path('catalogue/annonce/<int:produit_id>/', views.DetailAnnonceView.as_view(), name='annonce_detail'),
+    path('catalogue/filtrer/', VueCatalogue.as_view(), name='catalogue_filtrer'),
+    path(
+        'catalogue/localisations.<slug:empreinte>.json',
+        views.LocalisationsView.as_view(),
+        name='localisations',
+    ),
+    path('catalogue/annonce/<int:produit_id>/', VueDetail.as_view(), name='annonce_detail'),
     path(
         'catalogue/annonce/<int:produit_id>/action/',
         views.AnnonceActionAjaxView.as_view(),
@@ -1,77 +1,194 @@
 """Vues de rendu front de l'application accueil."""
 
+from functools import partial
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
 from django.views import View
+from django.views.decorators.http import condition
 from django.views.generic import TemplateView
 
+from annonces.localisations import RegistreLocalisations
 from annonces.models import Produit
 from annonces.services import CatalogueService
-from profil.models import ProfilUtilisateur
-from .services import AnnonceDetailService
+from kzone.concurrence import en_parallele
+from .services import (
+    AnnonceDetailService,
+    CachePageDetail,
+    CarteProduitService,
+    CatalogueDonneesService,
+)
 
 
 class AccueilView(TemplateView):
     """Affiche l'accueil avec catalogue, sidebar et filtres dynamiques."""
 
     template_name = "acceuil/accueil.html"
+    # Requete anonyme, filtre categorie, registre des localisations a
+    # recharger: arbre des categories, ancetres et descendants de la
+    # categorie, sa fiche, page de produits, facettes, compteurs, images,
+    # version des localisations, lieux.
+    budget_requetes = 10
+    session_lecture_seule = True
 
     def get_context_data(self, **kwargs):
         """Ajoute les donnees globales et le contexte catalogue."""
         context = super().get_context_data(**kwargs)
         context.update(CatalogueService.get_catalogue_context(self.request.GET))
+        context["cartes_html"] = CarteProduitService.rendre_cartes(context["produits"], self.request)
+        context["localisations_url"] = reverse(
+            "acceuil:localisations", kwargs={"empreinte": RegistreLocalisations.empreinte()}
+        )
         context["nombre_clients"] = 123
         context["chiffre_affaires"] = "12 345,67 EUR"
         context["nombre_factures"] = 42
         return context
 
 
+def _etag_catalogue(request, *args, **kwargs) -> str:
+    """ETag de la reponse AJAX: version du catalogue, filtres, curseur, mode et format."""
+    discriminants = [request.GET.get("mode") or "complet", request.GET.get("format") or "html"]
+    if request.GET.get("format") == "data":
+        discriminants += [request.GET.get("connus") or "", request.GET.get("facettes_rev") or ""]
+    return CatalogueService.get_etag(request.GET, *discriminants)
+
+
+@method_decorator(condition(etag_func=_etag_catalogue), name="get")
 class CatalogueFiltreAjaxView(View):
-    """Endpoint AJAX qui met a jour le catalogue sans rechargement complet."""
+    """Endpoint AJAX qui met a jour le catalogue sans rechargement complet.
+
+    Les reponses portent un ETag fort; une requete ``If-None-Match`` a jour
+    recoit une 304 avant tout calcul de contexte ou rendu. ``format=data``
+    remplace les fragments HTML par des donnees compactes rendues cote client.
+    """
+
+    # Memes lectures que la page d'accueil (voir AccueilView).
+    budget_requetes = 10
+    session_lecture_seule = True
+    PARTIELS = {
+        "sidebar_html": "acceuil/partials/catalog_sidebar.html",
+        "products_html": "acceuil/partials/catalog_products.html",
+        "context_filters_html": "acceuil/partials/catalog_context_filters.html",
+        "city_options_html": "acceuil/partials/catalog_city_options.html",
+        "region_options_html": "acceuil/partials/catalog_region_options.html",
+    }
 
     def get(self, request, *args, **kwargs):
         """Retourne les fragments HTML recalcules selon les filtres courants."""
-        context = CatalogueService.get_catalogue_context(request.GET)
+        mode_page = request.GET.get("mode") == "page"
+        if request.GET.get("format") == "data":
+            response = self._get_donnees(request, mode_page)
+        elif mode_page:
+            response = self._get_page_suivante(request)
+        else:
+            response = self._get_catalogue(request)
+        response["Cache-Control"] = "no-cache"
+        return response
 
-        sidebar_html = render_to_string(
-            "acceuil/partials/catalog_sidebar.html",
-            context=context,
-            request=request,
-        )
-        products_html = render_to_string(
-            "acceuil/partials/catalog_products.html",
-            context=context,
-            request=request,
-        )
-        context_filters_html = render_to_string(
-            "acceuil/partials/catalog_context_filters.html",
-            context=context,
-            request=request,
-        )
-        city_options_html = render_to_string(
-            "acceuil/partials/catalog_city_options.html",
-            context=context,
-            request=request,
+    def _get_donnees(self, request, mode_page: bool):
+        """Retourne la page et, hors defilement, les facettes en donnees compactes."""
+        if mode_page:
+            context = CatalogueService.get_page_context(request.GET)
+        else:
+            context = CatalogueService.get_catalogue_context(request.GET)
+        return JsonResponse(
+            CatalogueDonneesService.construire(context, request.GET, avec_facettes=not mode_page),
+            json_dumps_params={"separators": (",", ":")},
         )
 
+    def _get_catalogue(self, request):
+        """Retourne tous les fragments du catalogue filtre."""
+        context = CatalogueService.get_catalogue_context(request.GET)
+        context["cartes_html"] = CarteProduitService.rendre_cartes(context["produits"], request)
+        fragments = {
+            cle: render_to_string(gabarit, context=context, request=request)
+            for cle, gabarit in self.PARTIELS.items()
+        }
+        return self._reponse_catalogue(context, fragments)
+
+    @staticmethod
+    def _reponse_catalogue(context, fragments: dict[str, str]) -> JsonResponse:
+        """Assemble la reponse JSON des fragments du catalogue."""
         return JsonResponse(
             {
-                "sidebar_html": sidebar_html,
-                "products_html": products_html,
-                "context_filters_html": context_filters_html,
-                "city_options_html": city_options_html,
+                "sidebar_html": fragments["sidebar_html"],
+                "products_html": fragments["products_html"],
+                "context_filters_html": fragments["context_filters_html"],
+                "city_options_html": fragments["city_options_html"],
+                "region_options_html": fragments["region_options_html"],
                 "total_produits": context["total_produits"],
+                "curseur_suivant": context["curseur_suivant"],
+            }
+        )
+
+    def _get_page_suivante(self, request):
+        """Retourne uniquement les cartes de la page suivante (defilement infini)."""
+        context = CatalogueService.get_page_context(request.GET)
+        return JsonResponse(
+            {
+                "products_html": CarteProduitService.rendre_cartes(context["produits"], request),
+                "curseur_suivant": context["curseur_suivant"],
             }
         )
 
 
+class LocalisationsView(View):
+    """Sert l'arbre region -> ville -> quartier sous une URL a empreinte.
+
+    Le contenu d'une URL ne change jamais: il est cacheable indefiniment
+    par le navigateur et les caches partages. Une empreinte perimee redirige
+    vers la version courante.
+    """
+
+    # Version du catalogue, puis la table au rechargement de l'instantane.
+    budget_requetes = 2
+    session_lecture_seule = True
+    DUREE_CACHE = 365 * 24 * 3600
+
+    def get(self, request, empreinte: str, *args, **kwargs):
+        """Retourne le JSON de l'arbre, ou redirige vers son empreinte courante."""
+        instantane = RegistreLocalisations.instantane()
+        if empreinte != instantane.empreinte:
+            response = redirect("acceuil:localisations", empreinte=instantane.empreinte)
+            response["Cache-Control"] = "no-cache"
+            return response
+        response = HttpResponse(instantane.contenu_json, content_type="application/json")
+        patch_cache_control(response, public=True, max_age=self.DUREE_CACHE, immutable=True)
+        return response
+
+
 class DetailAnnonceView(TemplateView):
     """Affiche la page detaillee d'une annonce du catalogue."""
 
     template_name = "acceuil/annonce_detail.html"
+    budget_requetes = 4
+    session_lecture_seule = True
+
+    def get(self, request, *args, **kwargs):
+        """Sert la page depuis le cache des anonymes ou la rend puis la memorise."""
+        produit_id = kwargs["produit_id"]
+        cacheable = CachePageDetail.est_cacheable(request)
+        entree = CachePageDetail.lire(produit_id) if cacheable else None
+        if entree is not None:
+            return HttpResponse(
+                CachePageDetail.personnaliser(entree["html"], entree["mise_a_jour"], request)
+            )
+
+        response = super().get(request, *args, **kwargs).render()
+        produit = response.context_data["produit"]
+        mise_a_jour = produit.date_mise_a_jour or produit.date_creation
+        html = response.content.decode(response.charset)
+        if cacheable:
+            CachePageDetail.ecrire(produit_id, html, mise_a_jour)
+        response.content = CachePageDetail.personnaliser(html, mise_a_jour, request)
+        return response
 
     def get_context_data(self, **kwargs):
         """Construit le contexte detail annonce avec confiance vendeur."""
@@ -80,18 +197,110 @@ class DetailAnnonceView(TemplateView):
         return context
 
 
+class CatalogueFiltreAjaxAsyncView(CatalogueFiltreAjaxView):
+    """Variante asynchrone de ``CatalogueFiltreAjaxView`` pour les deploiements ASGI.
+
+    Les lectures independantes du contexte (page, facettes, sidebar) puis les
+    rendus des fragments s'executent en parallele; le worker attend les E/S
+    sans bloquer un thread par requete. Reponses identiques a la vue synchrone.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        """Retourne une 304 si l'ETag est a jour, sinon les fragments ou les donnees."""
+        etag = quote_etag(await sync_to_async(_etag_catalogue)(request))
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+
+        mesure = getattr(request, "mesure_sql", None)
+        mode_page = request.GET.get("mode") == "page"
+        if mode_page:
+            context = await sync_to_async(CatalogueService.get_page_context)(request.GET)
+        else:
+            context = await CatalogueService.aget_catalogue_context(request.GET, mesure=mesure)
+
+        if request.GET.get("format") == "data":
+            response = JsonResponse(
+                await sync_to_async(CatalogueDonneesService.construire)(
+                    context, request.GET, avec_facettes=not mode_page
+                ),
+                json_dumps_params={"separators": (",", ":")},
+            )
+        elif mode_page:
+            response = JsonResponse(
+                {
+                    "products_html": await sync_to_async(CarteProduitService.rendre_cartes)(
+                        context["produits"], request
+                    ),
+                    "curseur_suivant": context["curseur_suivant"],
+                }
+            )
+        else:
+            response = await self._aget_catalogue(request, context, mesure)
+        response.headers.setdefault("ETag", etag)
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    async def _aget_catalogue(self, request, context, mesure) -> JsonResponse:
+        """Rend les cartes et les fragments independants en parallele, puis la liste produits."""
+        independants = {cle: gabarit for cle, gabarit in self.PARTIELS.items() if cle != "products_html"}
+        cartes_html, *rendus = await en_parallele(
+            partial(CarteProduitService.rendre_cartes, context["produits"], request),
+            *(
+                partial(render_to_string, gabarit, context=context, request=request)
+                for gabarit in independants.values()
+            ),
+            mesure=mesure,
+        )
+        context["cartes_html"] = cartes_html
+        fragments = dict(zip(independants, rendus))
+        fragments["products_html"] = await sync_to_async(render_to_string)(
+            self.PARTIELS["products_html"], context=context, request=request
+        )
+        return self._reponse_catalogue(context, fragments)
+
+
+class DetailAnnonceAsyncView(DetailAnnonceView):
+    """Variante asynchrone de ``DetailAnnonceView``: cache et ORM asynchrones."""
+
+    async def get(self, request, *args, **kwargs):
+        """Sert la page depuis le cache des anonymes ou la rend puis la memorise."""
+        produit_id = kwargs["produit_id"]
+        cacheable = await sync_to_async(CachePageDetail.est_cacheable)(request)
+        entree = await CachePageDetail.alire(produit_id) if cacheable else None
+        if entree is not None:
+            return HttpResponse(
+                CachePageDetail.personnaliser(entree["html"], entree["mise_a_jour"], request)
+            )
+
+        context = await AnnonceDetailService.aget_detail_context(produit_id=produit_id)
+        context.update(view=self, **kwargs)
+        html = await sync_to_async(render_to_string)(self.template_name, context, request)
+        produit = context["produit"]
+        mise_a_jour = produit.date_mise_a_jour or produit.date_creation
+        if cacheable:
+            await sync_to_async(CachePageDetail.ecrire)(produit_id, html, mise_a_jour)
+        return HttpResponse(CachePageDetail.personnaliser(html, mise_a_jour, request))
+
+
 class AnnonceActionAjaxView(View):
     """Traite les actions rapides de la page detail (contact, numero)."""
 
+    budget_requetes = 3
+
     def post(self, request, *args, **kwargs):
         """Execute l'action demandee et retourne un payload JSON minimal."""
-        produit = Produit.objects.select_related("vendeur").filter(id=kwargs["produit_id"]).first()
+        produit = (
+            Produit.objects.select_related("vendeur__profil_utilisateur")
+            .filter(id=kwargs["produit_id"])
+            .first()
+        )
         if produit is None:
             return JsonResponse({"ok": False, "message": "Annonce introuvable."}, status=404)
 
         action = (request.POST.get("action") or "").strip()
         if action == "show_phone":
-            profil_vendeur = ProfilUtilisateur.objects.filter(utilisateur=produit.vendeur).first()
+            profil_vendeur = getattr(produit.vendeur, "profil_utilisateur", None)
             numero_contact = (
                 profil_vendeur.numero_paiement.strip()
                 if profil_vendeur and profil_vendeur.numero_paiement
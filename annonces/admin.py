@@ -3,6 +3,7 @@
 from django.contrib import admin
 
 from .models import Categorie, ImageProduit, Localisation, Produit, ProduitAgricole, ProduitRetail
+from .recherche import extraire_termes, get_backend_recherche
 
 
 @admin.register(Localisation)
@@ -32,6 +33,13 @@ class ProduitAdmin(admin.ModelAdmin):
     list_filter = ("statut", "categorie", "lieu_vente__region")
     search_fields = ("titre", "description")
 
+    def get_search_results(self, request, queryset, search_term):
+        """Passe par l'index plein texte plutot que par des ``icontains``."""
+        if not extraire_termes(search_term):
+            return queryset, False
+        backend = get_backend_recherche(queryset.db)
+        return queryset.filter(backend.condition(search_term)), False
+
 
 @admin.register(ProduitRetail)
 class ProduitRetailAdmin(admin.ModelAdmin):
@@ -10,3 +10,7 @@ class AnnoncesConfig(AppConfig):
     name = "annonces"
     label = "catalogue"
 
+    def ready(self) -> None:
+        """Branche les signaux de maintenance des donnees derivees."""
+        from . import signals  # noqa: F401
+
@@ -0,0 +1,436 @@
+"""Index bitmap du catalogue: filtres et facettes par operations sur des bitsets.
+
+Avec ``CATALOGUE_MOTEUR = "bitmaps"``, chaque processus garde un bitset par
+valeur de facette (categorie, region, ville, etat, region d'origine) et par
+tranche de prix. Les bitsets sont des entiers Python: le bit ``r`` designe
+la ligne ``r``, et les lignes suivent l'ordre (date de creation, id). Un
+filtre devient un ET de bitsets (un OU pour les categories descendantes),
+un compte de facette le nombre de bits de l'intersection, et les pages par
+date se lisent directement dans l'ordre des bits.
+
+Les bitsets combines (categories descendantes, tranche de prix, conjonction
+des filtres) sont memorises dans l'instantane: des visiteurs qui basculent
+entre les memes filtres ne refont que des comptes de bits. L'instantane est
+tenu a jour par le journal (``MoteurMemoire``): un produit modifie change
+de bits sur sa ligne, un produit nouveau est ajoute en fin de lignes. Un
+produit dont la date le placerait avant la derniere ligne (remis en vente)
+ou un identifiant reutilise avec une autre date imposent un rechargement
+complet. Aucune dependance hors de la bibliotheque standard; la recherche
+plein texte reste au moteur SQL.
+"""
+
+from __future__ import annotations
+
+import heapq
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import ROUND_CEILING, ROUND_FLOOR
+from typing import Any
+
+from django.db import DEFAULT_DB_ALIAS
+
+from .facettes import FACETTES, ResultatFacettes
+from .memoire import CHAMPS, COLONNES_CODEES, MoteurMemoire, centimes, date_depuis, microsecondes, prix_depuis
+from .models import Produit
+
+
+def positions(bitset: int) -> list[int]:
+    """Rangs des bits a 1, croissants."""
+    chaine = format(bitset, "b")[::-1]
+    resultat = []
+    rang = chaine.find("1")
+    while rang >= 0:
+        resultat.append(rang)
+        rang = chaine.find("1", rang + 1)
+    return resultat
+
+
+def depuis_positions(rangs, taille: int) -> int:
+    """Bitset dont les bits ``rangs`` sont a 1."""
+    octets = bytearray((taille + 7) // 8)
+    for rang in rangs:
+        octets[rang >> 3] |= 1 << (rang & 7)
+    return int.from_bytes(octets, "little")
+
+
+@dataclass(frozen=True)
+class InstantaneBitmaps:
+    """Bitsets des produits disponibles a une version du catalogue.
+
+    ``attributs[r]`` donne les valeurs de facettes de la ligne ``r`` (tuple
+    partage entre lignes identiques), None si le produit n'est plus
+    disponible; ``lignes`` donne la ligne de chaque produit vu depuis le
+    dernier rechargement. Seul ``memo`` est complete apres publication.
+    """
+
+    version: int
+    dernier_evenement: int
+    charge_le: float
+    lu_le: datetime
+    ids: array
+    dates: array
+    prix: array
+    attributs: list[tuple | None]
+    disponibles: int
+    index: dict[str, dict[Any, int]]
+    seuils: list[int]
+    tranches: list[int]
+    par_prix: list[tuple[int, int]]
+    lignes: dict[int, int]
+    memo: dict[tuple, int] = field(default_factory=dict, compare=False)
+
+
+class MoteurBitmaps(MoteurMemoire):
+    """Selection des produits et facettes depuis les bitsets du processus."""
+
+    # Nombre de tranches de prix (quantiles au chargement).
+    TRANCHES = 64
+    # Sous ce nombre de lignes retenues, une page par prix trie les lignes du
+    # bitset; au-dela elle parcourt l'ordre des prix en testant les bits.
+    SEUIL_TRI = 2048
+    TAILLE_MEMO = 512
+
+    @classmethod
+    def selectionner(
+        cls,
+        filtres,
+        descendants: list[int] | None,
+        champ: str,
+        descendant: bool,
+        position: tuple[Any, int] | None,
+        nombre: int,
+    ) -> list[tuple[int, Any]]:
+        """Premiers produits apres ``position``: ordre des bits (date) ou des prix."""
+        instantane = cls.instantane()
+        base, conditions = cls._bitsets(filtres, descendants)
+        masque = cls._conjonction(instantane, base, conditions)
+        if champ == "date_creation":
+            rangs = cls._par_date(instantane, masque, descendant, position, nombre)
+            return [(instantane.ids[rang], date_depuis(instantane.dates[rang])) for rang in rangs]
+        return [
+            (produit_id, prix_depuis(prix))
+            for prix, produit_id in cls._par_prix(instantane, masque, descendant, position, nombre)
+        ]
+
+    @classmethod
+    def facettes(cls, filtres, descendants: list[int] | None) -> ResultatFacettes:
+        """Total filtre et comptes disjonctifs de chaque facette, comme ``MoteurFacettes``."""
+        instantane = cls.instantane()
+        base, conditions = cls._bitsets(filtres, descendants)
+
+        comptes: dict[str, dict[Any, int]] = {}
+        for facette in FACETTES:
+            autres = {nom: condition for nom, condition in conditions.items() if nom != facette}
+            masque = cls._conjonction(instantane, base, autres)
+            resultat = {}
+            for valeur, bitset in instantane.index[facette].items():
+                total = (bitset & masque).bit_count()
+                if total:
+                    resultat[valeur] = total
+            if resultat:
+                comptes[facette] = resultat
+
+        total = cls._conjonction(instantane, base, conditions).bit_count()
+        return ResultatFacettes(total=total, comptes=comptes)
+
+    @classmethod
+    def _memoriser(cls, instantane: InstantaneBitmaps, cle: tuple, calcul) -> int:
+        """Bitset memorise sous ``cle`` dans l'instantane, calcule au premier appel."""
+        bitset = instantane.memo.get(cle)
+        if bitset is None:
+            if len(instantane.memo) >= cls.TAILLE_MEMO:
+                instantane.memo.clear()
+            bitset = instantane.memo[cle] = calcul()
+        return bitset
+
+    @classmethod
+    def _conjonction(cls, instantane: InstantaneBitmaps, base: tuple, conditions: dict[str, tuple]) -> int:
+        """ET de la base et des conditions, memorise par combinaison de filtres."""
+
+        def calculer() -> int:
+            resultat = cls._resoudre(instantane, base)
+            for condition in conditions.values():
+                resultat &= cls._resoudre(instantane, condition)
+            return resultat
+
+        return cls._memoriser(instantane, ("et", base, *sorted(conditions.values())), calculer)
+
+    @classmethod
+    def _resoudre(cls, instantane: InstantaneBitmaps, condition: tuple) -> int:
+        """Bitset d'une condition: prix, categories descendantes ou valeur de facette."""
+        nature, *valeurs = condition
+        if nature == "prix":
+            return cls._memoriser(instantane, condition, lambda: cls._intervalle_prix(instantane, *valeurs))
+        if nature == "categorie":
+
+            def reunir() -> int:
+                resultat = 0
+                for categorie_id in valeurs:
+                    resultat |= instantane.index["categorie"].get(categorie_id, 0)
+                return resultat
+
+            return cls._memoriser(instantane, condition, reunir)
+        return instantane.index[nature].get(valeurs[0], 0)
+
+    @staticmethod
+    def _bitsets(filtres, descendants: list[int] | None) -> tuple[tuple, dict[str, tuple]]:
+        """Condition des filtres hors facettes (prix) et condition de chaque facette active."""
+        base = (
+            "prix",
+            centimes(filtres.prix_min, ROUND_CEILING) if filtres.prix_min is not None else None,
+            centimes(filtres.prix_max, ROUND_FLOOR) if filtres.prix_max is not None else None,
+        )
+        conditions: dict[str, tuple] = {}
+        if descendants:
+            conditions["categorie"] = ("categorie", *sorted(descendants))
+        for facette in COLONNES_CODEES:
+            valeur = getattr(filtres, facette)
+            if valeur:
+                conditions[facette] = (facette, valeur)
+        return base, conditions
+
+    @staticmethod
+    def _intervalle_prix(instantane: InstantaneBitmaps, minimum: int | None, maximum: int | None) -> int:
+        """Lignes disponibles dont le prix est dans l'intervalle (bornes incluses).
+
+        Les tranches entierement comprises sont reunies; seules les lignes des
+        tranches a cheval sur une borne sont testees une a une.
+        """
+        if minimum is None and maximum is None:
+            return instantane.disponibles
+        resultat = 0
+        bas = None
+        for rang, tranche in enumerate(instantane.tranches):
+            haut = instantane.seuils[rang] if rang < len(instantane.seuils) else None
+            # La tranche couvre les prix de ]bas, haut].
+            dessous = minimum is not None and haut is not None and haut < minimum
+            dessus = maximum is not None and bas is not None and bas >= maximum
+            if not (dessous or dessus):
+                inclus = (minimum is None or (bas is not None and bas >= minimum - 1)) and (
+                    maximum is None or (haut is not None and haut <= maximum)
+                )
+                if inclus:
+                    resultat |= tranche
+                else:
+                    resultat |= depuis_positions(
+                        (
+                            ligne
+                            for ligne in positions(tranche)
+                            if (minimum is None or instantane.prix[ligne] >= minimum)
+                            and (maximum is None or instantane.prix[ligne] <= maximum)
+                        ),
+                        len(instantane.ids),
+                    )
+            bas = haut
+        return resultat
+
+    @staticmethod
+    def _par_date(
+        instantane: InstantaneBitmaps,
+        masque: int,
+        descendant: bool,
+        position: tuple[Any, int] | None,
+        nombre: int,
+    ) -> list[int]:
+        """Lignes retenues suivant l'ordre des lignes, apres le rang du curseur."""
+        chaine = format(masque, "b")[::-1]
+        cle = None
+        if position is not None:
+            cle = (microsecondes(position[0]), position[1])
+        tous = range(len(instantane.ids))
+        ligne = lambda rang: (instantane.dates[rang], instantane.ids[rang])  # noqa: E731
+        rangs = []
+        if descendant:
+            fin = len(chaine) if cle is None else min(len(chaine), bisect_left(tous, cle, key=ligne))
+            while len(rangs) < nombre:
+                fin = chaine.rfind("1", 0, fin)
+                if fin < 0:
+                    break
+                rangs.append(fin)
+        else:
+            debut = 0 if cle is None else bisect_right(tous, cle, key=ligne)
+            while len(rangs) < nombre:
+                debut = chaine.find("1", debut)
+                if debut < 0:
+                    break
+                rangs.append(debut)
+                debut += 1
+        return rangs
+
+    @classmethod
+    def _par_prix(
+        cls,
+        instantane: InstantaneBitmaps,
+        masque: int,
+        descendant: bool,
+        position: tuple[Any, int] | None,
+        nombre: int,
+    ) -> list[tuple[int, int]]:
+        """Couples (prix, id) retenus dans l'ordre des prix, apres le curseur."""
+        cle = None if position is None else (centimes(position[0]), position[1])
+        if masque.bit_count() <= cls.SEUIL_TRI:
+            candidats = (
+                (instantane.prix[ligne], instantane.ids[ligne]) for ligne in positions(masque)
+            )
+            if descendant:
+                return heapq.nlargest(nombre, (c for c in candidats if cle is None or c < cle))
+            return heapq.nsmallest(nombre, (c for c in candidats if cle is None or c > cle))
+
+        chaine = format(masque, "b")[::-1]
+        par_prix, lignes = instantane.par_prix, instantane.lignes
+        if descendant:
+            rangs = range((len(par_prix) if cle is None else bisect_left(par_prix, cle)) - 1, -1, -1)
+        else:
+            rangs = range(0 if cle is None else bisect_right(par_prix, cle), len(par_prix))
+        retenus = []
+        for rang in rangs:
+            ligne = lignes[par_prix[rang][1]]
+            if ligne < len(chaine) and chaine[ligne] == "1":
+                retenus.append(par_prix[rang])
+                if len(retenus) == nombre:
+                    break
+        return retenus
+
+    @classmethod
+    def _lire(cls, produit_ids=None) -> list[tuple]:
+        """Lit ``CHAMPS`` et le statut, dans l'ordre des lignes (date de creation, id).
+
+        Un rechargement lit les produits disponibles; une mise a jour relit
+        les produits designes quel que soit leur statut, pour retirer les
+        produits sortis de la vente.
+        """
+        queryset = Produit.objects.using(DEFAULT_DB_ALIAS)
+        if produit_ids is None:
+            queryset = queryset.filter(statut=Produit.StatutChoices.DISPONIBLE)
+        else:
+            queryset = queryset.filter(id__in=list(produit_ids))
+        return list(queryset.order_by("date_creation", "id").values_list(*CHAMPS, "statut"))
+
+    @classmethod
+    def _construire(
+        cls, lignes_lues: list[tuple], version: int, dernier_evenement: int, lu_le: datetime
+    ) -> InstantaneBitmaps:
+        """Bitsets des lignes lues, deja dans l'ordre des lignes."""
+        taille = len(lignes_lues)
+        ids, dates, prix = array("q"), array("q"), array("q")
+        attributs: list[tuple | None] = []
+        partages: dict[tuple, tuple] = {}
+        rangs: dict[str, dict[Any, list[int]]] = {facette: {} for facette in FACETTES}
+        for rang, (produit_id, categorie_id, prix_produit, date_creation, *chaines, _) in enumerate(lignes_lues):
+            ids.append(produit_id)
+            dates.append(microsecondes(date_creation))
+            prix.append(centimes(prix_produit))
+            valeurs = (categorie_id, *chaines)
+            attributs.append(partages.setdefault(valeurs, valeurs))
+            for facette, valeur in zip(FACETTES, valeurs):
+                if valeur is not None:
+                    rangs[facette].setdefault(valeur, []).append(rang)
+
+        tries = sorted(prix)
+        seuils = sorted({tries[(rang * taille) // cls.TRANCHES] for rang in range(1, cls.TRANCHES)}) if tries else []
+        par_tranche: list[list[int]] = [[] for _ in range(len(seuils) + 1)]
+        for rang, valeur in enumerate(prix):
+            par_tranche[bisect_left(seuils, valeur)].append(rang)
+
+        return InstantaneBitmaps(
+            version=version,
+            dernier_evenement=dernier_evenement,
+            charge_le=time.monotonic(),
+            lu_le=lu_le,
+            ids=ids,
+            dates=dates,
+            prix=prix,
+            attributs=attributs,
+            disponibles=(1 << taille) - 1,
+            index={
+                facette: {valeur: depuis_positions(liste, taille) for valeur, liste in valeurs.items()}
+                for facette, valeurs in rangs.items()
+            },
+            seuils=seuils,
+            tranches=[depuis_positions(liste, taille) for liste in par_tranche],
+            par_prix=sorted(zip(prix, ids)),
+            lignes={produit_id: rang for rang, produit_id in enumerate(ids)},
+        )
+
+    @classmethod
+    def _appliquer(
+        cls,
+        courant: InstantaneBitmaps,
+        produit_ids: set[int],
+        lignes_lues: list[tuple],
+        version: int,
+        dernier_evenement: int,
+        lu_le: datetime,
+    ) -> InstantaneBitmaps | None:
+        """Retire les bits des produits designes puis pose ceux de leurs lignes relues."""
+        ids, dates, prix = array("q", courant.ids), array("q", courant.dates), array("q", courant.prix)
+        attributs = list(courant.attributs)
+        index = {facette: dict(valeurs) for facette, valeurs in courant.index.items()}
+        tranches = list(courant.tranches)
+        par_prix = list(courant.par_prix)
+        lignes = dict(courant.lignes)
+        disponibles = courant.disponibles
+
+        for produit_id in produit_ids:
+            rang = lignes.get(produit_id)
+            if rang is None or attributs[rang] is None:
+                continue
+            masque = ~(1 << rang)
+            disponibles &= masque
+            for facette, valeur in zip(FACETTES, attributs[rang]):
+                if valeur is not None:
+                    index[facette][valeur] &= masque
+                    if not index[facette][valeur]:
+                        del index[facette][valeur]
+            tranche = bisect_left(courant.seuils, prix[rang])
+            tranches[tranche] &= masque
+            del par_prix[bisect_left(par_prix, (prix[rang], produit_id))]
+            attributs[rang] = None
+
+        partages = {valeurs: valeurs for valeurs in attributs if valeurs is not None}
+        for produit_id, categorie_id, prix_produit, date_creation, *chaines, statut in lignes_lues:
+            if statut != Produit.StatutChoices.DISPONIBLE:
+                continue
+            rang = lignes.get(produit_id)
+            cle = (microsecondes(date_creation), produit_id)
+            if rang is not None and dates[rang] != cle[0]:
+                # Identifiant reutilise (SQLite apres suppression): la ligne n'est plus a sa place.
+                return None
+            if rang is None:
+                if ids and cle <= (dates[-1], ids[-1]):
+                    return None
+                rang = lignes[produit_id] = len(ids)
+                ids.append(produit_id)
+                dates.append(cle[0])
+                prix.append(0)
+                attributs.append(None)
+            prix[rang] = centimes(prix_produit)
+            valeurs = (categorie_id, *chaines)
+            attributs[rang] = partages.setdefault(valeurs, valeurs)
+            bit = 1 << rang
+            disponibles |= bit
+            for facette, valeur in zip(FACETTES, valeurs):
+                if valeur is not None:
+                    index[facette][valeur] = index[facette].get(valeur, 0) | bit
+            tranches[bisect_left(courant.seuils, prix[rang])] |= bit
+            insort(par_prix, (prix[rang], produit_id))
+
+        return InstantaneBitmaps(
+            version=version,
+            dernier_evenement=dernier_evenement,
+            charge_le=courant.charge_le,
+            lu_le=lu_le,
+            ids=ids,
+            dates=dates,
+            prix=prix,
+            attributs=attributs,
+            disponibles=disponibles,
+            index=index,
+            seuils=courant.seuils,
+            tranches=tranches,
+            par_prix=par_prix,
+            lignes=lignes,
+        )
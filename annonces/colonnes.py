@@ -0,0 +1,267 @@
+"""Moteur de selection en colonnes: filtres, facettes et pages du catalogue en memoire.
+
+Avec ``CATALOGUE_MOTEUR = "colonnes"``, chaque processus garde un instantane
+NumPy des produits disponibles, une colonne par critere: id, categorie,
+prix (centimes), date de creation (microsecondes) et les chaines region,
+ville, etat et region d'origine codees en entiers. Un filtre devient un
+masque booleen, une facette un comptage sous le masque des autres filtres,
+une page les premiers indices dans l'ordre du tri. La base ne charge plus
+que les produits de la page visible.
+
+L'instantane est tenu a jour par le journal (``MoteurMemoire``); trop de
+lignes perimees imposent aussi un rechargement complet. La recherche plein
+texte (et le tri par pertinence) reste au moteur SQL.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, replace
+from datetime import datetime
+from decimal import ROUND_CEILING, ROUND_FLOOR
+from typing import Any
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .facettes import FACETTES, ResultatFacettes
+from .memoire import COLONNES_CODEES, MoteurMemoire, centimes, date_depuis, microsecondes, prix_depuis
+
+try:
+    import numpy as np
+except ImportError:  # Dependance optionnelle, requise par CATALOGUE_MOTEUR = "colonnes".
+    np = None
+
+
+def numpy_disponible() -> bool:
+    """Vrai si NumPy est installe."""
+    return np is not None
+
+
+@dataclass(frozen=True)
+class InstantaneColonnes:
+    """Colonnes des produits disponibles a une version du catalogue.
+
+    Les lignes remplacees ou retirees restent en place (``vivant`` a False)
+    jusqu'au prochain rechargement complet; ``lignes`` donne la ligne vivante
+    de chaque produit. Les tableaux ne sont jamais modifies apres publication.
+    """
+
+    version: int
+    dernier_evenement: int
+    charge_le: float
+    lu_le: datetime
+    ids: Any
+    vivant: Any
+    categorie: Any
+    prix: Any
+    date: Any
+    codes: dict[str, Any]
+    valeurs: dict[str, list[str]]
+    index: dict[str, dict[str, int]]
+    lignes: dict[int, int]
+
+
+class MoteurColonnes(MoteurMemoire):
+    """Selection des produits et facettes depuis l'instantane du processus."""
+
+    @classmethod
+    def verifier(cls) -> None:
+        """Leve ImproperlyConfigured si NumPy manque."""
+        if not numpy_disponible():
+            raise ImproperlyConfigured(
+                'CATALOGUE_MOTEUR = "colonnes" requiert numpy (pip install -r requirements.txt).'
+            )
+
+    @classmethod
+    def selectionner(
+        cls,
+        filtres,
+        descendants: list[int] | None,
+        champ: str,
+        descendant: bool,
+        position: tuple[Any, int] | None,
+        nombre: int,
+    ) -> list[tuple[int, Any]]:
+        """Premiers produits apres ``position``: partition puis tri des seules lignes retenues."""
+        instantane = cls.instantane()
+        base, conditions = cls._masques(instantane, filtres, descendants)
+        masque = cls._conjonction(base, conditions.values())
+        cle = instantane.date if champ == "date_creation" else instantane.prix
+        ids = instantane.ids
+
+        if position is not None:
+            valeur, produit_id = position
+            valeur = microsecondes(valeur) if champ == "date_creation" else centimes(valeur)
+            if descendant:
+                masque &= (cle < valeur) | ((cle == valeur) & (ids < produit_id))
+            else:
+                masque &= (cle > valeur) | ((cle == valeur) & (ids > produit_id))
+
+        indices = np.flatnonzero(masque)
+        cles, identifiants = cle[indices], ids[indices]
+        if descendant:
+            cles, identifiants = -cles, -identifiants
+        if len(indices) > nombre:
+            # Seuil du n-ieme plus petit: seules les lignes en deca sont triees.
+            seuil = np.partition(cles, nombre - 1)[nombre - 1]
+            retenus = cles <= seuil
+            indices, cles, identifiants = indices[retenus], cles[retenus], identifiants[retenus]
+        indices = indices[np.lexsort((identifiants, cles))[:nombre]]
+
+        if champ == "date_creation":
+            valeurs = [date_depuis(v) for v in instantane.date[indices]]
+        else:
+            valeurs = [prix_depuis(v) for v in instantane.prix[indices]]
+        return list(zip(ids[indices].tolist(), valeurs))
+
+    @classmethod
+    def facettes(cls, filtres, descendants: list[int] | None) -> ResultatFacettes:
+        """Total filtre et comptes disjonctifs de chaque facette, comme ``MoteurFacettes``."""
+        instantane = cls.instantane()
+        base, conditions = cls._masques(instantane, filtres, descendants)
+
+        comptes: dict[str, dict[Any, int]] = {}
+        for facette in FACETTES:
+            masque = cls._conjonction(
+                base, [condition for nom, condition in conditions.items() if nom != facette]
+            )
+            if facette == "categorie":
+                valeurs, totaux = np.unique(instantane.categorie[masque], return_counts=True)
+                resultat = dict(zip(valeurs.tolist(), totaux.tolist()))
+            else:
+                codes = instantane.codes[facette][masque]
+                totaux = np.bincount(codes[codes >= 0], minlength=len(instantane.valeurs[facette]))
+                resultat = {
+                    instantane.valeurs[facette][code]: int(totaux[code]) for code in np.flatnonzero(totaux)
+                }
+            if resultat:
+                comptes[facette] = resultat
+
+        total = int(cls._conjonction(base, conditions.values()).sum())
+        return ResultatFacettes(total=total, comptes=comptes)
+
+    @staticmethod
+    def _conjonction(base, masques: Iterable) -> Any:
+        """Intersection de ``base`` et des masques donnes (copie)."""
+        resultat = base.copy()
+        for masque in masques:
+            resultat &= masque
+        return resultat
+
+    @staticmethod
+    def _masques(
+        instantane: InstantaneColonnes, filtres, descendants: list[int] | None
+    ) -> tuple[Any, dict[str, Any]]:
+        """Masque des filtres hors facettes (prix) et masque de chaque facette active."""
+        base = instantane.vivant.copy()
+        if filtres.prix_min is not None:
+            base &= instantane.prix >= centimes(filtres.prix_min, ROUND_CEILING)
+        if filtres.prix_max is not None:
+            base &= instantane.prix <= centimes(filtres.prix_max, ROUND_FLOOR)
+
+        conditions: dict[str, Any] = {}
+        if descendants:
+            conditions["categorie"] = np.isin(instantane.categorie, descendants)
+        for facette in COLONNES_CODEES:
+            valeur = getattr(filtres, facette)
+            if valeur:
+                code = instantane.index[facette].get(valeur)
+                conditions[facette] = (
+                    instantane.codes[facette] == code
+                    if code is not None
+                    else np.zeros(len(instantane.ids), dtype=bool)
+                )
+        return base, conditions
+
+    @classmethod
+    def _appliquer(
+        cls,
+        courant: InstantaneColonnes,
+        produit_ids: set[int],
+        lignes_lues: list[tuple],
+        version: int,
+        dernier_evenement: int,
+        lu_le: datetime,
+    ) -> InstantaneColonnes | None:
+        """Perime les lignes des produits designes et ajoute leurs lignes lues en fin de colonnes."""
+        vivant = courant.vivant.copy()
+        lignes = dict(courant.lignes)
+        for produit_id in produit_ids:
+            ligne = lignes.pop(produit_id, None)
+            if ligne is not None:
+                vivant[ligne] = False
+        if len(vivant) - len(lignes) > len(vivant) * cls.SEUIL_RECHARGEMENT:
+            return None
+        return cls._construire(
+            lignes_lues,
+            version=version,
+            dernier_evenement=dernier_evenement,
+            lu_le=lu_le,
+            precedent=replace(courant, vivant=vivant, lignes=lignes),
+        )
+
+    @classmethod
+    def _construire(
+        cls,
+        lignes_lues: list[tuple],
+        version: int,
+        dernier_evenement: int,
+        lu_le: datetime,
+        precedent: InstantaneColonnes | None = None,
+    ) -> InstantaneColonnes:
+        """Encode les lignes lues en colonnes, a la suite de ``precedent`` s'il est donne."""
+        valeurs = {facette: list(precedent.valeurs[facette]) if precedent else [] for facette in COLONNES_CODEES}
+        index = {facette: dict(precedent.index[facette]) if precedent else {} for facette in COLONNES_CODEES}
+        nombre = len(lignes_lues)
+        ids = np.empty(nombre, dtype=np.int64)
+        categorie = np.empty(nombre, dtype=np.int64)
+        prix = np.empty(nombre, dtype=np.int64)
+        date = np.empty(nombre, dtype=np.int64)
+        codes = {facette: np.empty(nombre, dtype=np.int32) for facette in COLONNES_CODEES}
+
+        for rang, (produit_id, categorie_id, prix_produit, date_creation, *chaines) in enumerate(lignes_lues):
+            ids[rang] = produit_id
+            categorie[rang] = categorie_id
+            prix[rang] = centimes(prix_produit)
+            date[rang] = microsecondes(date_creation)
+            for facette, valeur in zip(COLONNES_CODEES, chaines):
+                if valeur is None:
+                    codes[facette][rang] = -1
+                    continue
+                code = index[facette].get(valeur)
+                if code is None:
+                    code = index[facette][valeur] = len(valeurs[facette])
+                    valeurs[facette].append(valeur)
+                codes[facette][rang] = code
+
+        decalage = len(precedent.ids) if precedent else 0
+        lignes = dict(precedent.lignes) if precedent else {}
+        lignes.update((produit_id, decalage + rang) for rang, produit_id in enumerate(ids.tolist()))
+        if precedent is not None:
+            ids = np.concatenate([precedent.ids, ids])
+            categorie = np.concatenate([precedent.categorie, categorie])
+            prix = np.concatenate([precedent.prix, prix])
+            date = np.concatenate([precedent.date, date])
+            codes = {facette: np.concatenate([precedent.codes[facette], codes[facette]]) for facette in codes}
+            vivant = np.concatenate([precedent.vivant, np.ones(nombre, dtype=bool)])
+            charge_le = precedent.charge_le
+        else:
+            vivant = np.ones(nombre, dtype=bool)
+            charge_le = time.monotonic()
+
+        return InstantaneColonnes(
+            version=version,
+            dernier_evenement=dernier_evenement,
+            charge_le=charge_le,
+            lu_le=lu_le,
+            ids=ids,
+            vivant=vivant,
+            categorie=categorie,
+            prix=prix,
+            date=date,
+            codes=codes,
+            valeurs=valeurs,
+            index=index,
+            lignes=lignes,
+        )
@@ -0,0 +1,176 @@
+"""Moteur de facettes du catalogue: tous les comptes en une seule passe groupee."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import reduce
+from operator import and_, or_
+from typing import Any
+
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, QuerySet, Sum, Value, When
+
+FACETTES = ("categorie", "region", "ville", "etat", "region_origine")
+
+
+@dataclass(frozen=True)
+class ResultatFacettes:
+    """Total filtre et comptes par valeur pour chaque facette."""
+
+    total: int = 0
+    comptes: dict[str, dict[Any, int]] = field(default_factory=dict)
+
+    def valeurs(self, facette: str) -> dict[Any, int]:
+        """Retourne les comptes d'une facette (vide si aucune valeur)."""
+        return self.comptes.get(facette, {})
+
+
+class MoteurFacettes:
+    """Calcule le total et les comptes de facettes en une requete groupee.
+
+    Les facettes sont disjonctives: le compte d'une facette applique tous les
+    filtres actifs sauf le sien, ce qui permet d'afficher les alternatives
+    d'une liste deroulante deja selectionnee. Chaque ligne porte un indicateur
+    par facette; PostgreSQL agrege ces indicateurs avec GROUPING SETS, les
+    autres moteurs groupent sur le tuple complet puis replient en Python.
+    """
+
+    COLONNES = {
+        "categorie": "categorie_id",
+        "region": "lieu_vente__region",
+        "ville": "lieu_vente__ville",
+        "etat": "produit_retail__etat",
+        "region_origine": "produit_agricole__region_origine",
+    }
+
+    @staticmethod
+    def calculer(
+        base: QuerySet,
+        conditions: dict[str, Q],
+        colonnes: dict[str, str] | None = None,
+        facettes: tuple[str, ...] = FACETTES,
+    ) -> ResultatFacettes:
+        """Calcule les facettes de ``base`` sous les conditions actives.
+
+        Args:
+            base: Queryset deja restreint par les filtres non facettes.
+            conditions: Condition du filtre actif, par nom de facette.
+            colonnes: Chemin ORM de chaque facette (defaut: modele Produit).
+            facettes: Facettes a calculer, les autres sont omises du groupement.
+
+        Returns:
+            Le total filtre et les comptes par valeur de chaque facette.
+        """
+        colonnes = colonnes or MoteurFacettes.COLONNES
+        conditions_sans = {
+            facette: MoteurFacettes._combiner(
+                [condition for nom, condition in conditions.items() if nom != facette]
+            )
+            for facette in facettes
+        }
+        condition_totale = MoteurFacettes._combiner(list(conditions.values()))
+
+        # Une ligne ne compte que si elle echoue au plus a un filtre actif.
+        elagage = [condition for condition in conditions_sans.values() if condition is not None]
+        if condition_totale is not None and len(elagage) == len(facettes):
+            base = base.filter(reduce(or_, elagage + [condition_totale]))
+
+        lignes = base.values(
+            **{f"c_{facette}": F(colonnes[facette]) for facette in facettes}
+        ).annotate(
+            i_total=MoteurFacettes._indicateur(condition_totale),
+            **{
+                f"i_{facette}": MoteurFacettes._indicateur(conditions_sans[facette])
+                for facette in facettes
+            },
+        )
+
+        if connections[base.db].vendor == "postgresql":
+            return MoteurFacettes._calculer_grouping_sets(lignes, facettes)
+        return MoteurFacettes._calculer_par_tuple(lignes, facettes)
+
+    @staticmethod
+    def _combiner(conditions: list[Q]) -> Q | None:
+        """Combine des conditions en conjonction, None si aucune."""
+        if not conditions:
+            return None
+        return reduce(and_, conditions)
+
+    @staticmethod
+    def _indicateur(condition: Q | None) -> Case | Value:
+        """Retourne 1 si la ligne satisfait la condition, 0 sinon."""
+        if condition is None:
+            return Value(1, output_field=IntegerField())
+        return Case(
+            When(condition, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+    @staticmethod
+    def _calculer_par_tuple(lignes: QuerySet, facettes: tuple[str, ...]) -> ResultatFacettes:
+        """Groupe sur le tuple des facettes puis replie les comptes en Python."""
+        cles = [f"c_{facette}" for facette in facettes]
+        groupes = (
+            lignes.order_by()
+            .values(*cles)
+            .annotate(
+                n_total=Sum("i_total"),
+                **{f"n_{facette}": Sum(f"i_{facette}") for facette in facettes},
+            )
+        )
+
+        total = 0
+        comptes: dict[str, dict[Any, int]] = defaultdict(lambda: defaultdict(int))
+        for groupe in groupes:
+            total += groupe["n_total"]
+            for facette in facettes:
+                valeur = groupe[f"c_{facette}"]
+                if valeur is not None and groupe[f"n_{facette}"]:
+                    comptes[facette][valeur] += groupe[f"n_{facette}"]
+        return ResultatFacettes(
+            total=total,
+            comptes={facette: dict(valeurs) for facette, valeurs in comptes.items()},
+        )
+
+    @staticmethod
+    def _calculer_grouping_sets(
+        lignes: QuerySet, facettes: tuple[str, ...]
+    ) -> ResultatFacettes:
+        """Agrege chaque facette dans son propre grouping set (PostgreSQL)."""
+        sql, params = lignes.order_by().query.sql_with_params()
+        cles = [f'"c_{facette}"' for facette in facettes]
+        sommes = ", ".join(
+            ['SUM("i_total")'] + [f'SUM("i_{facette}")' for facette in facettes]
+        )
+        requete = (
+            f"SELECT {', '.join(cles)}, GROUPING({', '.join(cles)}), {sommes} "
+            f"FROM ({sql}) AS facettes "
+            f"GROUP BY GROUPING SETS ({', '.join(f'({cle})' for cle in cles)}, ())"
+        )
+
+        # GROUPING() retourne un bit a 1 par colonne absente du grouping set,
+        # la premiere colonne etant le bit de poids fort.
+        nombre = len(facettes)
+        masque_complet = (1 << nombre) - 1
+        facette_par_masque = {
+            masque_complet ^ (1 << (nombre - 1 - index)): (index, facette)
+            for index, facette in enumerate(facettes)
+        }
+
+        total = 0
+        comptes: dict[str, dict[Any, int]] = {}
+        with connections[lignes.db].cursor() as cursor:
+            cursor.execute(requete, params)
+            for ligne in cursor.fetchall():
+                masque = ligne[nombre]
+                sommes_ligne = ligne[nombre + 1 :]
+                if masque == masque_complet:
+                    total = int(sommes_ligne[0] or 0)
+                    continue
+                index, facette = facette_par_masque[masque]
+                valeur, compte = ligne[index], int(sommes_ligne[index + 1] or 0)
+                if valeur is not None and compte:
+                    comptes.setdefault(facette, {})[valeur] = compte
+        return ResultatFacettes(total=total, comptes=comptes)
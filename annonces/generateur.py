@@ -0,0 +1,437 @@
+"""Generateur deterministe de catalogues synthetiques par insertions groupees."""
+
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from profil.models import AvisConfiance, ProfilUtilisateur
+
+from .localisations import RegistreLocalisations
+from .models import (
+    CarteCatalogue,
+    Categorie,
+    CompteurDisponibilite,
+    EvenementCatalogue,
+    FichierContenu,
+    ImageProduit,
+    Localisation,
+    Produit,
+    ProduitAgricole,
+    ProduitRetail,
+    VersionCatalogue,
+)
+from .projection import ProjectionCatalogue
+from .recherche import get_backend_recherche
+from .stockage import stockage_contenu
+
+User = get_user_model()
+
+LIEUX = {
+    Localisation.RegionChoices.LITTORAL: {
+        "Douala": ["Akwa", "Bonanjo", "Bonamoussadi", "Deido", "Makepe", "Bonaberi"],
+        "Nkongsamba": ["Centre"],
+    },
+    Localisation.RegionChoices.CENTRE: {
+        "Yaounde": ["Bastos", "Mvog-Ada", "Essos", "Biyem-Assi", "Mendong"],
+        "Mbalmayo": ["Centre"],
+    },
+    Localisation.RegionChoices.OUEST: {"Bafoussam": ["Centre-ville", "Tamdja"], "Dschang": ["Foto"]},
+    Localisation.RegionChoices.NORD: {"Garoua": ["Plateau", "Roumde Adjia"]},
+    Localisation.RegionChoices.SUD_OUEST: {"Buea": ["Molyko", "Great Soppo"], "Limbe": ["Down Beach"]},
+    Localisation.RegionChoices.NORD_OUEST: {"Bamenda": ["Commercial Avenue"]},
+    Localisation.RegionChoices.ADAMAOUA: {"Ngaoundere": ["Dang"]},
+    Localisation.RegionChoices.EST: {"Bertoua": ["Centre"]},
+    Localisation.RegionChoices.EXTREME_NORD: {"Maroua": ["Domayo"]},
+    Localisation.RegionChoices.SUD: {"Ebolowa": ["Centre"], "Kribi": ["Mokolo"]},
+}
+
+# slug -> (nom, slug parent)
+CATEGORIES = {
+    "retail": ("Retail", None),
+    "agricole": ("Agricole", None),
+    "telephones": ("Telephones", "retail"),
+    "smartphones": ("Smartphones", "telephones"),
+    "accessoires-telephone": ("Accessoires telephone", "telephones"),
+    "electromenager": ("Electromenager", "retail"),
+    "informatique": ("Informatique", "retail"),
+    "mode-beaute": ("Mode & Beaute", "retail"),
+    "fruits-legumes": ("Fruits & Legumes", "agricole"),
+    "cereales-legumineuses": ("Cereales & Legumineuses", "agricole"),
+    "epices-produits-secs": ("Epices & Produits secs", "agricole"),
+    "cacao-cafe": ("Cacao & Cafe", "agricole"),
+}
+
+# slug de categorie feuille -> (articles, qualificatifs, prix minimum, prix maximum)
+VOCABULAIRE = {
+    "smartphones": (
+        ["Tecno Spark", "Tecno Camon", "Itel A70", "Infinix Hot", "Samsung Galaxy A54", "iPhone 12"],
+        ["64Go", "128Go", "256Go", "double sim", "debloque"],
+        35000,
+        450000,
+    ),
+    "accessoires-telephone": (
+        ["Chargeur rapide", "Coque rigide", "Ecouteurs sans fil", "Power bank", "Cable USB-C"],
+        ["original", "20W", "10000mAh", "noir", "blanc"],
+        1500,
+        35000,
+    ),
+    "electromenager": (
+        ["Refrigerateur Hisense", "Mixeur Moulinex", "Ventilateur Binatone", "Congelateur", "Fer a repasser"],
+        ["220L", "600W", "classe A", "garantie 6 mois", "inox"],
+        8000,
+        600000,
+    ),
+    "informatique": (
+        ["Ordinateur portable HP", "Imprimante Canon", "Cle USB", "Disque dur externe", "Ecran Dell"],
+        ["i5", "8Go RAM", "1To", "24 pouces", "reconditionne"],
+        4000,
+        750000,
+    ),
+    "mode-beaute": (
+        ["Pagne wax", "Sac a main", "Chaussures cuir", "Parfum", "Montre"],
+        ["taille M", "fait main", "importe", "edition limitee", "neuf"],
+        2500,
+        120000,
+    ),
+    "fruits-legumes": (
+        ["Plantain", "Tomates", "Ananas", "Avocats", "Oignons"],
+        ["regime", "caisse 20kg", "bio", "calibre export", "frais"],
+        1500,
+        40000,
+    ),
+    "cereales-legumineuses": (
+        ["Sac de mais", "Haricots rouges", "Riz local", "Arachides", "Soja"],
+        ["50kg", "25kg", "seche", "trie", "recolte recente"],
+        6000,
+        90000,
+    ),
+    "epices-produits-secs": (
+        ["Gingembre", "Poivre de Penja", "Piment seche", "Njansang", "Ail"],
+        ["10kg", "1kg", "moulu", "premium", "en vrac"],
+        1000,
+        60000,
+    ),
+    "cacao-cafe": (
+        ["Sac de cacao", "Cafe arabica", "Cafe robusta", "Feves de cacao"],
+        ["50kg", "premium", "fermente", "torrefie", "export"],
+        20000,
+        150000,
+    ),
+}
+
+UNITES_AGRICOLES = ["Sac", "Caisse", "Regime", "Kg", "Lot 10kg", "Seau"]
+
+STATUTS = (
+    [Produit.StatutChoices.DISPONIBLE] * 17
+    + [Produit.StatutChoices.VENDU] * 2
+    + [Produit.StatutChoices.EN_SEQUESTRE]
+)
+
+DATE_REFERENCE = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+MOT_DE_PASSE_GENERE = "KzoneDemo123!"
+
+IMAGES_FACTICES = 6
+COULEURS_FACTICES = ["#005a2f", "#22c55e", "#0ea5e9", "#f59e0b", "#ef4444", "#8b5cf6"]
+COMMENTAIRES_AVIS = ["", "Vendeur serieux.", "Livraison rapide.", "Conforme a l'annonce.", "Bon contact."]
+
+
+@dataclass(frozen=True)
+class RapportGeneration:
+    """Volumes presents apres une generation."""
+
+    utilisateurs: int
+    produits: int
+    produits_crees: int
+    avis: int = 0
+    images: int = 0
+
+
+class GenerateurCatalogue:
+    """Produit un catalogue synthetique deterministe pour une graine donnee.
+
+    Localisations, arbre de categories, vendeurs et profils, avis, produits
+    retail / agricoles et images factices (quelques fichiers SVG partages,
+    ecrits localement: aucun acces reseau). Chaque ligne est derivee de
+    ``(graine, index)``: relancer la generation avec la meme graine produit
+    les memes donnees, et agrandir un jeu existant (1k puis 10k) n'ajoute que
+    les lignes manquantes (seuls les produits des vendeurs generes sont
+    comptes). Les insertions passent par ``bulk_create`` par lots, chaque lot
+    dans sa propre transaction, les dates historiques etant reportees par
+    ``bulk_update`` (``auto_now`` les remplace a l'insertion); les donnees
+    derivees (compteurs, index de recherche, registre des localisations,
+    version) sont reconstruites une seule fois a la fin.
+    """
+
+    TAILLE_LOT = 5000
+    PREFIXE_UTILISATEUR = "gen"
+
+    def __init__(self, graine: int = 0, taille_lot: int = TAILLE_LOT, journal=None) -> None:
+        """Prepare un generateur pour une graine et une taille de lot."""
+        self.graine = graine
+        self.taille_lot = taille_lot
+        self.journal = journal or (lambda message: None)
+
+    @property
+    def prefixe(self) -> str:
+        """Prefixe des noms d'utilisateur generes pour cette graine."""
+        return f"{self.PREFIXE_UTILISATEUR}{self.graine}_"
+
+    def generer(
+        self, produits: int, utilisateurs: int, avec_images: bool = True
+    ) -> RapportGeneration:
+        """Complete la base jusqu'aux volumes demandes puis reconstruit les derivees."""
+        lieux = self._creer_localisations()
+        feuilles = self._creer_categories()
+        vendeurs = self._creer_utilisateurs(utilisateurs, lieux)
+        images = self._creer_images_factices() if avec_images else []
+
+        existants = Produit.objects.filter(vendeur__username__startswith=self.prefixe).count()
+        for debut in range(existants, produits, self.taille_lot):
+            fin = min(debut + self.taille_lot, produits)
+            with transaction.atomic():
+                self._creer_produits(range(debut, fin), vendeurs, feuilles, lieux, images)
+            self.journal(f"{fin}/{produits} produits")
+
+        self.reconstruire_derivees()
+        return RapportGeneration(
+            utilisateurs=len(vendeurs),
+            produits=Produit.objects.count(),
+            produits_crees=max(produits - existants, 0),
+            avis=AvisConfiance.objects.count(),
+            images=ImageProduit.objects.count(),
+        )
+
+    @staticmethod
+    def reconstruire_derivees() -> None:
+        """Recalcule les donnees que bulk_create ne maintient pas (pas de signaux)."""
+        CompteurDisponibilite.reconstruire()
+        FichierContenu.reconstruire()
+        ProfilUtilisateur.reconstruire_reputation()
+        get_backend_recherche().reconstruire()
+        if CarteCatalogue.actif():
+            ProjectionCatalogue.reconstruire()
+        EvenementCatalogue.enregistrer(None)
+        # Localisations inserees sans signal: perime le registre et les ETags du catalogue.
+        RegistreLocalisations.invalider()
+        VersionCatalogue.incrementer()
+
+    def _rng(self, espace: str, index: int) -> random.Random:
+        """Generateur pseudo-aleatoire propre a une ligne."""
+        return random.Random(f"{self.graine}:{espace}:{index}")
+
+    def _creer_localisations(self) -> list[Localisation]:
+        """Cree les localisations de reference (idempotent)."""
+        lieux = [
+            Localisation(region=region, ville=ville, quartier=quartier)
+            for region, villes in LIEUX.items()
+            for ville, quartiers in villes.items()
+            for quartier in quartiers
+        ]
+        Localisation.objects.bulk_create(lieux, ignore_conflicts=True)
+        return list(Localisation.objects.order_by("id"))
+
+    def _creer_categories(self) -> list[tuple[Categorie, str]]:
+        """Cree l'arbre de categories et retourne les feuilles avec leur racine."""
+        categories: dict[str, Categorie] = {}
+        for slug, (nom, parent_slug) in CATEGORIES.items():
+            categories[slug], _ = Categorie.objects.get_or_create(
+                slug=slug, defaults={"nom": nom, "parent": categories.get(parent_slug)}
+            )
+        feuilles = []
+        for slug in VOCABULAIRE:
+            racine = slug
+            while CATEGORIES[racine][1] is not None:
+                racine = CATEGORIES[racine][1]
+            feuilles.append((categories[slug], racine))
+        return feuilles
+
+    def _creer_utilisateurs(self, total: int, lieux: list[Localisation]) -> list[int]:
+        """Cree vendeurs, profils et avis synthetiques; retourne les ids des vendeurs."""
+        prefixe = self.prefixe
+        existants = User.objects.filter(username__startswith=prefixe).count()
+        mot_de_passe = make_password(MOT_DE_PASSE_GENERE)
+        for debut in range(existants, total, self.taille_lot):
+            indices = range(debut, min(debut + self.taille_lot, total))
+            with transaction.atomic():
+                User.objects.bulk_create(
+                    [
+                        User(
+                            username=f"{prefixe}{index:07d}",
+                            email=f"{prefixe}{index:07d}@kzone.demo",
+                            password=mot_de_passe,
+                        )
+                        for index in indices
+                    ],
+                    ignore_conflicts=True,
+                )
+                nouveaux = dict(
+                    User.objects.filter(
+                        username__in=[f"{prefixe}{index:07d}" for index in indices]
+                    ).values_list("username", "id")
+                )
+                self._creer_profils(indices, prefixe, nouveaux, lieux)
+            self.journal(f"{indices.stop}/{total} utilisateurs")
+
+        vendeurs = list(
+            User.objects.filter(username__startswith=prefixe)
+            .order_by("username")
+            .values_list("id", flat=True)[:total]
+        )
+        for debut in range(existants, total, self.taille_lot):
+            with transaction.atomic():
+                self._creer_avis(range(debut, min(debut + self.taille_lot, total)), vendeurs)
+        return vendeurs
+
+    def _creer_profils(
+        self, indices: range, prefixe: str, ids: dict[str, int], lieux: list[Localisation]
+    ) -> None:
+        """Insere le profil de chaque vendeur du lot."""
+        profils = []
+        for index in indices:
+            rng = self._rng("utilisateur", index)
+            professionnel = rng.random() < 0.3
+            profils.append(
+                ProfilUtilisateur(
+                    utilisateur_id=ids[f"{prefixe}{index:07d}"],
+                    localisation_defaut=rng.choice(lieux),
+                    type_vendeur=(
+                        ProfilUtilisateur.TypeVendeurChoices.PROFESSIONNEL
+                        if professionnel
+                        else ProfilUtilisateur.TypeVendeurChoices.PARTICULIER
+                    ),
+                    moyen_paiement_prefere=rng.choice(ProfilUtilisateur.MoyenPaiementChoices.values),
+                    numero_paiement=f"6{rng.randrange(50_000_000, 100_000_000)}",
+                    badge_trustcam=professionnel and rng.random() < 0.7,
+                )
+            )
+        ProfilUtilisateur.objects.bulk_create(profils, batch_size=1000, ignore_conflicts=True)
+
+    def _creer_avis(self, indices: range, vendeurs: list[int]) -> None:
+        """Insere de zero a quatre avis recus par chaque vendeur du lot."""
+        if len(vendeurs) < 2:
+            return
+        avis, dates = [], {}
+        for index in indices:
+            rng = self._rng("avis", index)
+            auteurs = {rng.randrange(len(vendeurs)) for _ in range(rng.randrange(5))} - {index}
+            for auteur in sorted(auteurs):
+                avis.append(
+                    AvisConfiance(
+                        auteur_id=vendeurs[auteur],
+                        cible_id=vendeurs[index],
+                        note=rng.choice([5, 5, 4, 4, 4, 3, 2, 1]),
+                        commentaire=rng.choice(COMMENTAIRES_AVIS),
+                    )
+                )
+                dates[vendeurs[auteur], vendeurs[index]] = DATE_REFERENCE - timedelta(
+                    seconds=rng.randrange(365 * 24 * 3600)
+                )
+        AvisConfiance.objects.bulk_create(avis, batch_size=1000, ignore_conflicts=True)
+
+        # ignore_conflicts ne renvoie pas les cles: les avis sont relus par couple.
+        inseres = AvisConfiance.objects.filter(cible_id__in=[vendeurs[index] for index in indices])
+        avis = []
+        for ligne in inseres.only("id", "auteur_id", "cible_id"):
+            date = dates.get((ligne.auteur_id, ligne.cible_id))
+            if date is not None:
+                ligne.date_creation = date
+                avis.append(ligne)
+        AvisConfiance.objects.bulk_update(avis, ["date_creation"], batch_size=1000)
+
+    @staticmethod
+    def _creer_images_factices() -> list[str]:
+        """Ecrit une fois les images SVG partagees par les produits generes."""
+        chemins = []
+        for numero, couleur in enumerate(COULEURS_FACTICES[:IMAGES_FACTICES], start=1):
+            svg = (
+                "<svg xmlns='http://www.w3.org/2000/svg' width='640' height='420' "
+                f"viewBox='0 0 640 420'><rect width='640' height='420' fill='{couleur}'/>"
+                "<text x='50%' y='50%' dominant-baseline='middle' text-anchor='middle' "
+                f"font-family='Arial, sans-serif' font-size='40' fill='#ffffff'>K-Zone {numero}</text>"
+                "</svg>"
+            )
+            # Stockage par contenu: aucune ecriture si le fichier existe deja.
+            chemins.append(
+                stockage_contenu.save("catalogue/produits/factice.svg", ContentFile(svg.encode("utf-8")))
+            )
+        return chemins
+
+    def _creer_produits(
+        self,
+        indices: range,
+        vendeurs: list[int],
+        feuilles: list[tuple[Categorie, str]],
+        lieux: list[Localisation],
+        images: list[str],
+    ) -> None:
+        """Insere un lot de produits, leurs extensions retail / agricole et leurs images."""
+        produits, racines, tirages, dates = [], [], [], []
+        for index in indices:
+            rng = self._rng("produit", index)
+            categorie, racine = rng.choice(feuilles)
+            articles, qualificatifs, prix_min, prix_max = VOCABULAIRE[categorie.slug]
+            article = rng.choice(articles)
+            date_creation = DATE_REFERENCE - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+            produits.append(
+                Produit(
+                    vendeur_id=vendeurs[rng.randrange(len(vendeurs))],
+                    categorie=categorie,
+                    lieu_vente=rng.choice(lieux),
+                    titre=f"{article} {rng.choice(qualificatifs)}",
+                    description=(
+                        f"{article} {', '.join(rng.sample(qualificatifs, 2))}. "
+                        f"Annonce {index}, remise en main propre ou livraison."
+                    ),
+                    prix=Decimal(rng.randrange(prix_min, prix_max, 500)),
+                    statut=rng.choice(STATUTS),
+                )
+            )
+            racines.append(racine)
+            tirages.append(rng)
+            dates.append((date_creation, date_creation + timedelta(seconds=rng.randrange(30 * 24 * 3600))))
+
+        Produit.objects.bulk_create(produits, batch_size=1000)
+        for produit, (date_creation, date_mise_a_jour) in zip(produits, dates):
+            produit.date_creation, produit.date_mise_a_jour = date_creation, date_mise_a_jour
+        Produit.objects.bulk_update(produits, ["date_creation", "date_mise_a_jour"], batch_size=1000)
+
+        retail, agricole, lignes_images = [], [], []
+        for index, produit, racine, rng in zip(indices, produits, racines, tirages):
+            if images:
+                tirage_images = self._rng("image", index)
+                lignes_images.extend(
+                    ImageProduit(produit=produit, image=chemin, ordre=ordre)
+                    for ordre, chemin in enumerate(
+                        tirage_images.sample(images, tirage_images.randrange(4)), start=1
+                    )
+                )
+            if racine == "retail":
+                retail.append(
+                    ProduitRetail(
+                        produit=produit,
+                        marque=produit.titre.split(" ")[0],
+                        etat=rng.choice(ProduitRetail.EtatChoices.values),
+                        specifications={"livraison": rng.random() < 0.5},
+                    )
+                )
+            else:
+                agricole.append(
+                    ProduitAgricole(
+                        produit=produit,
+                        region_origine=rng.choice(Localisation.RegionChoices.values),
+                        unite_mesure=rng.choice(UNITES_AGRICOLES),
+                        date_recolte=(produit.date_creation - timedelta(days=rng.randrange(15))).date(),
+                        duree_conservation=rng.randrange(3, 60),
+                    )
+                )
+        ProduitRetail.objects.bulk_create(retail, batch_size=1000)
+        ProduitAgricole.objects.bulk_create(agricole, batch_size=1000)
+        ImageProduit.objects.bulk_create(lignes_images, batch_size=1000)
@@ -0,0 +1,101 @@
+"""Derivees responsive des images produit: plusieurs largeurs en WebP et JPEG."""
+
+from __future__ import annotations
+
+from io import BytesIO
+from pathlib import PurePosixPath
+from typing import Any
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+VERSION_MANIFESTE = 1
+LARGEURS = (320, 640, 960, 1280)
+LARGEUR_DEFAUT = 640
+DOSSIER_DERIVEES = "derivees"
+
+# format -> (format Pillow, options d'encodage)
+FORMATS = {
+    "webp": ("WEBP", {"quality": 78, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def chemin_derivee(nom_original: str, largeur: int, extension: str) -> str:
+    """Range la derivee a cote de l'original: ``<dossier>/derivees/<nom>-<largeur>w.<ext>``."""
+    original = PurePosixPath(nom_original)
+    return str(original.parent / DOSSIER_DERIVEES / f"{original.stem}-{largeur}w.{extension}")
+
+
+def largeurs_cibles(largeur_originale: int) -> list[int]:
+    """Largeurs a produire sans jamais agrandir l'original."""
+    largeurs = [largeur for largeur in LARGEURS if largeur < largeur_originale]
+    largeurs.append(min(largeur_originale, LARGEURS[-1]))
+    return sorted(set(largeurs))
+
+
+def generer_derivees(fichier, storage: Storage) -> dict[str, Any]:
+    """Produit les derivees d'un fichier image et retourne leur manifeste.
+
+    Les fichiers que Pillow ne sait pas lire (SVG, document corrompu) donnent
+    un manifeste sans variante: les gabarits retombent sur l'original.
+    """
+    manifeste: dict[str, Any] = {"version": VERSION_MANIFESTE, "source": fichier.name, "variantes": {}}
+    try:
+        fichier.open("rb")
+        with Image.open(fichier) as source:
+            image = ImageOps.exif_transpose(source)
+            image.load()
+    except (UnidentifiedImageError, OSError, ValueError):
+        return manifeste
+    finally:
+        fichier.close()
+
+    manifeste["largeur"], manifeste["hauteur"] = image.size
+    opaque = image.convert("RGB") if image.mode != "RGB" else image
+    for largeur in largeurs_cibles(image.width):
+        hauteur = max(round(image.height * largeur / image.width), 1)
+        for extension, (format_pillow, options) in FORMATS.items():
+            base = image if extension == "webp" and image.mode in {"RGBA", "LA"} else opaque
+            redimensionnee = base.resize((largeur, hauteur), Image.Resampling.LANCZOS)
+            tampon = BytesIO()
+            redimensionnee.save(tampon, format=format_pillow, **options)
+            chemin = chemin_derivee(fichier.name, largeur, extension)
+            if storage.exists(chemin):
+                storage.delete(chemin)
+            chemin = storage.save(chemin, ContentFile(tampon.getvalue()))
+            manifeste["variantes"].setdefault(extension, []).append([largeur, chemin])
+    return manifeste
+
+
+def chemins_derivees(manifeste: dict[str, Any]) -> set[str]:
+    """Fichiers references par un manifeste."""
+    return {
+        chemin
+        for variantes in (manifeste or {}).get("variantes", {}).values()
+        for _largeur, chemin in variantes
+    }
+
+
+def supprimer_derivees(
+    manifeste: dict[str, Any], storage: Storage, conserver: dict[str, Any] | None = None
+) -> None:
+    """Supprime les fichiers d'un manifeste, hors ceux encore references par ``conserver``."""
+    for chemin in chemins_derivees(manifeste) - chemins_derivees(conserver):
+        storage.delete(chemin)
+
+
+def srcset(manifeste: dict[str, Any], extension: str, storage: Storage) -> str:
+    """Valeur d'attribut ``srcset`` pour un format du manifeste."""
+    variantes = (manifeste or {}).get("variantes", {}).get(extension, [])
+    return ", ".join(f"{storage.url(chemin)} {largeur}w" for largeur, chemin in variantes)
+
+
+def chemin_defaut(manifeste: dict[str, Any], extension: str = "jpeg") -> str | None:
+    """Derivee servie aux clients sans ``srcset``: la plus proche de ``LARGEUR_DEFAUT``."""
+    variantes = (manifeste or {}).get("variantes", {}).get(extension, [])
+    if not variantes:
+        return None
+    _largeur, chemin = min(variantes, key=lambda variante: abs(variante[0] - LARGEUR_DEFAUT))
+    return chemin
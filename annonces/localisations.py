@@ -0,0 +1,143 @@
+"""Registre en memoire des localisations: arbre region -> ville -> quartier.
+
+Les localisations changent rarement et sont lues partout (profil, filtres,
+liste des villes d'une region). Chaque processus garde un instantane immuable
+de la table, valide par le compteur ``VersionCatalogue.LOCALISATIONS``:
+seules les ecritures sur ``Localisation`` (et ``invalider``) l'incrementent
+en base, les autres ecritures du catalogue ne periment pas l'instantane.
+Chaque processus le recharge a sa prochaine lecture apres un increment. Le
+compteur est relu en base a chaque acces (une requete sur la cle primaire),
+sauf avec un cache partage: un jeton garde dans un cache local ne serait
+jamais vu des autres processus.
+
+L'arbre est aussi servi en JSON sous une URL portant son empreinte
+(``contenu_json``/``empreinte``): le navigateur le garde indefiniment et
+une nouvelle version change d'URL.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field
+
+from .models import Localisation, VersionCatalogue
+
+Lieu = tuple[str, str, str]
+
+
+@dataclass(frozen=True)
+class InstantaneLocalisations:
+    """Etat charge une fois par version: index dans les deux sens et export JSON."""
+
+    version: int
+    identifiants: dict[Lieu, int] = field(default_factory=dict)
+    lieux: dict[int, Lieu] = field(default_factory=dict)
+    arbre: dict[str, dict[str, list[str]]] = field(default_factory=dict)
+    contenu_json: bytes = b"{}"
+    empreinte: str = ""
+
+
+class RegistreLocalisations:
+    """Acces aux localisations depuis l'instantane du processus."""
+
+    LONGUEUR_EMPREINTE = 16
+
+    _instantane: InstantaneLocalisations | None = None
+    _verrou = threading.Lock()
+
+    @classmethod
+    def instantane(cls) -> InstantaneLocalisations:
+        """Retourne l'instantane a jour, recharge si la version des localisations a change."""
+        version = VersionCatalogue.courante(VersionCatalogue.LOCALISATIONS)
+        instantane = cls._instantane
+        if instantane is not None and instantane.version == version:
+            return instantane
+        with cls._verrou:
+            if cls._instantane is None or cls._instantane.version != version:
+                cls._instantane = cls._charger(version)
+            return cls._instantane
+
+    @classmethod
+    def reinitialiser(cls) -> None:
+        """Oublie l'instantane du processus (tests, changement de base)."""
+        with cls._verrou:
+            cls._instantane = None
+
+    @classmethod
+    def arbre(cls) -> dict[str, dict[str, list[str]]]:
+        """Regions, leurs villes et leurs quartiers, tries."""
+        return cls.instantane().arbre
+
+    @classmethod
+    def regions(cls) -> list[str]:
+        """Regions ayant au moins une localisation."""
+        return list(cls.arbre())
+
+    @classmethod
+    def villes(cls, region: str = "") -> list[str]:
+        """Villes d'une region, ou de toutes les regions si ``region`` est vide."""
+        arbre = cls.arbre()
+        if region:
+            return list(arbre.get(region, {}))
+        return sorted({ville for villes in arbre.values() for ville in villes})
+
+    @classmethod
+    def identifiant(cls, region: str, ville: str, quartier: str) -> int | None:
+        """Identifiant de la localisation, None si elle n'existe pas."""
+        return cls.instantane().identifiants.get((region, ville, quartier))
+
+    @classmethod
+    def lieu(cls, localisation_id: int | None) -> Lieu | None:
+        """Triplet (region, ville, quartier) d'un identifiant connu."""
+        return cls.instantane().lieux.get(localisation_id)
+
+    @classmethod
+    def interner(cls, region: str, ville: str, quartier: str) -> int:
+        """Identifiant de la localisation, creee seulement si elle est inconnue."""
+        localisation_id = cls.identifiant(region, ville, quartier)
+        if localisation_id is None:
+            localisation, _ = Localisation.objects.get_or_create(
+                region=region, ville=ville, quartier=quartier
+            )
+            localisation_id = localisation.pk
+        return localisation_id
+
+    @classmethod
+    def empreinte(cls) -> str:
+        """Empreinte du contenu JSON, a placer dans son URL."""
+        return cls.instantane().empreinte
+
+    @classmethod
+    def contenu_json(cls) -> bytes:
+        """Arbre serialise de facon stable (cles triees, sans espaces)."""
+        return cls.instantane().contenu_json
+
+    @classmethod
+    def invalider(cls) -> None:
+        """Perime les instantanes de tous les processus apres une ecriture sans signal."""
+        VersionCatalogue.incrementer(VersionCatalogue.LOCALISATIONS)
+
+    @classmethod
+    def _charger(cls, version: int) -> InstantaneLocalisations:
+        """Lit la table en une requete et construit index, arbre et export."""
+        identifiants: dict[Lieu, int] = {}
+        lieux: dict[int, Lieu] = {}
+        arbre: dict[str, dict[str, list[str]]] = {}
+        lignes = Localisation.objects.order_by("region", "ville", "quartier").values_list(
+            "id", "region", "ville", "quartier"
+        )
+        for localisation_id, region, ville, quartier in lignes:
+            identifiants[(region, ville, quartier)] = localisation_id
+            lieux[localisation_id] = (region, ville, quartier)
+            arbre.setdefault(region, {}).setdefault(ville, []).append(quartier)
+        contenu = json.dumps(arbre, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode()
+        return InstantaneLocalisations(
+            version=version,
+            identifiants=identifiants,
+            lieux=lieux,
+            arbre=arbre,
+            contenu_json=contenu,
+            empreinte=hashlib.sha256(contenu).hexdigest()[: cls.LONGUEUR_EMPREINTE],
+        )
@@ -0,0 +1,350 @@
+"""Banc de charge du catalogue: latences, requetes SQL et memoire par volume."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+import django
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from annonces.generateur import GenerateurCatalogue
+from annonces.models import Categorie, Localisation, Produit
+
+VERSION_FORMAT = 1
+
+# nom -> poids dans le melange de requetes rejoue
+SCENARIOS = {
+    "accueil": 10,
+    "accueil_categorie": 10,
+    "filtre_lieu": 15,
+    "filtre_facettes": 10,
+    "recherche": 15,
+    "tri_prix": 10,
+    "page_suivante": 10,
+    "donnees": 10,
+    "detail": 10,
+}
+
+TERMES_RECHERCHE = ["tecno", "cacao", "sac", "refrigerateur", "poivre penja", "chargeur rapide", "wax"]
+
+
+def parse_taille(valeur: str) -> int:
+    """Convertit 1k / 10k / 1M en nombre de produits."""
+    valeur = valeur.strip().lower()
+    multiplicateur = {"k": 1_000, "m": 1_000_000}.get(valeur[-1:], 1)
+    try:
+        return int(float(valeur.rstrip("km")) * multiplicateur)
+    except ValueError as exc:
+        raise CommandError(f"Taille invalide: {valeur!r}") from exc
+
+
+def centile(valeurs_triees: list[float], rang: float) -> float:
+    """Centile par rang le plus proche (stable d'une execution a l'autre)."""
+    if not valeurs_triees:
+        return 0.0
+    position = max(math.ceil(rang / 100 * len(valeurs_triees)) - 1, 0)
+    return valeurs_triees[min(position, len(valeurs_triees) - 1)]
+
+
+def rss_max_octets() -> int:
+    """Pic de memoire residente du processus."""
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pic if sys.platform == "darwin" else pic * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Construit des catalogues synthetiques de tailles croissantes dans une base de test "
+        "jetable, rejoue un melange de requetes et produit un rapport JSON comparable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tailles",
+            default="1k,10k",
+            help="Volumes de produits, separes par des virgules (ex: 1k,10k,100k,1M).",
+        )
+        parser.add_argument("--requetes", type=int, default=300, help="Requetes mesurees par volume.")
+        parser.add_argument("--echauffement", type=int, default=30, help="Requetes non mesurees par volume.")
+        parser.add_argument("--graine", type=int, default=42, help="Graine des donnees et du melange.")
+        parser.add_argument(
+            "--utilisateurs-ratio",
+            type=int,
+            default=20,
+            help="Nombre de produits par vendeur synthetique.",
+        )
+        parser.add_argument(
+            "--concurrence",
+            type=int,
+            default=1,
+            help=(
+                "Requetes simultanees; au-dela de 1, rejoue via ASGI (AsyncClient). "
+                "Comparer avec et sans VUES_ASYNC=1."
+            ),
+        )
+        parser.add_argument("--sortie", help="Fichier JSON de resultat (defaut: sortie standard).")
+        parser.add_argument("--reference", help="Rapport JSON precedent a comparer.")
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Hausse relative de p95 toleree par rapport a la reference.",
+        )
+
+    def handle(self, *args, **options):
+        tailles = sorted(parse_taille(taille) for taille in options["tailles"].split(","))
+        graine = options["graine"]
+
+        setup_test_environment(debug=False)
+        ancien_nom = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # Les images generees vont, comme la base, dans un emplacement jetable.
+        with tempfile.TemporaryDirectory(prefix="bench-media-") as media, override_settings(MEDIA_ROOT=media):
+            try:
+                resultats = [
+                    self._mesurer_volume(taille, graine, options)
+                    for taille in tailles
+                ]
+            finally:
+                connection.creation.destroy_test_db(ancien_nom, verbosity=0)
+                teardown_test_environment()
+
+        rapport = {
+            "format": VERSION_FORMAT,
+            "meta": {
+                "date": datetime.now(dt_timezone.utc).isoformat(timespec="seconds"),
+                "graine": graine,
+                "requetes": options["requetes"],
+                "echauffement": options["echauffement"],
+                "moteur": connection.vendor,
+                "selection": settings.CATALOGUE_MOTEUR,
+                "concurrence": options["concurrence"],
+                "vues_async": settings.VUES_ASYNC,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "plateforme": platform.platform(),
+            },
+            "resultats": resultats,
+        }
+        contenu = json.dumps(rapport, indent=2, ensure_ascii=False)
+        if options["sortie"]:
+            Path(options["sortie"]).write_text(contenu + "\n", encoding="utf-8")
+            self.stderr.write(f"Rapport ecrit dans {options['sortie']}")
+        else:
+            self.stdout.write(contenu)
+
+        if options["reference"]:
+            self._comparer(rapport, options["reference"], options["tolerance"])
+
+    def _mesurer_volume(self, taille: int, graine: int, options) -> dict:
+        """Complete le jeu de donnees jusqu'a ``taille`` puis rejoue le melange."""
+        self.stderr.write(f"Generation de {taille} produits...")
+        debut = time.perf_counter()
+        GenerateurCatalogue(graine=graine, journal=self.stderr.write).generer(
+            produits=taille, utilisateurs=max(taille // options["utilisateurs_ratio"], 1)
+        )
+        duree_generation = time.perf_counter() - debut
+        cache.clear()
+
+        rng = random.Random(f"{graine}:melange:{taille}")
+        contexte = self._contexte(rng)
+        noms, poids = list(SCENARIOS), list(SCENARIOS.values())
+        tirages = []
+        for _ in range(options["echauffement"] + options["requetes"]):
+            nom = rng.choices(noms, poids)[0]
+            tirages.append((nom, *self._composer(nom, rng, contexte)))
+        echauffement, mesurees = tirages[: options["echauffement"]], tirages[options["echauffement"] :]
+
+        debut = time.perf_counter()
+        if options["concurrence"] > 1:
+            asyncio.run(self._rejouer_concurrent(echauffement, options["concurrence"]))
+            debut = time.perf_counter()
+            resultats = asyncio.run(self._rejouer_concurrent(mesurees, options["concurrence"]))
+        else:
+            client = Client()
+            for nom, url, params in echauffement:
+                self._executer(client, nom, url, params)
+            debut = time.perf_counter()
+            resultats = [(nom, *self._executer(client, nom, url, params)) for nom, url, params in mesurees]
+        duree_rejeu = time.perf_counter() - debut
+
+        latences: dict[str, list[float]] = defaultdict(list)
+        requetes_sql: dict[str, list[int]] = defaultdict(list)
+        for nom, duree, nombre in resultats:
+            latences[nom].append(duree)
+            if nombre is not None:
+                requetes_sql[nom].append(nombre)
+
+        return {
+            "produits": taille,
+            "generation_s": round(duree_generation, 2),
+            "rss_max_mo": round(rss_max_octets() / 1024 / 1024, 1),
+            "debit_rps": round(len(resultats) / duree_rejeu, 1) if duree_rejeu else None,
+            "scenarios": {
+                nom: self._statistiques(latences[nom], requetes_sql[nom])
+                for nom in noms
+                if latences[nom]
+            },
+            "global": self._statistiques(
+                [duree for valeurs in latences.values() for duree in valeurs],
+                [nombre for valeurs in requetes_sql.values() for nombre in valeurs],
+            ),
+        }
+
+    @staticmethod
+    def _contexte(rng: random.Random) -> dict:
+        """Valeurs reelles de la base servant a composer les requetes."""
+        ids = list(
+            Produit.objects.filter(statut=Produit.StatutChoices.DISPONIBLE)
+            .order_by("id")
+            .values_list("id", flat=True)[:5000]
+        )
+        return {
+            "produits": ids,
+            "categories": list(Categorie.objects.order_by("slug").values_list("slug", flat=True)),
+            "lieux": list(
+                Localisation.objects.order_by("region", "ville")
+                .values_list("region", "ville")
+                .distinct()
+            ),
+            "url_filtre": reverse("acceuil:catalogue_filtrer"),
+            "url_accueil": reverse("acceuil:accueil"),
+        }
+
+    @staticmethod
+    def _composer(nom: str, rng: random.Random, contexte: dict) -> tuple[str, dict]:
+        """Tire l'URL et les parametres d'un scenario."""
+        url, params = contexte["url_filtre"], {}
+        region, ville = rng.choice(contexte["lieux"])
+        if nom == "accueil":
+            url = contexte["url_accueil"]
+        elif nom == "accueil_categorie":
+            url, params = contexte["url_accueil"], {"categorie": rng.choice(contexte["categories"])}
+        elif nom == "filtre_lieu":
+            params = {"region": region, "ville": ville} if rng.random() < 0.5 else {"region": region}
+        elif nom == "filtre_facettes":
+            params = {"categorie": rng.choice(contexte["categories"]), "etat": "occasion", "region": region}
+        elif nom == "recherche":
+            params = {"q": rng.choice(TERMES_RECHERCHE)}
+        elif nom == "tri_prix":
+            prix_min = rng.randrange(0, 100_000, 5_000)
+            params = {
+                "tri": rng.choice(["prix_asc", "prix_desc"]),
+                "prix_min": prix_min,
+                "prix_max": prix_min + 100_000,
+            }
+        elif nom == "page_suivante":
+            params = {"categorie": rng.choice(contexte["categories"]), "format": "data"}
+        elif nom == "donnees":
+            params = {"region": region, "format": "data"}
+        elif nom == "detail":
+            produit_id = rng.choice(contexte["produits"]) if contexte["produits"] else 0
+            url = reverse("acceuil:annonce_detail", kwargs={"produit_id": produit_id})
+        return url, params
+
+    @staticmethod
+    def _executer(client: Client, nom: str, url: str, params: dict) -> tuple[float, int | None]:
+        """Joue un scenario et retourne (duree en secondes, requetes SQL)."""
+        if nom == "page_suivante":
+            curseur = client.get(url, params).json().get("curseur")
+            params = {**params, "mode": "page", "curseur": curseur or ""}
+
+        debut = time.perf_counter()
+        response = client.get(url, params)
+        duree = time.perf_counter() - debut
+        return duree, Command._requetes_sql(nom, url, params, response)
+
+    @staticmethod
+    async def _rejouer_concurrent(tirages: list, concurrence: int) -> list[tuple[str, float, int | None]]:
+        """Rejoue les tirages via ASGI, ``concurrence`` requetes en vol au plus."""
+        client, semaphore = AsyncClient(), asyncio.Semaphore(concurrence)
+
+        async def jouer(nom: str, url: str, params: dict):
+            # Un thread synchrone par requete, comme ASGIHandler (AsyncClient les partage).
+            async with semaphore, ThreadSensitiveContext():
+                if nom == "page_suivante":
+                    curseur = (await client.get(url, params)).json().get("curseur")
+                    params = {**params, "mode": "page", "curseur": curseur or ""}
+                debut = time.perf_counter()
+                response = await client.get(url, params)
+                duree = time.perf_counter() - debut
+                return nom, duree, Command._requetes_sql(nom, url, params, response)
+
+        return await asyncio.gather(*(jouer(*tirage) for tirage in tirages))
+
+    @staticmethod
+    def _requetes_sql(nom: str, url: str, params: dict, response) -> int | None:
+        """Verifie le statut et lit le nombre de requetes SQL mesure par l'instrumentation."""
+        if response.status_code != 200:
+            raise CommandError(f"{nom}: statut {response.status_code} pour {url} {params}")
+        requete = getattr(response, "wsgi_request", None) or getattr(response, "asgi_request", None)
+        mesure = getattr(requete, "mesure_sql", None)
+        return mesure.nombre if mesure is not None else None
+
+    @staticmethod
+    def _statistiques(latences: list[float], requetes_sql: list[int]) -> dict:
+        """Centiles de latence (ms) et volume de requetes SQL."""
+        triees = sorted(latences)
+        return {
+            "n": len(triees),
+            "p50_ms": round(centile(triees, 50) * 1000, 2),
+            "p95_ms": round(centile(triees, 95) * 1000, 2),
+            "p99_ms": round(centile(triees, 99) * 1000, 2),
+            "moyenne_ms": round(sum(triees) / len(triees) * 1000, 2) if triees else 0.0,
+            "requetes_sql_moyenne": (
+                round(sum(requetes_sql) / len(requetes_sql), 2) if requetes_sql else None
+            ),
+            "requetes_sql_max": max(requetes_sql) if requetes_sql else None,
+        }
+
+    def _comparer(self, rapport: dict, chemin_reference: str, tolerance: float) -> None:
+        """Echoue si un scenario regresse en p95 ou en nombre de requetes SQL."""
+        reference = json.loads(Path(chemin_reference).read_text(encoding="utf-8"))
+        if reference.get("format") != VERSION_FORMAT:
+            raise CommandError("Rapport de reference d'un format different.")
+        anciens = {resultat["produits"]: resultat for resultat in reference["resultats"]}
+
+        regressions = []
+        for resultat in rapport["resultats"]:
+            ancien = anciens.get(resultat["produits"])
+            if ancien is None:
+                continue
+            for nom, stats in resultat["scenarios"].items():
+                avant = ancien["scenarios"].get(nom)
+                if avant is None:
+                    continue
+                if avant["p95_ms"] and stats["p95_ms"] > avant["p95_ms"] * (1 + tolerance):
+                    regressions.append(
+                        f"{resultat['produits']} produits / {nom}: p95 "
+                        f"{avant['p95_ms']} -> {stats['p95_ms']} ms"
+                    )
+                if (
+                    avant["requetes_sql_max"] is not None
+                    and stats["requetes_sql_max"] is not None
+                    and stats["requetes_sql_max"] > avant["requetes_sql_max"]
+                ):
+                    regressions.append(
+                        f"{resultat['produits']} produits / {nom}: requetes SQL "
+                        f"{avant['requetes_sql_max']} -> {stats['requetes_sql_max']}"
+                    )
+        if regressions:
+            raise CommandError("Regressions detectees:\n- " + "\n- ".join(regressions))
+        self.stderr.write(self.style.SUCCESS("Aucune regression par rapport a la reference."))
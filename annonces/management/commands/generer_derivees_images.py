@@ -0,0 +1,49 @@
+"""Commande de generation des derivees responsive des images produit existantes."""
+
+from __future__ import annotations
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from annonces.images import VERSION_MANIFESTE, generer_derivees, supprimer_derivees
+from annonces.models import ImageProduit, Produit, VersionCatalogue
+
+
+class Command(BaseCommand):
+    help = "Genere les derivees WebP/JPEG des images produit sans manifeste a jour."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenere aussi les images disposant deja d'un manifeste.",
+        )
+
+    def handle(self, *args, **options):
+        traitees, fichiers, produits = 0, set(), set()
+        for image in ImageProduit.objects.order_by("id").iterator(chunk_size=200):
+            a_jour = (
+                image.derivees.get("source") == image.image.name
+                and image.derivees.get("version") == VERSION_MANIFESTE
+            )
+            if not image.image or (a_jour and not options["force"]):
+                continue
+            produits.add(image.produit_id)
+            if image.image.name in fichiers:
+                continue
+            fichiers.add(image.image.name)
+            anciennes = image.derivees
+            image.derivees = generer_derivees(image.image, default_storage)
+            # Les lignes partageant un fichier (stockage par contenu) partagent ses derivees.
+            ImageProduit.objects.filter(image=image.image.name).update(derivees=image.derivees)
+            supprimer_derivees(anciennes, default_storage, conserver=image.derivees)
+            traitees += 1
+
+        if produits:
+            # update() ne declenche aucun signal: invalider cartes et ETags a la main.
+            Produit.objects.filter(pk__in=produits).update(version_images=F("version_images") + 1)
+            VersionCatalogue.incrementer()
+        self.stdout.write(
+            self.style.SUCCESS(f"{traitees} fichiers traites pour {len(produits)} produits.")
+        )
@@ -0,0 +1,25 @@
+"""Commande de purge du journal des evenements du catalogue."""
+
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from annonces.models import EvenementCatalogue
+
+
+class Command(BaseCommand):
+    help = "Supprime les evenements du catalogue plus vieux que la retention (a planifier)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retention",
+            type=int,
+            default=None,
+            help="Age maximal en secondes (defaut: CATALOGUE_EVENEMENTS_RETENTION).",
+        )
+
+    def handle(self, *args, **options):
+        retention = options["retention"] or settings.CATALOGUE_EVENEMENTS_RETENTION
+        total = EvenementCatalogue.purger(retention)
+        self.stdout.write(self.style.SUCCESS(f"{total} evenements du catalogue purges."))
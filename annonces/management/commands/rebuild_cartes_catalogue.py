@@ -0,0 +1,15 @@
+"""Commande de reconstruction du modele de lecture du catalogue."""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from annonces.projection import ProjectionCatalogue
+
+
+class Command(BaseCommand):
+    help = "Recopie les produits disponibles dans la table des cartes du catalogue (CATALOGUE_MOTEUR = cartes)."
+
+    def handle(self, *args, **options):
+        total = ProjectionCatalogue.reconstruire()
+        self.stdout.write(self.style.SUCCESS(f"{total} cartes du catalogue reconstruites."))
@@ -0,0 +1,15 @@
+"""Commande de reconstruction des compteurs de disponibilite du catalogue."""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from annonces.models import CompteurDisponibilite
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs de produits disponibles par categorie et localisation."
+
+    def handle(self, *args, **options):
+        total = CompteurDisponibilite.reconstruire()
+        self.stdout.write(self.style.SUCCESS(f"{total} compteurs de disponibilite reconstruits."))
@@ -0,0 +1,18 @@
+"""Commande de reconstruction de l'index de recherche plein texte des produits."""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from annonces.recherche import get_backend_recherche
+
+
+class Command(BaseCommand):
+    help = "Reindexe le titre et la description de tous les produits pour la recherche."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default", help="Alias de la base a reindexer.")
+
+    def handle(self, *args, **options):
+        total = get_backend_recherche(options["database"]).reconstruire()
+        self.stdout.write(self.style.SUCCESS(f"{total} produits reindexes pour la recherche."))
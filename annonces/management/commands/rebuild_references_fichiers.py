@@ -0,0 +1,25 @@
+"""Commande de reconstruction des references du stockage par contenu."""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from annonces.models import FichierContenu
+
+
+class Command(BaseCommand):
+    help = "Recompte les references des fichiers stockes par contenu, purge eventuellement les orphelins."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--purger",
+            action="store_true",
+            help="Supprime ensuite les fichiers qu'aucune ligne ne reference.",
+        )
+
+    def handle(self, *args, **options):
+        total = FichierContenu.reconstruire()
+        self.stdout.write(self.style.SUCCESS(f"{total} fichiers recomptes."))
+        if options["purger"]:
+            supprimes = FichierContenu.purger()
+            self.stdout.write(self.style.SUCCESS(f"{supprimes} fichiers orphelins supprimes."))
@@ -16,6 +16,7 @@ from django.db import transaction
 from django.utils import timezone
 from django.utils.text import slugify
 
+from annonces.generateur import MOT_DE_PASSE_GENERE, GenerateurCatalogue
 from annonces.models import Categorie, ImageProduit, Localisation, Produit, ProduitAgricole, ProduitRetail
 from profil.models import ProfilUtilisateur
 
@@ -228,9 +229,72 @@ class Command(BaseCommand):
             default=20,
             help="Timeout reseau (secondes) pour le telechargement des images.",
         )
+        parser.add_argument(
+            "--products",
+            type=int,
+            help="Mode synthetique: nombre total de produits generes (bulk_create, hors ligne).",
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            help="Mode synthetique: nombre de vendeurs generes (defaut: un pour 20 produits).",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Mode synthetique: graine rendant la generation reproductible.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=GenerateurCatalogue.TAILLE_LOT,
+            help="Mode synthetique: lignes inserees par transaction.",
+        )
 
-    @transaction.atomic
     def handle(self, *args, **options):
+        if options["products"] is not None:
+            self._seed_synthetic(options)
+            return
+        with transaction.atomic():
+            self._seed_demo(options)
+
+    def _seed_synthetic(self, options) -> None:
+        products = max(int(options["products"]), 0)
+        users = options["users"] if options["users"] is not None else max(products // 20, 1)
+        generator = GenerateurCatalogue(
+            graine=options["seed"],
+            taille_lot=max(int(options["batch_size"]), 1),
+            journal=self.stdout.write,
+        )
+
+        if options["reset"]:
+            prefix = f"{generator.PREFIXE_UTILISATEUR}{generator.graine}_"
+            synthetic_users = User.objects.filter(username__startswith=prefix)
+            product_count = Produit.objects.filter(vendeur__in=synthetic_users).count()
+            user_count = synthetic_users.count()
+            synthetic_users.delete()
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Reset effectue: {user_count} vendeurs synthetiques et {product_count} produits supprimes."
+                )
+            )
+
+        report = generator.generer(
+            produits=products,
+            utilisateurs=max(users, 1),
+            avec_images=not options["no_images"],
+        )
+        self.stdout.write(self.style.SUCCESS("Generation synthetique terminee."))
+        self.stdout.write(
+            f"- Vendeurs: {report.utilisateurs} (mot de passe: {MOT_DE_PASSE_GENERE})"
+        )
+        self.stdout.write(
+            f"- Produits: {report.produits} au total, {report.produits_crees} crees"
+        )
+        self.stdout.write(f"- Avis: {report.avis}, images: {report.images}")
+
+    def _seed_demo(self, options) -> None:
         self.timeout_seconds = max(5, int(options["timeout"]))
         use_images = not options["no_images"]
 
@@ -398,12 +462,22 @@ class Command(BaseCommand):
         return created, updated
 
     def _replace_product_images(self, product: Produit, urls: list[str]) -> None:
-        product.images.all().delete()
+        # Stockage par contenu: une image identique garde son chemin, sans reecriture
+        # du fichier ni modification de la ligne (donc ni derivees ni invalidation).
+        field = ImageProduit._meta.get_field("image")
+        kept = []
         for index, image_url in enumerate(urls, start=1):
             binary, extension = self._download_or_placeholder(image_url, product.titre)
-            image = ImageProduit(produit=product, ordre=index)
-            filename = f"{slugify(product.titre)[:50]}-{index}.{extension}"
-            image.image.save(filename, ContentFile(binary), save=True)
+            filename = field.generate_filename(None, f"{slugify(product.titre)[:50]}-{index}.{extension}")
+            name = field.storage.save(filename, ContentFile(binary))
+            image = product.images.filter(ordre=index).exclude(pk__in=kept).first()
+            if image is None:
+                image = ImageProduit.objects.create(produit=product, ordre=index, image=name)
+            elif image.image.name != name:
+                image.image = name
+                image.save()
+            kept.append(image.pk)
+        product.images.exclude(pk__in=kept).delete()
 
     def _download_or_placeholder(self, url: str, label: str) -> tuple[bytes, str]:
         try:
@@ -0,0 +1,213 @@
+"""Socle des moteurs de selection en memoire du catalogue.
+
+Un moteur garde par processus un instantane immuable des produits, valide
+par ``VersionCatalogue``. Quand la version change, les evenements
+``EvenementCatalogue`` recents designent les produits a relire et le moteur
+les applique a une copie de l'instantane. Un evenement sans produit, un
+journal trop long, une mise a jour refusee par le moteur ou un instantane
+plus vieux que la moitie de la retention imposent un rechargement complet.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterable
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import ROUND_FLOOR, Decimal
+from typing import Any
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EvenementCatalogue, Produit, VersionCatalogue
+
+# Facette -> chemin ORM des facettes a valeur chaine.
+COLONNES_CODEES = {
+    "region": "lieu_vente__region",
+    "ville": "lieu_vente__ville",
+    "etat": "produit_retail__etat",
+    "region_origine": "produit_agricole__region_origine",
+}
+CHAMPS = ("id", "categorie_id", "prix", "date_creation", *COLONNES_CODEES.values())
+EPOQUE = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+BORNE_INT64 = 2**63 - 1
+
+
+def microsecondes(date: datetime) -> int:
+    """Date en microsecondes depuis l'epoque."""
+    return (date - EPOQUE) // timedelta(microseconds=1)
+
+
+def date_depuis(valeur: int) -> datetime:
+    """Date correspondant a des microsecondes depuis l'epoque."""
+    return EPOQUE + timedelta(microseconds=int(valeur))
+
+
+def centimes(prix: Decimal, arrondi: str = ROUND_FLOOR) -> int:
+    """Prix en centimes, borne a l'intervalle int64."""
+    valeur = int((prix * 100).to_integral_value(rounding=arrondi))
+    return max(-BORNE_INT64, min(valeur, BORNE_INT64))
+
+
+def prix_depuis(valeur: int) -> Decimal:
+    """Prix a deux decimales correspondant a des centimes."""
+    return Decimal(int(valeur)).scaleb(-2)
+
+
+class MoteurMemoire(ABC):
+    """Instantane par processus tenu a jour par le journal des evenements.
+
+    Les sous-classes fournissent ``_construire`` (instantane depuis des
+    lignes lues), ``_appliquer`` (copie mise a jour, ou None pour exiger un
+    rechargement), ``selectionner`` et ``facettes``. Chaque instantane porte
+    ``version``, ``dernier_evenement``, ``charge_le``, ``lu_le`` et
+    ``lignes`` (id produit -> ligne).
+    """
+
+    # Au-dela de cette part du catalogue en evenements a appliquer, un
+    # rechargement complet coute moins qu'une mise a jour.
+    SEUIL_RECHARGEMENT = 0.25
+    EVENEMENTS_MIN = 100
+    # Un evenement insere avant un COMMIT tardif peut porter un id inferieur
+    # au dernier lu: les evenements de cette fenetre sont relus (idempotent).
+    MARGE_EVENEMENTS = timedelta(seconds=60)
+
+    _instantane: Any = None
+    _verrou = threading.Lock()
+
+    def __init_subclass__(cls, **kwargs):
+        """Donne a chaque moteur son propre instantane et son verrou."""
+        super().__init_subclass__(**kwargs)
+        cls._instantane = None
+        cls._verrou = threading.Lock()
+
+    @classmethod
+    def verifier(cls) -> None:
+        """Leve ImproperlyConfigured si une dependance du moteur manque."""
+
+    @classmethod
+    def reinitialiser(cls) -> None:
+        """Oublie l'instantane du processus (tests, changement de base)."""
+        with cls._verrou:
+            cls._instantane = None
+
+    @classmethod
+    def instantane(cls) -> Any:
+        """Retourne l'instantane de la version courante, mis a jour si besoin."""
+        cls.verifier()
+        version = VersionCatalogue.courante()
+        courant = cls._instantane
+        if courant is not None and courant.version == version:
+            return courant
+        with cls._verrou:
+            if cls._instantane is None or cls._instantane.version != version:
+                cls._instantane = cls._rafraichir(cls._instantane, version)
+            return cls._instantane
+
+    @classmethod
+    @abstractmethod
+    def selectionner(
+        cls,
+        filtres,
+        descendants: list[int] | None,
+        champ: str,
+        descendant: bool,
+        position: tuple[Any, int] | None,
+        nombre: int,
+    ) -> list[tuple[int, Any]]:
+        """Retourne (id, valeur de tri) des ``nombre`` premiers produits apres ``position``.
+
+        Args:
+            filtres: ``CatalogueFiltres`` sans recherche plein texte.
+            descendants: Categories retenues (categorie filtree et descendants).
+            champ: Champ de tri, ``date_creation`` ou ``prix``.
+            descendant: Ordre decroissant du tri (l'id departage dans le meme sens).
+            position: Couple (valeur de tri, id) du dernier produit deja servi.
+            nombre: Nombre de produits a retourner au plus.
+        """
+
+    @classmethod
+    @abstractmethod
+    def facettes(cls, filtres, descendants: list[int] | None):
+        """Total filtre et comptes disjonctifs de chaque facette, comme ``MoteurFacettes``."""
+
+    @classmethod
+    def _rafraichir(cls, courant: Any, version: int) -> Any:
+        """Applique le journal a l'instantane courant, ou recharge tout."""
+        retention = settings.CATALOGUE_EVENEMENTS_RETENTION
+        if courant is None or time.monotonic() - courant.charge_le > retention / 2:
+            return cls._charger(version)
+
+        lu_le = timezone.now()
+        limite = max(cls.EVENEMENTS_MIN, int(len(courant.lignes) * cls.SEUIL_RECHARGEMENT))
+        evenements = list(
+            EvenementCatalogue.objects.using(DEFAULT_DB_ALIAS)
+            .filter(Q(id__gt=courant.dernier_evenement) | Q(date__gte=courant.lu_le - cls.MARGE_EVENEMENTS))
+            .order_by("id")
+            .values_list("id", "produit_id")[: limite + 1]
+        )
+        if len(evenements) > limite or any(produit_id is None for _, produit_id in evenements):
+            return cls._charger(version)
+        if not evenements:
+            return replace(courant, version=version, lu_le=lu_le)
+
+        produit_ids = {produit_id for _, produit_id in evenements}
+        nouveau = cls._appliquer(
+            courant,
+            produit_ids,
+            cls._lire(produit_ids),
+            version=version,
+            dernier_evenement=max(courant.dernier_evenement, evenements[-1][0]),
+            lu_le=lu_le,
+        )
+        return nouveau if nouveau is not None else cls._charger(version)
+
+    @classmethod
+    def _charger(cls, version: int) -> Any:
+        """Construit un instantane complet depuis la table des produits."""
+        # Le dernier evenement est lu avant les produits: tout evenement
+        # posterieur sera applique au prochain rafraichissement.
+        lu_le = timezone.now()
+        dernier = (
+            EvenementCatalogue.objects.using(DEFAULT_DB_ALIAS)
+            .order_by("-id")
+            .values_list("id", flat=True)
+            .first()
+            or 0
+        )
+        return cls._construire(cls._lire(), version=version, dernier_evenement=dernier, lu_le=lu_le)
+
+    @classmethod
+    def _lire(cls, produit_ids: Iterable[int] | None = None) -> list[tuple]:
+        """Lit les champs ``CHAMPS`` des produits disponibles (tous, ou ceux designes).
+
+        La lecture se fait sur le primaire, comme celle du journal: un replica
+        en retard donnerait un instantane anterieur a sa propre version.
+        """
+        queryset = Produit.objects.using(DEFAULT_DB_ALIAS).filter(statut=Produit.StatutChoices.DISPONIBLE)
+        if produit_ids is not None:
+            queryset = queryset.filter(id__in=list(produit_ids))
+        return list(queryset.order_by().values_list(*CHAMPS))
+
+    @classmethod
+    @abstractmethod
+    def _construire(cls, lignes_lues: list[tuple], version: int, dernier_evenement: int, lu_le: datetime) -> Any:
+        """Instantane complet depuis des lignes lues."""
+
+    @classmethod
+    @abstractmethod
+    def _appliquer(
+        cls,
+        courant: Any,
+        produit_ids: set[int],
+        lignes_lues: list[tuple],
+        version: int,
+        dernier_evenement: int,
+        lu_le: datetime,
+    ) -> Any | None:
+        """Copie de ``courant`` ou les produits designes sont remplaces par leurs lignes lues."""
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 19:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0002_produit_date_mise_a_jour_imageproduit'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['statut', 'date_creation', 'id'], name='catalogue_prod_statut_date_idx'),
+        ),
+    ]
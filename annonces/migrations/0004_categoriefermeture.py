@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-17 19:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def remplir_fermeture(apps, schema_editor):
+    """Construit les liens ancetre/descendant des categories existantes."""
+    Categorie = apps.get_model('catalogue', 'Categorie')
+    CategorieFermeture = apps.get_model('catalogue', 'CategorieFermeture')
+    parent_par_id = dict(Categorie.objects.values_list('id', 'parent_id'))
+    liens = []
+    for categorie_id in parent_par_id:
+        courant, profondeur = categorie_id, 0
+        while courant is not None:
+            liens.append(
+                CategorieFermeture(ancetre_id=courant, descendant_id=categorie_id, profondeur=profondeur)
+            )
+            courant, profondeur = parent_par_id.get(courant), profondeur + 1
+    CategorieFermeture.objects.bulk_create(liens, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0003_produit_index_pagination'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategorieFermeture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('profondeur', models.PositiveSmallIntegerField()),
+                ('ancetre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='liens_descendants', to='catalogue.categorie')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='liens_ancetres', to='catalogue.categorie')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'profondeur'], name='catalogue_fermeture_desc_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancetre', 'descendant'), name='catalogue_fermeture_unique')],
+            },
+        ),
+        migrations.RunPython(remplir_fermeture, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-17 19:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def remplir_compteurs(apps, schema_editor):
+    """Initialise les compteurs depuis les produits disponibles existants."""
+    Produit = apps.get_model('catalogue', 'Produit')
+    CompteurDisponibilite = apps.get_model('catalogue', 'CompteurDisponibilite')
+    agregats = (
+        Produit.objects.filter(statut='disponible')
+        .values('categorie_id', 'lieu_vente__region', 'lieu_vente__ville')
+        .annotate(total=models.Count('id'))
+        .order_by()
+    )
+    CompteurDisponibilite.objects.bulk_create(
+        [
+            CompteurDisponibilite(
+                categorie_id=agregat['categorie_id'],
+                region=agregat['lieu_vente__region'],
+                ville=agregat['lieu_vente__ville'],
+                total=agregat['total'],
+            )
+            for agregat in agregats
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0004_categoriefermeture'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompteurDisponibilite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.CharField(choices=[('Adamaoua', 'Adamaoua'), ('Centre', 'Centre'), ('Est', 'Est'), ('Extreme-Nord', 'Extreme-Nord'), ('Littoral', 'Littoral'), ('Nord', 'Nord'), ('Nord-Ouest', 'Nord-Ouest'), ('Ouest', 'Ouest'), ('Sud', 'Sud'), ('Sud-Ouest', 'Sud-Ouest')], max_length=32)),
+                ('ville', models.CharField(max_length=120)),
+                ('total', models.IntegerField(default=0)),
+                ('categorie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compteurs_disponibilite', to='catalogue.categorie')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['region', 'ville'], name='catalogue_compteur_lieu_idx')],
+                'constraints': [models.UniqueConstraint(fields=('categorie', 'region', 'ville'), name='catalogue_compteur_unique')],
+            },
+        ),
+        migrations.RunPython(remplir_compteurs, migrations.RunPython.noop),
+    ]
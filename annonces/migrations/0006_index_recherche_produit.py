@@ -0,0 +1,62 @@
+from django.db import migrations
+
+import unicodedata
+
+
+def _normaliser(texte):
+    decompose = unicodedata.normalize('NFKD', texte or '')
+    return ''.join(caractere for caractere in decompose if not unicodedata.combining(caractere)).lower()
+
+
+def creer_index_recherche(apps, schema_editor):
+    """Cree l'index plein texte adapte au moteur et y charge les produits existants."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE catalogue_produit_fts USING fts5("
+            "titre, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO catalogue_produit_fts (rowid, titre, description) "
+            "SELECT id, titre, description FROM catalogue_produit"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE catalogue_produit_recherche ("
+            "produit_id bigint PRIMARY KEY REFERENCES catalogue_produit (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX catalogue_produit_recherche_gin "
+            "ON catalogue_produit_recherche USING GIN (document)"
+        )
+        Produit = apps.get_model('catalogue', 'Produit')
+        with schema_editor.connection.cursor() as cursor:
+            for produit in Produit.objects.only('id', 'titre', 'description').iterator(chunk_size=1000):
+                cursor.execute(
+                    "INSERT INTO catalogue_produit_recherche (produit_id, document) VALUES (%s, "
+                    "setweight(to_tsvector('simple', %s), 'A') || "
+                    "setweight(to_tsvector('simple', %s), 'B'))",
+                    [produit.id, _normaliser(produit.titre), _normaliser(produit.description)],
+                )
+
+
+def supprimer_index_recherche(apps, schema_editor):
+    """Supprime l'index plein texte."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS catalogue_produit_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP TABLE IF EXISTS catalogue_produit_recherche")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0005_compteurdisponibilite'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index_recherche, supprimer_index_recherche),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-17 19:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0006_index_recherche_produit'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['statut', 'prix', 'id'], name='catalogue_prod_statut_prix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['statut', 'lieu_vente', 'date_creation', 'id'], name='catalogue_prod_lieu_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['statut', 'lieu_vente', 'prix', 'id'], name='catalogue_prod_lieu_prix_idx'),
+        ),
+    ]
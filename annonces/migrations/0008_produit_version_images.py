@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0007_produit_index_tri'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produit',
+            name='version_images',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-17 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0008_produit_version_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionCatalogue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valeur', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0009_versioncatalogue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageproduit',
+            name='derivees',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:06
+
+import annonces.stockage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0010_imageproduit_derivees'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FichierContenu',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chemin', models.CharField(max_length=255, unique=True)),
+                ('empreinte', models.CharField(db_index=True, max_length=64)),
+                ('taille', models.PositiveBigIntegerField(default=0)),
+                ('references', models.IntegerField(default=0)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='imageproduit',
+            name='image',
+            field=models.FileField(storage=annonces.stockage.StockageContenu(), upload_to='catalogue/produits/'),
+        ),
+    ]
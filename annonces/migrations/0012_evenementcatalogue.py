@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0011_fichiercontenu'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvenementCatalogue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('produit_id', models.BigIntegerField(blank=True, null=True)),
+                ('date', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0012_evenementcatalogue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarteCatalogue',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('titre', models.CharField(max_length=180)),
+                ('resume', models.CharField(blank=True, max_length=70)),
+                ('prix', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('date_creation', models.DateTimeField()),
+                ('date_mise_a_jour', models.DateTimeField()),
+                ('version_images', models.PositiveIntegerField(default=0)),
+                ('categorie_id', models.BigIntegerField()),
+                ('categorie_nom', models.CharField(max_length=120)),
+                ('chemin_categorie', models.CharField(max_length=255)),
+                ('lieu_vente_id', models.BigIntegerField()),
+                ('region', models.CharField(max_length=32)),
+                ('ville', models.CharField(max_length=120)),
+                ('quartier', models.CharField(max_length=120)),
+                ('vendeur_id', models.BigIntegerField()),
+                ('type_vendeur', models.CharField(blank=True, max_length=24)),
+                ('note_moyenne', models.FloatField(default=0)),
+                ('total_avis', models.PositiveIntegerField(default=0)),
+                ('etat', models.CharField(blank=True, max_length=24, null=True)),
+                ('region_origine', models.CharField(blank=True, max_length=32, null=True)),
+                ('images', models.JSONField(blank=True, default=list)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['date_creation', 'id'], name='catalogue_carte_date_idx'), models.Index(fields=['prix', 'id'], name='catalogue_carte_prix_idx'), models.Index(fields=['region', 'ville', 'date_creation', 'id'], name='catalogue_carte_lieu_date_idx'), models.Index(fields=['region', 'ville', 'prix', 'id'], name='catalogue_carte_lieu_prix_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0013_cartecatalogue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fichiercontenu',
+            name='reserve_le',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-17 23:20
+
+from django.db import migrations
+
+
+def creer_compteurs(apps, schema_editor):
+    """Cree les lignes des compteurs: un increment se fait alors en un UPDATE."""
+    VersionCatalogue = apps.get_model('catalogue', 'VersionCatalogue')
+    for compteur in (1, 2):
+        VersionCatalogue.objects.get_or_create(pk=compteur)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogue', '0014_fichiercontenu_reserve_le'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_compteurs, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,22 @@
 """Modeles metier pour la navigation et la gestion des annonces."""
 
+import posixpath
+from datetime import timedelta
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.utils import timezone
 from django.utils.text import slugify
 
+from kzone.routers import lecture_au_replica
+
+from .images import chemin_defaut, srcset
+from .stockage import champs_contenu, stockage_contenu
+
 User = get_user_model()
 
 
@@ -57,17 +70,153 @@ class Categorie(models.Model):
 
         ordering = ("nom",)
 
+    def clean(self) -> None:
+        """Refuse un parent qui creerait un cycle dans l'arbre."""
+        super().clean()
+        if self.pk and self.parent_id and self._est_ancetre_de(self.parent_id):
+            raise ValidationError({"parent": "Une categorie ne peut pas etre rangee sous elle-meme."})
+
     def save(self, *args, **kwargs) -> None:
-        """Genere le slug depuis le nom quand il n'est pas fourni."""
+        """Genere le slug et maintient la table de fermeture de l'arbre."""
         if not self.slug:
             self.slug = slugify(self.nom)
-        super().save(*args, **kwargs)
+
+        creation = self._state.adding
+        update_fields = kwargs.get("update_fields")
+        ancien_parent_id = None
+        if not creation and (update_fields is None or "parent" in update_fields):
+            ancien_parent_id = (
+                Categorie.objects.filter(pk=self.pk).values_list("parent_id", flat=True).first()
+            )
+            if ancien_parent_id != self.parent_id and self._est_ancetre_de(self.parent_id):
+                raise ValidationError("Une categorie ne peut pas etre rangee sous elle-meme.")
+
+        with transaction.atomic():
+            # Fermeture deplacee avant l'ecriture: les recepteurs post_save
+            # (cartes du catalogue) lisent deja le nouvel arbre.
+            if not creation and ancien_parent_id != self.parent_id and (
+                update_fields is None or "parent" in update_fields
+            ):
+                self._deplacer_fermeture()
+            super().save(*args, **kwargs)
+            if creation:
+                self._inserer_fermeture()
+
+    def _est_ancetre_de(self, categorie_id: int | None) -> bool:
+        """Indique si la categorie courante est ancetre (ou egale) de categorie_id."""
+        if categorie_id is None:
+            return False
+        return CategorieFermeture.objects.filter(
+            ancetre_id=self.pk, descendant_id=categorie_id
+        ).exists()
+
+    def _inserer_fermeture(self) -> None:
+        """Cree les liens ancetre/descendant d'une nouvelle feuille."""
+        liens = [CategorieFermeture(ancetre_id=self.pk, descendant_id=self.pk, profondeur=0)]
+        if self.parent_id:
+            liens.extend(
+                CategorieFermeture(
+                    ancetre_id=ancetre_id, descendant_id=self.pk, profondeur=profondeur + 1
+                )
+                for ancetre_id, profondeur in CategorieFermeture.objects.filter(
+                    descendant_id=self.parent_id
+                ).values_list("ancetre_id", "profondeur")
+            )
+        CategorieFermeture.objects.bulk_create(liens)
+
+    def _deplacer_fermeture(self) -> None:
+        """Rattache le sous-arbre de la categorie a ses nouveaux ancetres."""
+        sous_arbre = list(
+            CategorieFermeture.objects.filter(ancetre_id=self.pk).values_list(
+                "descendant_id", "profondeur"
+            )
+        )
+        ids_sous_arbre = [descendant_id for descendant_id, _ in sous_arbre]
+        CategorieFermeture.objects.filter(descendant_id__in=ids_sous_arbre).exclude(
+            ancetre_id__in=ids_sous_arbre
+        ).delete()
+        if not self.parent_id:
+            return
+
+        nouveaux_ancetres = list(
+            CategorieFermeture.objects.filter(descendant_id=self.parent_id).values_list(
+                "ancetre_id", "profondeur"
+            )
+        )
+        CategorieFermeture.objects.bulk_create(
+            CategorieFermeture(
+                ancetre_id=ancetre_id,
+                descendant_id=descendant_id,
+                profondeur=profondeur_ancetre + 1 + profondeur_descendant,
+            )
+            for ancetre_id, profondeur_ancetre in nouveaux_ancetres
+            for descendant_id, profondeur_descendant in sous_arbre
+        )
 
     def __str__(self) -> str:
         """Retourne le nom de la categorie."""
         return self.nom
 
 
+class CategorieFermeture(models.Model):
+    """Table de fermeture transitive de l'arbre des categories.
+
+    Chaque categorie possede une ligne par ancetre (elle-meme incluse, a la
+    profondeur 0) : descendants, ancetres et racine se lisent en une requete
+    indexee. Les liens sont maintenus par ``Categorie.save`` et supprimes en
+    cascade avec la categorie.
+    """
+
+    ancetre = models.ForeignKey(
+        Categorie,
+        on_delete=models.CASCADE,
+        related_name="liens_descendants",
+    )
+    descendant = models.ForeignKey(
+        Categorie,
+        on_delete=models.CASCADE,
+        related_name="liens_ancetres",
+    )
+    profondeur = models.PositiveSmallIntegerField()
+
+    class Meta:
+        """Unicite et index de lecture par descendant."""
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ancetre", "descendant"],
+                name="catalogue_fermeture_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["descendant", "profondeur"],
+                name="catalogue_fermeture_desc_idx",
+            ),
+        ]
+
+    @classmethod
+    def reconstruire(cls) -> int:
+        """Recalcule toute la table depuis Categorie.parent (chargements en masse)."""
+        parent_par_id = dict(Categorie.objects.values_list("id", "parent_id"))
+        liens = []
+        for categorie_id in parent_par_id:
+            courant, profondeur = categorie_id, 0
+            while courant is not None:
+                liens.append(
+                    cls(ancetre_id=courant, descendant_id=categorie_id, profondeur=profondeur)
+                )
+                courant, profondeur = parent_par_id.get(courant), profondeur + 1
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(liens, batch_size=1000)
+        return len(liens)
+
+    def __str__(self) -> str:
+        """Retourne une representation concise du lien."""
+        return f"{self.ancetre_id} -> {self.descendant_id} ({self.profondeur})"
+
+
 class Produit(models.Model):
     """Modele racine des produits affiches dans le catalogue."""
 
@@ -91,17 +240,116 @@ class Produit(models.Model):
     )
     date_creation = models.DateTimeField(auto_now_add=True)
     date_mise_a_jour = models.DateTimeField(auto_now=True)
+    version_images = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         """Contraintes metier sur les produits."""
 
         ordering = ("-date_creation",)
+        indexes = [
+            models.Index(
+                fields=["statut", "date_creation", "id"],
+                name="catalogue_prod_statut_date_idx",
+            ),
+            models.Index(
+                fields=["statut", "prix", "id"],
+                name="catalogue_prod_statut_prix_idx",
+            ),
+            models.Index(
+                fields=["statut", "lieu_vente", "date_creation", "id"],
+                name="catalogue_prod_lieu_date_idx",
+            ),
+            models.Index(
+                fields=["statut", "lieu_vente", "prix", "id"],
+                name="catalogue_prod_lieu_prix_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs) -> None:
+        """Enregistre le produit et ses compteurs derives dans une transaction."""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """Supprime le produit et ajuste ses compteurs derives dans une transaction."""
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
 
     def __str__(self) -> str:
         """Retourne le titre du produit."""
         return self.titre
 
 
+class CompteurDisponibilite(models.Model):
+    """Nombre de produits disponibles par categorie directe et localisation.
+
+    Table denormalisee maintenue par les signaux de ``Produit`` (creation,
+    suppression, changement de statut, de categorie ou de lieu de vente) et
+    reconstructible via ``manage.py rebuild_compteurs_disponibilite``.
+    """
+
+    categorie = models.ForeignKey(
+        Categorie,
+        on_delete=models.CASCADE,
+        related_name="compteurs_disponibilite",
+    )
+    region = models.CharField(max_length=32, choices=Localisation.RegionChoices.choices)
+    ville = models.CharField(max_length=120)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        """Une ligne par triplet categorie/region/ville."""
+
+        constraints = [
+            models.UniqueConstraint(
+                fields=["categorie", "region", "ville"],
+                name="catalogue_compteur_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["region", "ville"], name="catalogue_compteur_lieu_idx"),
+        ]
+
+    @classmethod
+    def ajuster(cls, categorie_id: int, region: str, ville: str, delta: int) -> None:
+        """Ajoute ``delta`` au compteur du triplet, cree la ligne si besoin."""
+        compteur, cree = cls.objects.get_or_create(
+            categorie_id=categorie_id,
+            region=region,
+            ville=ville,
+            defaults={"total": max(delta, 0)},
+        )
+        if not cree:
+            cls.objects.filter(pk=compteur.pk).update(total=models.F("total") + delta)
+
+    @classmethod
+    def reconstruire(cls) -> int:
+        """Recalcule tous les compteurs depuis la table des produits."""
+        agregats = (
+            Produit.objects.filter(statut=Produit.StatutChoices.DISPONIBLE)
+            .values("categorie_id", "lieu_vente__region", "lieu_vente__ville")
+            .annotate(total=models.Count("id"))
+            .order_by()
+        )
+        compteurs = [
+            cls(
+                categorie_id=agregat["categorie_id"],
+                region=agregat["lieu_vente__region"],
+                ville=agregat["lieu_vente__ville"],
+                total=agregat["total"],
+            )
+            for agregat in agregats
+        ]
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(compteurs, batch_size=1000)
+        return len(compteurs)
+
+    def __str__(self) -> str:
+        """Retourne une representation concise du compteur."""
+        return f"{self.categorie_id} / {self.region} / {self.ville}: {self.total}"
+
+
 class ImageProduit(models.Model):
     """Images associees a un produit avec un ordre d'affichage explicite."""
 
@@ -110,8 +358,9 @@ class ImageProduit(models.Model):
         on_delete=models.CASCADE,
         related_name="images",
     )
-    image = models.FileField(upload_to="catalogue/produits/")
+    image = models.FileField(upload_to="catalogue/produits/", storage=stockage_contenu)
     ordre = models.PositiveIntegerField(default=0)
+    derivees = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         """Tri des images pour alimenter le carousel dans le bon ordre."""
@@ -122,6 +371,22 @@ class ImageProduit(models.Model):
         """Retourne une representation concise de l'image produit."""
         return f"Image {self.ordre} - {self.produit.titre}"
 
+    @property
+    def url_affichage(self) -> str:
+        """URL de repli: derivee JPEG de largeur moyenne, sinon l'original."""
+        chemin = chemin_defaut(self.derivees)
+        return default_storage.url(chemin) if chemin else self.image.url
+
+    @property
+    def srcset_webp(self) -> str:
+        """Attribut ``srcset`` des derivees WebP (vide sans derivee)."""
+        return srcset(self.derivees, "webp", default_storage)
+
+    @property
+    def srcset_jpeg(self) -> str:
+        """Attribut ``srcset`` des derivees JPEG (vide sans derivee)."""
+        return srcset(self.derivees, "jpeg", default_storage)
+
 
 class ProduitAgricole(models.Model):
     """Extension des attributs specifiques aux produits agricoles."""
@@ -164,3 +429,276 @@ class ProduitRetail(models.Model):
         """Retourne une representation lisible de la variante retail."""
         return f"Retail: {self.produit.titre}"
 
+
+class VersionCatalogue(models.Model):
+    """Compteurs de generation incrementes a chaque ecriture qu'ils couvrent.
+
+    Une ligne par compteur: ``CATALOGUE`` (toute ecriture visible dans le
+    catalogue) et ``LOCALISATIONS`` (ecritures sur ``Localisation`` seules,
+    pour l'instantane de ``RegistreLocalisations``). La valeur persistee
+    fait foi. Avec un cache partage (``CACHE_PARTAGE``), le cache en garde
+    une copie publiee apres chaque validation pour que la validation d'un
+    ETag ne coute aucune requete SQL; en memoire locale, les autres
+    processus ne verraient pas la publication: la ligne est relue.
+    """
+
+    CATALOGUE = 1
+    LOCALISATIONS = 2
+    CLE_CACHE = "catalogue:version"
+    DUREE_CACHE = 300
+
+    valeur = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def courante(cls, compteur: int = CATALOGUE) -> int:
+        """Retourne la valeur courante du compteur, depuis le cache partage si possible.
+
+        Une lecture routee au replica relit sa ligne: la copie du cache suit
+        le primaire et designerait des donnees que le replica n'a pas encore.
+        """
+        if not settings.CACHE_PARTAGE or lecture_au_replica():
+            return cls._lire(compteur)
+        valeur = cache.get(cls._cle_cache(compteur))
+        if valeur is None:
+            valeur = cls._lire(compteur)
+            # add: ne jamais ecraser une version plus recente publiee entre-temps.
+            cache.add(cls._cle_cache(compteur), valeur, cls.DUREE_CACHE)
+        return valeur
+
+    @classmethod
+    def incrementer(cls, compteur: int = CATALOGUE) -> None:
+        """Incremente le compteur et le publie dans le cache partage apres validation."""
+        if not cls.objects.filter(pk=compteur).update(valeur=models.F("valeur") + 1):
+            cls.objects.get_or_create(pk=compteur, defaults={"valeur": 1})
+        if settings.CACHE_PARTAGE:
+            transaction.on_commit(lambda: cls._publier(compteur))
+
+    @classmethod
+    def _cle_cache(cls, compteur: int) -> str:
+        """Cle de cache du compteur (celle du catalogue reste inchangee)."""
+        return cls.CLE_CACHE if compteur == cls.CATALOGUE else f"{cls.CLE_CACHE}:{compteur}"
+
+    @classmethod
+    def _lire(cls, compteur: int = CATALOGUE) -> int:
+        """Lit la valeur persistee (une requete sur la cle primaire)."""
+        return cls.objects.filter(pk=compteur).values_list("valeur", flat=True).first() or 0
+
+    @classmethod
+    def _publier(cls, compteur: int = CATALOGUE) -> None:
+        """Recopie la valeur persistee dans le cache."""
+        cache.set(cls._cle_cache(compteur), cls._lire(compteur), cls.DUREE_CACHE)
+
+    def __str__(self) -> str:
+        """Retourne une representation concise de la version."""
+        return f"Catalogue v{self.valeur}" if self.pk == self.CATALOGUE else f"Compteur {self.pk} v{self.valeur}"
+
+
+class EvenementCatalogue(models.Model):
+    """Journal des produits modifies, lu par les moteurs de selection en memoire.
+
+    Une ligne par produit touche (``produit_id``); une ligne sans produit
+    demande un rechargement complet (localisation renommee, insertions
+    groupees). Alimente seulement si ``CATALOGUE_MOTEUR`` designe un moteur
+    en memoire; les lignes plus vieilles que ``CATALOGUE_EVENEMENTS_RETENTION``
+    sont supprimees par ``manage.py purger_evenements_catalogue``.
+    """
+
+    produit_id = models.BigIntegerField(null=True, blank=True)
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    @staticmethod
+    def actif() -> bool:
+        """Indique si un moteur du catalogue lit le journal."""
+        return settings.CATALOGUE_MOTEUR in ("colonnes", "bitmaps")
+
+    @classmethod
+    def enregistrer(cls, produit_id: int | None) -> None:
+        """Ajoute un evenement si le journal est lu."""
+        if cls.actif():
+            cls.objects.create(produit_id=produit_id)
+
+    @classmethod
+    def purger(cls, retention: int) -> int:
+        """Supprime les evenements plus vieux que ``retention`` secondes."""
+        supprimes, _ = cls.objects.filter(date__lt=timezone.now() - timedelta(seconds=retention)).delete()
+        return supprimes
+
+    def __str__(self) -> str:
+        """Retourne une representation concise de l'evenement."""
+        return f"Evenement {self.pk} produit {self.produit_id or 'tous'}"
+
+
+class CarteCatalogue(models.Model):
+    """Modele de lecture du catalogue: une ligne autonome par produit disponible.
+
+    Recopie ce que la liste filtre, trie et affiche d'un produit et de ses
+    relations (chemin de categorie, lieu de vente, type et reputation du
+    vendeur, etat, region d'origine, images): une page du catalogue se lit
+    sur cette seule table. ``id`` est celui du produit. Tenue a jour dans la
+    transaction de chaque ecriture par ``ProjectionCatalogue``, seulement si
+    ``CATALOGUE_MOTEUR = "cartes"``; ``manage.py rebuild_cartes_catalogue``
+    la reconstruit a l'activation.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    titre = models.CharField(max_length=180)
+    resume = models.CharField(max_length=70, blank=True)
+    prix = models.DecimalField(max_digits=12, decimal_places=2)
+    date_creation = models.DateTimeField()
+    date_mise_a_jour = models.DateTimeField()
+    version_images = models.PositiveIntegerField(default=0)
+    categorie_id = models.BigIntegerField()
+    categorie_nom = models.CharField(max_length=120)
+    # Slugs de la racine a la categorie, encadres de "/": "/electronique/telephones/".
+    chemin_categorie = models.CharField(max_length=255)
+    lieu_vente_id = models.BigIntegerField()
+    region = models.CharField(max_length=32)
+    ville = models.CharField(max_length=120)
+    quartier = models.CharField(max_length=120)
+    vendeur_id = models.BigIntegerField()
+    # Vide si le vendeur n'a pas de profil.
+    type_vendeur = models.CharField(max_length=24, blank=True)
+    note_moyenne = models.FloatField(default=0)
+    total_avis = models.PositiveIntegerField(default=0)
+    etat = models.CharField(max_length=24, null=True, blank=True)
+    region_origine = models.CharField(max_length=32, null=True, blank=True)
+    # [url, srcset WebP, srcset JPEG] par image, l'image principale en tete.
+    images = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        """Index des tris du catalogue, globaux et par lieu."""
+
+        indexes = [
+            models.Index(fields=["date_creation", "id"], name="catalogue_carte_date_idx"),
+            models.Index(fields=["prix", "id"], name="catalogue_carte_prix_idx"),
+            models.Index(
+                fields=["region", "ville", "date_creation", "id"], name="catalogue_carte_lieu_date_idx"
+            ),
+            models.Index(fields=["region", "ville", "prix", "id"], name="catalogue_carte_lieu_prix_idx"),
+        ]
+
+    @staticmethod
+    def actif() -> bool:
+        """Indique si le catalogue est lu depuis le modele de lecture."""
+        return settings.CATALOGUE_MOTEUR == "cartes"
+
+    @property
+    def image_principale(self) -> str:
+        """URL de l'image principale, vide sans image."""
+        return self.images[0][0] if self.images else ""
+
+    def __str__(self) -> str:
+        """Retourne le titre du produit projete."""
+        return self.titre
+
+
+class FichierContenu(models.Model):
+    """Fichier stocke une seule fois par contenu, avec son nombre de references.
+
+    Les lignes sont creees par ``StockageContenu`` a l'ecriture; ``references``
+    est tenu par les signaux des modeles pointant vers le fichier et
+    reconstructible via ``manage.py rebuild_references_fichiers``.
+
+    Un televersement reserve la ligne (``reserve_le``) jusqu'a ce que sa
+    reference soit comptee: la purge, qui relit la ligne sous verrou avant
+    de supprimer le fichier, epargne un contenu identique televerse pendant
+    que sa derniere reference disparait.
+    """
+
+    DELAI_ORPHELIN = timedelta(hours=1)
+    DELAI_RESERVATION = timedelta(minutes=10)
+
+    chemin = models.CharField(max_length=255, unique=True)
+    empreinte = models.CharField(max_length=64, db_index=True)
+    taille = models.PositiveBigIntegerField(default=0)
+    references = models.IntegerField(default=0)
+    reserve_le = models.DateTimeField(null=True, blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def enregistrer(cls, chemin: str, empreinte: str, taille: int) -> None:
+        """Declare et reserve un fichier ecrit (ou deja present) a son adresse de contenu.
+
+        A appeler dans une transaction: la ligne reste verrouillee jusqu'a sa
+        validation, une purge concurrente attend puis la trouve reservee.
+        """
+        maintenant = timezone.now()
+        fichier, cree = cls.objects.select_for_update().get_or_create(
+            chemin=chemin, defaults={"empreinte": empreinte, "taille": taille, "reserve_le": maintenant}
+        )
+        if not cree:
+            cls.objects.filter(pk=fichier.pk).update(reserve_le=maintenant)
+
+    @classmethod
+    def ajuster(cls, chemin: str | None, delta: int) -> None:
+        """Ajoute ``delta`` aux references d'un chemin; purge apres validation a zero."""
+        if not chemin or not delta:
+            return
+        if delta > 0:
+            # La reference comptee remplace la reservation du televersement.
+            mis_a_jour = cls.objects.filter(chemin=chemin).update(
+                references=models.F("references") + delta, reserve_le=None
+            )
+            if not mis_a_jour:
+                # Ligne purgee ou jamais enregistree: recreee pour compter la reference.
+                empreinte = posixpath.splitext(posixpath.basename(chemin))[0]
+                cls.objects.get_or_create(
+                    chemin=chemin, defaults={"empreinte": empreinte, "references": delta}
+                )
+            return
+        cls.objects.filter(chemin=chemin).update(references=models.F("references") + delta)
+        transaction.on_commit(lambda: cls.purger([chemin]))
+
+    @classmethod
+    def _orphelins(cls) -> models.QuerySet:
+        """Lignes sans reference ni reservation en cours."""
+        return cls.objects.filter(references__lte=0).filter(
+            models.Q(reserve_le__isnull=True)
+            | models.Q(reserve_le__lt=timezone.now() - cls.DELAI_RESERVATION)
+        )
+
+    @classmethod
+    def purger(cls, chemins=None) -> int:
+        """Supprime fichiers et lignes sans reference, retourne le nombre de fichiers.
+
+        Sans liste de chemins, les fichiers recents sont epargnes: un
+        televersement dont la ligne n'est pas encore validee n'a pas de reference.
+        """
+        orphelins = cls._orphelins()
+        if chemins is not None:
+            orphelins = orphelins.filter(chemin__in=chemins)
+        else:
+            orphelins = orphelins.filter(date_creation__lt=timezone.now() - cls.DELAI_ORPHELIN)
+        supprimes = 0
+        for chemin in list(orphelins.values_list("chemin", flat=True)):
+            with transaction.atomic():
+                # Relue sous verrou: une reference ou une reservation posee entre-temps epargne le fichier.
+                if cls._orphelins().select_for_update().filter(chemin=chemin).exists():
+                    cls.objects.filter(chemin=chemin).delete()
+                    stockage_contenu.delete(chemin)
+                    supprimes += 1
+        return supprimes
+
+    @classmethod
+    def reconstruire(cls) -> int:
+        """Recompte les references depuis les champs servis par le stockage par contenu."""
+        totaux: dict[str, int] = {}
+        for champ in champs_contenu():
+            noms = (
+                champ.model._default_manager.exclude(**{champ.attname: ""})
+                .exclude(**{f"{champ.attname}__isnull": True})
+                .values_list(champ.attname, flat=True)
+                .iterator(chunk_size=2000)
+            )
+            for nom in noms:
+                totaux[nom] = totaux.get(nom, 0) + 1
+        fichiers = list(cls.objects.all())
+        for fichier in fichiers:
+            fichier.references = totaux.get(fichier.chemin, 0)
+        with transaction.atomic():
+            cls.objects.bulk_update(fichiers, ["references"], batch_size=1000)
+        return len(fichiers)
+
+    def __str__(self) -> str:
+        """Retourne une representation concise du fichier."""
+        return f"{self.chemin} ({self.references} ref.)"
@@ -0,0 +1,294 @@
+"""Projection des produits disponibles dans le modele de lecture ``CarteCatalogue``.
+
+Une ligne du catalogue joint aujourd'hui le produit, sa categorie, son lieu
+de vente, son vendeur et son profil, ses extensions agricole et retail, et
+precharge ses images. ``ProjectionCatalogue`` recopie ces valeurs dans une
+ligne par produit disponible, dans la transaction de l'ecriture qui les
+change (signaux): la liste se lit ensuite sur la seule table des cartes,
+avec ses index de tri. Les produits relus depuis les cartes sont des
+instances ``Produit`` dont les relations affichees sont deja en cache: les
+services de rendu des cartes ne font aucune requete de plus.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from typing import Any, NamedTuple
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch
+from django.template.defaultfilters import truncatechars
+
+from profil.models import ProfilUtilisateur
+
+from .models import (
+    CarteCatalogue,
+    Categorie,
+    CategorieFermeture,
+    ImageProduit,
+    Localisation,
+    Produit,
+    ProduitAgricole,
+    ProduitRetail,
+)
+
+User = get_user_model()
+
+
+class ImageCarte(NamedTuple):
+    """Image d'une carte, deja resolue en URL (memes attributs qu'``ImageProduit``)."""
+
+    url_affichage: str
+    srcset_webp: str
+    srcset_jpeg: str
+
+
+class ProjectionCatalogue:
+    """Maintien et relecture du modele de lecture du catalogue."""
+
+    # Colonnes des facettes sur la table des cartes (voir MoteurFacettes.COLONNES).
+    COLONNES = {
+        "categorie": "categorie_id",
+        "region": "region",
+        "ville": "ville",
+        "etat": "etat",
+        "region_origine": "region_origine",
+    }
+    TAILLE_LOT = 500
+    LONGUEUR_RESUME = 70
+
+    @staticmethod
+    def rafraichir(produit_ids: Iterable[int]) -> None:
+        """Reprojette les produits designes; les produits non disponibles perdent leur carte."""
+        if not CarteCatalogue.actif():
+            return
+        ids = set(produit_ids)
+        if not ids:
+            return
+        with transaction.atomic():
+            cartes = ProjectionCatalogue._projeter(
+                ProjectionCatalogue._produits().filter(id__in=ids)
+            )
+            absents = ids - {carte.id for carte in cartes}
+            if absents:
+                CarteCatalogue.objects.filter(id__in=absents).delete()
+            ProjectionCatalogue._ecrire(cartes)
+
+    @staticmethod
+    def rafraichir_vendeurs(utilisateur_ids: Iterable[int]) -> None:
+        """Reporte le type et la reputation des vendeurs sur leurs cartes."""
+        if not CarteCatalogue.actif():
+            return
+        ids = set(utilisateur_ids)
+        profils = {
+            profil.utilisateur_id: profil
+            for profil in ProfilUtilisateur.objects.filter(utilisateur_id__in=ids).only(
+                "utilisateur_id", "type_vendeur", "note_moyenne", "total_avis"
+            )
+        }
+        with transaction.atomic():
+            for utilisateur_id in ids:
+                ProjectionCatalogue.reporter_vendeur(utilisateur_id, profils.get(utilisateur_id))
+
+    @staticmethod
+    def reporter_vendeur(utilisateur_id: int, profil: ProfilUtilisateur | None) -> None:
+        """Recopie un profil (None s'il n'existe plus) sur les cartes du vendeur, en une requete."""
+        if CarteCatalogue.actif():
+            CarteCatalogue.objects.filter(vendeur_id=utilisateur_id).update(
+                **ProjectionCatalogue._champs_vendeur(profil)
+            )
+
+    @staticmethod
+    def rafraichir_categorie(categorie_id: int) -> None:
+        """Reprojette les produits de la categorie et de ses descendants (nom, chemin)."""
+        ProjectionCatalogue._rafraichir_par(
+            categorie_id__in=CategorieFermeture.objects.filter(ancetre_id=categorie_id).values(
+                "descendant_id"
+            )
+        )
+
+    @staticmethod
+    def rafraichir_lieu(localisation_id: int) -> None:
+        """Reprojette les produits d'un lieu de vente renomme."""
+        ProjectionCatalogue._rafraichir_par(lieu_vente_id=localisation_id)
+
+    @staticmethod
+    def reconstruire() -> int:
+        """Reconstruit toute la table des cartes, retourne le nombre de cartes."""
+        total = 0
+        with transaction.atomic():
+            CarteCatalogue.objects.all().delete()
+            ids = list(
+                Produit.objects.filter(statut=Produit.StatutChoices.DISPONIBLE)
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+            for debut in range(0, len(ids), ProjectionCatalogue.TAILLE_LOT):
+                lot = ids[debut : debut + ProjectionCatalogue.TAILLE_LOT]
+                cartes = ProjectionCatalogue._projeter(ProjectionCatalogue._produits().filter(id__in=lot))
+                CarteCatalogue.objects.bulk_create(cartes)
+                total += len(cartes)
+        return total
+
+    @staticmethod
+    def hydrater(cartes: Iterable[CarteCatalogue]) -> list[Produit]:
+        """Produits relus depuis leurs cartes, relations affichees deja en cache."""
+        return [ProjectionCatalogue._produit(carte) for carte in cartes]
+
+    @staticmethod
+    def _rafraichir_par(**filtre: Any) -> None:
+        """Reprojette les produits disponibles selectionnes par ``filtre``."""
+        if not CarteCatalogue.actif():
+            return
+        ProjectionCatalogue.rafraichir(
+            Produit.objects.filter(statut=Produit.StatutChoices.DISPONIBLE, **filtre).values_list(
+                "id", flat=True
+            )
+        )
+
+    @staticmethod
+    def _produits():
+        """Produits disponibles avec tout ce que leur carte recopie."""
+        return (
+            Produit.objects.filter(statut=Produit.StatutChoices.DISPONIBLE)
+            .select_related(
+                "categorie",
+                "lieu_vente",
+                "vendeur__profil_utilisateur",
+                "produit_agricole",
+                "produit_retail",
+            )
+            .prefetch_related(Prefetch("images", queryset=ImageProduit.objects.order_by("ordre", "id")))
+            .order_by()
+        )
+
+    @staticmethod
+    def _projeter(produits) -> list[CarteCatalogue]:
+        """Cartes des produits donnes, chemins de categorie lus en une requete."""
+        produits = list(produits)
+        chemins: dict[int, list[str]] = {}
+        lignes = (
+            CategorieFermeture.objects.filter(descendant_id__in={produit.categorie_id for produit in produits})
+            .order_by("descendant_id", "-profondeur")
+            .values_list("descendant_id", "ancetre__slug")
+        )
+        for categorie_id, slug in lignes:
+            chemins.setdefault(categorie_id, []).append(slug)
+
+        cartes = []
+        for produit in produits:
+            produit_retail = getattr(produit, "produit_retail", None)
+            produit_agricole = getattr(produit, "produit_agricole", None)
+            cartes.append(
+                CarteCatalogue(
+                    id=produit.id,
+                    titre=produit.titre,
+                    resume=truncatechars(produit.description, ProjectionCatalogue.LONGUEUR_RESUME),
+                    prix=produit.prix,
+                    date_creation=produit.date_creation,
+                    date_mise_a_jour=produit.date_mise_a_jour,
+                    version_images=produit.version_images,
+                    categorie_id=produit.categorie_id,
+                    categorie_nom=produit.categorie.nom,
+                    chemin_categorie="/" + "".join(f"{slug}/" for slug in chemins.get(produit.categorie_id, [])),
+                    lieu_vente_id=produit.lieu_vente_id,
+                    region=produit.lieu_vente.region,
+                    ville=produit.lieu_vente.ville,
+                    quartier=produit.lieu_vente.quartier,
+                    vendeur_id=produit.vendeur_id,
+                    **ProjectionCatalogue._champs_vendeur(getattr(produit.vendeur, "profil_utilisateur", None)),
+                    etat=produit_retail.etat if produit_retail else None,
+                    region_origine=produit_agricole.region_origine if produit_agricole else None,
+                    images=[
+                        [image.url_affichage, image.srcset_webp, image.srcset_jpeg]
+                        for image in produit.images.all()
+                    ],
+                )
+            )
+        return cartes
+
+    @staticmethod
+    def _champs_vendeur(profil: ProfilUtilisateur | None) -> dict[str, Any]:
+        """Champs d'une carte recopies du profil du vendeur."""
+        if profil is None:
+            return {"type_vendeur": "", "note_moyenne": 0.0, "total_avis": 0}
+        return {
+            "type_vendeur": profil.type_vendeur,
+            "note_moyenne": profil.note_moyenne,
+            "total_avis": profil.total_avis,
+        }
+
+    @staticmethod
+    def _ecrire(cartes: list[CarteCatalogue]) -> None:
+        """Insere ou remplace les cartes (une requete)."""
+        if not cartes:
+            return
+        CarteCatalogue.objects.bulk_create(
+            cartes,
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=[champ.name for champ in CarteCatalogue._meta.concrete_fields if not champ.primary_key],
+        )
+
+    @staticmethod
+    def _produit(carte: CarteCatalogue) -> Produit:
+        """Produit et relations affichees construits depuis une carte, sans requete.
+
+        Comme ``select_related``: instances ``from_db`` sur l'alias de la carte
+        et relations posees dans le cache des champs. Les champs non recopies
+        (marque, parent de la categorie...) restent differes; les profils et
+        extensions n'ont pas d'identifiant.
+        """
+        alias = carte._state.db
+        valeurs = {
+            "id": carte.id,
+            "vendeur_id": carte.vendeur_id,
+            "categorie_id": carte.categorie_id,
+            "lieu_vente_id": carte.lieu_vente_id,
+            "titre": carte.titre,
+            "description": carte.resume,
+            "prix": carte.prix,
+            "statut": Produit.StatutChoices.DISPONIBLE,
+            "date_creation": carte.date_creation,
+            "date_mise_a_jour": carte.date_mise_a_jour,
+            "version_images": carte.version_images,
+        }
+        produit = Produit.from_db(alias, list(valeurs), list(valeurs.values()))
+
+        categorie = Categorie.from_db(
+            alias,
+            ["id", "nom", "slug"],
+            [carte.categorie_id, carte.categorie_nom, carte.chemin_categorie.rstrip("/").rpartition("/")[2]],
+        )
+        Produit.categorie.field.set_cached_value(produit, categorie)
+        lieu = Localisation.from_db(
+            alias,
+            ["id", "region", "ville", "quartier"],
+            [carte.lieu_vente_id, carte.region, carte.ville, carte.quartier],
+        )
+        Produit.lieu_vente.field.set_cached_value(produit, lieu)
+
+        vendeur = User.from_db(alias, ["id"], [carte.vendeur_id])
+        profil = None
+        if carte.type_vendeur:
+            profil = ProfilUtilisateur.from_db(
+                alias,
+                ["id", "utilisateur_id", "type_vendeur", "note_moyenne", "total_avis"],
+                [None, carte.vendeur_id, carte.type_vendeur, carte.note_moyenne, carte.total_avis],
+            )
+        User.profil_utilisateur.related.set_cached_value(vendeur, profil)
+        Produit.vendeur.field.set_cached_value(produit, vendeur)
+
+        produit_retail = produit_agricole = None
+        if carte.etat is not None:
+            produit_retail = ProduitRetail.from_db(alias, ["id", "produit_id", "etat"], [None, carte.id, carte.etat])
+        if carte.region_origine is not None:
+            produit_agricole = ProduitAgricole.from_db(
+                alias, ["id", "produit_id", "region_origine"], [None, carte.id, carte.region_origine]
+            )
+        Produit.produit_retail.related.set_cached_value(produit, produit_retail)
+        Produit.produit_agricole.related.set_cached_value(produit, produit_agricole)
+
+        produit.images_carte = [ImageCarte(*image) for image in carte.images]
+        return produit
@@ -0,0 +1,210 @@
+"""Index inverse plein texte des produits (FTS5 sur SQLite, tsvector sur PostgreSQL)."""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from abc import ABC, abstractmethod
+from collections.abc import Iterable
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Produit
+
+TERMES_MAX = 8
+
+
+def normaliser_texte(texte: str) -> str:
+    """Met en minuscules et retire les accents pour un appariement tolerant."""
+    decompose = unicodedata.normalize("NFKD", texte or "")
+    return "".join(caractere for caractere in decompose if not unicodedata.combining(caractere)).lower()
+
+
+def extraire_termes(requete: str) -> list[str]:
+    """Decoupe une saisie utilisateur en termes surs pour le moteur plein texte."""
+    return re.findall(r"\w+", normaliser_texte(requete))[:TERMES_MAX]
+
+
+class BackendRecherche(ABC):
+    """Interface commune des backends de recherche plein texte."""
+
+    def __init__(self, alias: str = "default") -> None:
+        """Associe le backend a une base de donnees."""
+        self.alias = alias
+
+    def indexer(self, produits: Iterable[Produit]) -> None:
+        """Ajoute ou remplace les documents des produits donnes."""
+
+    def supprimer(self, produit_ids: Iterable[int]) -> None:
+        """Retire les documents des produits donnes."""
+
+    def reconstruire(self) -> int:
+        """Reindexe l'ensemble des produits, retourne le nombre de documents."""
+        return 0
+
+    @abstractmethod
+    def condition(self, requete: str) -> Q:
+        """Retourne la condition ORM des produits correspondant a la requete."""
+
+    def pertinence(self, requete: str):
+        """Retourne l'expression de score (plus haut = plus pertinent)."""
+        return Value(0.0, output_field=FloatField())
+
+
+class RechercheFTS5(BackendRecherche):
+    """Index FTS5 externe a la table produit, cle = rowid = id produit."""
+
+    TABLE = "catalogue_produit_fts"
+    POIDS_TITRE = 10.0
+    POIDS_DESCRIPTION = 1.0
+
+    def indexer(self, produits: Iterable[Produit]) -> None:
+        """Ajoute ou remplace les documents des produits donnes."""
+        lignes = [(produit.id, produit.titre, produit.description) for produit in produits]
+        if not lignes:
+            return
+        with connections[self.alias].cursor() as cursor:
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO {self.TABLE} (rowid, titre, description) VALUES (%s, %s, %s)",
+                lignes,
+            )
+
+    def supprimer(self, produit_ids: Iterable[int]) -> None:
+        """Retire les documents des produits donnes."""
+        ids = [(produit_id,) for produit_id in produit_ids]
+        if not ids:
+            return
+        with connections[self.alias].cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.TABLE} WHERE rowid = %s", ids)
+
+    def reconstruire(self) -> int:
+        """Reindexe l'ensemble des produits, retourne le nombre de documents."""
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.TABLE}")
+            cursor.execute(
+                f"INSERT INTO {self.TABLE} (rowid, titre, description) "
+                f"SELECT id, titre, description FROM {Produit._meta.db_table}"
+            )
+            return cursor.rowcount
+
+    def condition(self, requete: str) -> Q:
+        """Retourne la condition ORM des produits correspondant a la requete."""
+        return Q(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {self.TABLE} WHERE {self.TABLE} MATCH %s",
+                [self._expression(requete)],
+            )
+        )
+
+    def pertinence(self, requete: str):
+        """Retourne le score BM25 (inverse: FTS5 classe du plus petit au plus grand)."""
+        table_produit = Produit._meta.db_table
+        return RawSQL(
+            f"SELECT -bm25({self.TABLE}, %s, %s) FROM {self.TABLE} "
+            f'WHERE {self.TABLE} MATCH %s AND rowid = "{table_produit}"."id"',
+            [self.POIDS_TITRE, self.POIDS_DESCRIPTION, self._expression(requete)],
+            output_field=FloatField(),
+        )
+
+    @staticmethod
+    def _expression(requete: str) -> str:
+        """Construit une expression MATCH: chaque terme en prefixe, tous requis."""
+        return " ".join(f'"{terme}"*' for terme in extraire_termes(requete))
+
+
+class RecherchePostgres(BackendRecherche):
+    """Index tsvector pondere (titre A, description B) sous index GIN."""
+
+    TABLE = "catalogue_produit_recherche"
+    CONFIGURATION = "simple"
+
+    def indexer(self, produits: Iterable[Produit]) -> None:
+        """Ajoute ou remplace les documents des produits donnes."""
+        lignes = [
+            (
+                produit.id,
+                normaliser_texte(produit.titre),
+                normaliser_texte(produit.description),
+            )
+            for produit in produits
+        ]
+        if not lignes:
+            return
+        with connections[self.alias].cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.TABLE} (produit_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('{self.CONFIGURATION}', %s), 'A') || "
+                f"setweight(to_tsvector('{self.CONFIGURATION}', %s), 'B')) "
+                f"ON CONFLICT (produit_id) DO UPDATE SET document = EXCLUDED.document",
+                lignes,
+            )
+
+    def supprimer(self, produit_ids: Iterable[int]) -> None:
+        """Retire les documents des produits donnes."""
+        ids = list(produit_ids)
+        if not ids:
+            return
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.TABLE} WHERE produit_id = ANY(%s)", [ids])
+
+    def reconstruire(self) -> int:
+        """Reindexe l'ensemble des produits, retourne le nombre de documents."""
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.TABLE}")
+        total, lot = 0, []
+        produits = Produit.objects.using(self.alias).only("id", "titre", "description")
+        for produit in produits.iterator(chunk_size=1000):
+            lot.append(produit)
+            if len(lot) == 1000:
+                self.indexer(lot)
+                total, lot = total + len(lot), []
+        self.indexer(lot)
+        return total + len(lot)
+
+    def condition(self, requete: str) -> Q:
+        """Retourne la condition ORM des produits correspondant a la requete."""
+        return Q(
+            id__in=RawSQL(
+                f"SELECT produit_id FROM {self.TABLE} "
+                f"WHERE document @@ to_tsquery('{self.CONFIGURATION}', %s)",
+                [self._expression(requete)],
+            )
+        )
+
+    def pertinence(self, requete: str):
+        """Retourne le score ts_rank_cd du document du produit."""
+        table_produit = Produit._meta.db_table
+        return RawSQL(
+            f"SELECT ts_rank_cd(document, to_tsquery('{self.CONFIGURATION}', %s)) "
+            f'FROM {self.TABLE} WHERE produit_id = "{table_produit}"."id"',
+            [self._expression(requete)],
+            output_field=FloatField(),
+        )
+
+    @staticmethod
+    def _expression(requete: str) -> str:
+        """Construit une tsquery: chaque terme en prefixe, tous requis."""
+        return " & ".join(f"{terme}:*" for terme in extraire_termes(requete))
+
+
+class RechercheSimple(BackendRecherche):
+    """Repli sans index pour les moteurs sans plein texte (icontains)."""
+
+    def condition(self, requete: str) -> Q:
+        """Retourne une condition ``icontains`` sur chaque terme."""
+        condition = Q()
+        for terme in extraire_termes(requete):
+            condition &= Q(titre__icontains=terme) | Q(description__icontains=terme)
+        return condition
+
+
+def get_backend_recherche(alias: str = "default") -> BackendRecherche:
+    """Retourne le backend de recherche adapte au moteur de la base."""
+    vendor = connections[alias].vendor
+    if vendor == "sqlite":
+        return RechercheFTS5(alias)
+    if vendor == "postgresql":
+        return RecherchePostgres(alias)
+    return RechercheSimple(alias)
@@ -2,19 +2,41 @@
 
 from __future__ import annotations
 
+import base64
+import binascii
+import hashlib
+import json
+import math
 from collections import defaultdict
-from dataclasses import dataclass
+from collections.abc import Callable
+from dataclasses import astuple, dataclass
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from functools import partial
 from typing import Any
 
-from django.db.models import Count, Prefetch, QuerySet
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q, QuerySet, Sum
+from django.utils.dateparse import parse_datetime
 
+from kzone.concurrence import en_parallele
+from kzone.routers import lecture_replica
+
+from .bitmaps import MoteurBitmaps
+from .colonnes import MoteurColonnes
+from .facettes import FACETTES, MoteurFacettes, ResultatFacettes
+from .memoire import MoteurMemoire
+from .projection import ProjectionCatalogue
+from .recherche import extraire_termes, get_backend_recherche
 from .models import (
+    CarteCatalogue,
     Categorie,
-    ImageProduit,
-    Localisation,
+    CategorieFermeture,
+    CompteurDisponibilite,
     Produit,
-    ProduitAgricole,
     ProduitRetail,
+    VersionCatalogue,
 )
 
 
@@ -27,89 +49,510 @@ class CatalogueFiltres:
     ville: str
     etat: str
     region_origine: str
+    q: str = ""
+    tri: str = "recent"
+    prix_min: Decimal | None = None
+    prix_max: Decimal | None = None
 
 
 class CatalogueService:
     """Service principal de construction des donnees du catalogue."""
 
+    TAILLE_PAGE = 24
+    LONGUEUR_RECHERCHE_MAX = 100
+
+    # Cle de tri -> (champ de keyset, ordre decroissant), toujours departage par l'id.
+    # Chaque tri sur colonne a son index composite (statut, [lieu_vente,] champ, id).
+    ORDRES = {
+        "recent": ("date_creation", True),
+        "ancien": ("date_creation", False),
+        "prix_asc": ("prix", False),
+        "prix_desc": ("prix", True),
+        "pertinence": ("pertinence", True),
+    }
+    TRI_OPTIONS = (
+        ("recent", "Plus recents"),
+        ("ancien", "Plus anciens"),
+        ("prix_asc", "Prix croissant"),
+        ("prix_desc", "Prix decroissant"),
+        ("pertinence", "Pertinence"),
+    )
+    # Relations lues par une carte produit.
+    RELATIONS_CARTE = (
+        "categorie",
+        "lieu_vente",
+        "vendeur",
+        "vendeur__profil_utilisateur",
+        "produit_agricole",
+        "produit_retail",
+    )
+    # CATALOGUE_MOTEUR -> moteur de selection en memoire ("sql": aucun).
+    MOTEURS_MEMOIRE = {"colonnes": MoteurColonnes, "bitmaps": MoteurBitmaps}
+
     @staticmethod
     def parse_filtres(params: dict[str, Any]) -> CatalogueFiltres:
         """Convertit la querystring en objet filtre nettoye."""
+        q = (params.get("q") or "").strip()[: CatalogueService.LONGUEUR_RECHERCHE_MAX]
+        tri = (params.get("tri") or "").strip()
+        if tri not in CatalogueService.ORDRES or (tri == "pertinence" and not extraire_termes(q)):
+            tri = "pertinence" if extraire_termes(q) else "recent"
         return CatalogueFiltres(
             categorie=(params.get("categorie") or "").strip(),
             region=(params.get("region") or "").strip(),
             ville=(params.get("ville") or "").strip(),
             etat=(params.get("etat") or "").strip(),
             region_origine=(params.get("region_origine") or "").strip(),
+            q=q,
+            tri=tri,
+            prix_min=CatalogueService._parse_prix(params.get("prix_min")),
+            prix_max=CatalogueService._parse_prix(params.get("prix_max")),
         )
 
     @staticmethod
+    def _parse_prix(valeur: Any) -> Decimal | None:
+        """Convertit une borne de prix saisie, None si vide, invalide ou negative."""
+        try:
+            prix = Decimal(str(valeur or "").strip().replace(" ", "").replace(",", "."))
+        except InvalidOperation:
+            return None
+        if not prix.is_finite() or prix < 0:
+            return None
+        return prix
+
+    @staticmethod
+    @lecture_replica()
     def get_catalogue_context(params: dict[str, Any]) -> dict[str, Any]:
         """Construit tout le contexte necessaire pour la page catalogue."""
         filtres = CatalogueService.parse_filtres(params)
-        produits = CatalogueService._filtrer_produits(filtres)
-        categorie_selectionnee = CatalogueService._get_categorie_by_slug(filtres.categorie)
+        taches = CatalogueService._taches_catalogue(filtres, params)
+        return CatalogueService._assembler_catalogue(
+            filtres, **{nom: tache() for nom, tache in taches.items()}
+        )
+
+    @staticmethod
+    async def aget_catalogue_context(
+        params: dict[str, Any], mesure: Callable | None = None
+    ) -> dict[str, Any]:
+        """Variante asynchrone: page, facettes et donnees de la sidebar lues en parallele."""
+        filtres = CatalogueService.parse_filtres(params)
+        with lecture_replica():
+            taches = await sync_to_async(CatalogueService._taches_catalogue)(filtres, params)
+            resultats = await en_parallele(*taches.values(), mesure=mesure)
+        return CatalogueService._assembler_catalogue(filtres, **dict(zip(taches, resultats)))
+
+    @staticmethod
+    def _taches_catalogue(
+        filtres: CatalogueFiltres, params: dict[str, Any]
+    ) -> dict[str, Callable[[], Any]]:
+        """Lectures independantes du contexte catalogue, une fonction par resultat."""
+        taches: dict[str, Callable[[], Any]] = {
+            "racine_slug": partial(CatalogueService._get_root_slug_by_slug, filtres.categorie),
+            "categories": CatalogueService._get_categories,
+            "ids_actifs": partial(CatalogueService._get_ancestor_ids_by_slug, filtres.categorie),
+        }
+        moteur = CatalogueService._moteur_memoire(filtres)
+        if moteur is not None:
+            descendants = CatalogueService._get_descendant_ids_by_slug(filtres.categorie)
+            taches["page"] = partial(
+                CatalogueService._paginer_en_memoire, moteur, filtres, descendants, params.get("curseur") or ""
+            )
+            taches["facettes"] = partial(moteur.facettes, filtres, descendants)
+            return taches
+
+        utiliser_compteurs = CatalogueService._compteurs_applicables(filtres)
+        if CatalogueService._modele_lecture_applicable(filtres):
+            conditions = CatalogueService._get_conditions_cartes(filtres)
+            paginer, selection = CatalogueService._paginer_cartes, CatalogueService._filtrer_cartes
+            base = CatalogueService._get_cartes_disponibles(filtres)
+            colonnes = ProjectionCatalogue.COLONNES
+        else:
+            conditions = CatalogueService._get_conditions_facettes(filtres)
+            paginer, selection = CatalogueService._paginer_produits, CatalogueService._filtrer_produits
+            base = CatalogueService._get_produits_disponibles(filtres)
+            colonnes = None
+        taches |= {
+            "page": partial(
+                paginer,
+                selection(filtres, conditions),
+                params.get("curseur") or "",
+                filtres.tri,
+            ),
+            "facettes": partial(
+                MoteurFacettes.calculer,
+                base,
+                conditions,
+                colonnes=colonnes,
+                facettes=tuple(
+                    facette
+                    for facette in FACETTES
+                    if not (utiliser_compteurs and facette == "categorie")
+                ),
+            ),
+        }
+        if utiliser_compteurs:
+            taches["comptes_categorie"] = partial(CatalogueService._get_counts_by_categorie, filtres)
+        return taches
+
+    @staticmethod
+    def _assembler_catalogue(
+        filtres: CatalogueFiltres,
+        page: tuple[list[Produit], str],
+        facettes: ResultatFacettes,
+        racine_slug: str | None,
+        categories: list[Categorie],
+        ids_actifs: set[int],
+        comptes_categorie: dict[int, int] | None = None,
+    ) -> dict[str, Any]:
+        """Compose le contexte catalogue a partir des lectures, sans requete SQL."""
+        produits, curseur_suivant = page
+        if comptes_categorie is not None:
+            facettes = ResultatFacettes(
+                total=facettes.total,
+                comptes={**facettes.comptes, "categorie": comptes_categorie},
+            )
 
         return {
             "filtres": filtres,
             "produits": produits,
-            "total_produits": produits.count(),
-            "regions": CatalogueService._get_regions_disponibles(),
-            "villes": CatalogueService._get_villes_disponibles(filtres.region),
-            "categories_sidebar": CatalogueService._build_sidebar_categories(filtres),
-            "show_retail_filters": CatalogueService._show_retail_filters(categorie_selectionnee),
-            "show_agricole_filters": CatalogueService._show_agricole_filters(categorie_selectionnee),
-            "etat_options": CatalogueService._get_retail_etats(),
-            "region_origine_options": CatalogueService._get_regions_origine(),
+            "curseur_suivant": curseur_suivant,
+            "total_produits": facettes.total,
+            "facettes": facettes,
+            "regions": CatalogueService._get_options_facette(facettes, "region", filtres.region),
+            "villes": CatalogueService._get_options_facette(facettes, "ville", filtres.ville),
+            "categories_sidebar": CatalogueService._build_sidebar_categories(
+                filtres, facettes.valeurs("categorie"), categories, ids_actifs
+            ),
+            "show_retail_filters": CatalogueService._show_retail_filters(racine_slug),
+            "show_agricole_filters": CatalogueService._show_agricole_filters(racine_slug),
+            "etat_options": CatalogueService._get_options_facette(
+                facettes, "etat", filtres.etat, ordre=ProduitRetail.EtatChoices.values
+            ),
+            "region_origine_options": CatalogueService._get_options_facette(
+                facettes, "region_origine", filtres.region_origine
+            ),
+            "tri_options": CatalogueService._get_tri_options(filtres),
         }
 
     @staticmethod
-    def _filtrer_produits(filtres: CatalogueFiltres) -> QuerySet[Produit]:
-        """Applique les filtres principaux et contextuels sur les produits."""
-        queryset = (
-            Produit.objects.select_related(
-                "categorie",
-                "lieu_vente",
-                "vendeur",
-                "vendeur__profil_utilisateur",
-                "produit_agricole",
-                "produit_retail",
+    @lecture_replica()
+    def get_page_context(params: dict[str, Any]) -> dict[str, Any]:
+        """Construit uniquement la page suivante du catalogue (defilement infini)."""
+        filtres = CatalogueService.parse_filtres(params)
+        moteur = CatalogueService._moteur_memoire(filtres)
+        if moteur is not None:
+            produits, curseur_suivant = CatalogueService._paginer_en_memoire(
+                moteur,
+                filtres,
+                CatalogueService._get_descendant_ids_by_slug(filtres.categorie),
+                params.get("curseur") or "",
+            )
+        elif CatalogueService._modele_lecture_applicable(filtres):
+            produits, curseur_suivant = CatalogueService._paginer_cartes(
+                CatalogueService._filtrer_cartes(filtres),
+                params.get("curseur") or "",
+                filtres.tri,
+            )
+        else:
+            produits, curseur_suivant = CatalogueService._paginer_produits(
+                CatalogueService._filtrer_produits(filtres),
+                params.get("curseur") or "",
+                filtres.tri,
             )
-            .prefetch_related(
-                Prefetch("images", queryset=ImageProduit.objects.order_by("ordre", "id"))
+        return {
+            "filtres": filtres,
+            "produits": produits,
+            "curseur_suivant": curseur_suivant,
+        }
+
+    @staticmethod
+    def get_etag(params: dict[str, Any], *discriminants: str) -> str:
+        """Calcule un ETag fort depuis la version du catalogue et les filtres normalises.
+
+        Aucune requete SQL n'est executee tant que la version est en cache: un
+        client a jour recoit une 304 sans calcul de contexte ni rendu. La
+        version est lue dans la portee du corps (``lecture_replica``), avant
+        lui: un replica en retard ne sert jamais un corps ancien sous l'ETag
+        d'une version plus recente.
+        """
+        filtres = CatalogueService.parse_filtres(params)
+        with lecture_replica():
+            version = VersionCatalogue.courante()
+        empreinte = json.dumps(
+            [
+                version,
+                [str(valeur) if valeur is not None else None for valeur in astuple(filtres)],
+                params.get("curseur") or "",
+                *discriminants,
+            ],
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(empreinte.encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def encoder_curseur(produit: Produit, tri: str = "recent") -> str:
+        """Encode la position (tri, valeur de tri, id) d'un produit en curseur opaque."""
+        valeur = getattr(produit, CatalogueService.ORDRES[tri][0])
+        if isinstance(valeur, datetime):
+            valeur = valeur.isoformat()
+        elif isinstance(valeur, Decimal):
+            valeur = str(valeur)
+        brut = json.dumps([tri, valeur, produit.id], separators=(",", ":"))
+        return base64.urlsafe_b64encode(brut.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def decoder_curseur(curseur: str, tri: str = "recent") -> tuple[Any, int] | None:
+        """Decode un curseur opaque, retourne None s'il est absent, invalide ou d'un autre tri."""
+        if not curseur:
+            return None
+        try:
+            brut = base64.urlsafe_b64decode(curseur + "=" * (-len(curseur) % 4))
+            tri_curseur, valeur, produit_id = json.loads(brut)
+            champ = CatalogueService.ORDRES.get(tri_curseur, ("", False))[0]
+            if champ == "date_creation":
+                valeur = parse_datetime(valeur)
+            elif champ == "prix":
+                valeur = Decimal(valeur)
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, InvalidOperation):
+            return None
+        if tri_curseur != tri or valeur is None or not isinstance(produit_id, int):
+            return None
+        # json accepte NaN / Infinity, que le filtre keyset ne sait pas comparer.
+        if isinstance(valeur, Decimal) and not valeur.is_finite():
+            return None
+        if tri == "pertinence" and not (isinstance(valeur, (int, float)) and math.isfinite(valeur)):
+            return None
+        return valeur, produit_id
+
+    @staticmethod
+    def _paginer_produits(
+        queryset: QuerySet[Produit], curseur: str, tri: str = "recent"
+    ) -> tuple[list[Produit], str]:
+        """Retourne une page par curseur (keyset) et le curseur de la page suivante.
+
+        Le filtre porte sur le couple (champ de tri, id), couvert par l'index
+        composite du tri (``catalogue_prod_statut_date_idx``,
+        ``catalogue_prod_statut_prix_idx`` ou leurs variantes par lieu de
+        vente) : le cout d'une page reste constant quelle que soit la
+        profondeur de defilement, contrairement a un OFFSET.
+        """
+        position = CatalogueService.decoder_curseur(curseur, tri)
+        if position is not None:
+            champ, descendant = CatalogueService.ORDRES[tri]
+            comparaison = "lt" if descendant else "gt"
+            valeur, produit_id = position
+            queryset = queryset.filter(
+                Q(**{f"{champ}__{comparaison}": valeur})
+                | Q(**{champ: valeur, f"id__{comparaison}": produit_id})
             )
-            .filter(statut=Produit.StatutChoices.DISPONIBLE)
-            .order_by("-date_creation")
+
+        taille = CatalogueService.TAILLE_PAGE
+        produits = list(queryset[: taille + 1])
+        if len(produits) <= taille:
+            return produits, ""
+        return produits[:taille], CatalogueService.encoder_curseur(produits[taille - 1], tri)
+
+    @staticmethod
+    def _moteur_memoire(filtres: CatalogueFiltres) -> type[MoteurMemoire] | None:
+        """Moteur en memoire choisi par ``CATALOGUE_MOTEUR``, None pour le moteur SQL.
+
+        La recherche plein texte reste en SQL: son index et son score de
+        pertinence vivent dans la base.
+        """
+        if extraire_termes(filtres.q):
+            return None
+        return CatalogueService.MOTEURS_MEMOIRE.get(settings.CATALOGUE_MOTEUR)
+
+    @staticmethod
+    def _paginer_en_memoire(
+        moteur: type[MoteurMemoire], filtres: CatalogueFiltres, descendants: list[int], curseur: str
+    ) -> tuple[list[Produit], str]:
+        """Page choisie par un moteur en memoire, chargee en une requete par id."""
+        champ, descendant = CatalogueService.ORDRES[filtres.tri]
+        taille = CatalogueService.TAILLE_PAGE
+        selection = moteur.selectionner(
+            filtres,
+            descendants,
+            champ,
+            descendant,
+            CatalogueService.decoder_curseur(curseur, filtres.tri),
+            taille + 1,
         )
+        ids = [produit_id for produit_id, _ in selection[:taille]]
+        # Un produit retire depuis la derniere version de l'instantane est omis.
+        charges = (
+            CatalogueService._get_produits_disponibles()
+            .select_related(*CatalogueService.RELATIONS_CARTE)
+            .in_bulk(ids)
+        )
+        produits = [charges[produit_id] for produit_id in ids if produit_id in charges]
+        if len(selection) <= taille:
+            return produits, ""
+        produit_id, valeur = selection[taille - 1]
+        return produits, CatalogueService.encoder_curseur(
+            Produit(id=produit_id, **{champ: valeur}), filtres.tri
+        )
+
+    @staticmethod
+    def _modele_lecture_applicable(filtres: CatalogueFiltres) -> bool:
+        """Indique si la liste se lit sur le modele de lecture ``CarteCatalogue``.
+
+        La recherche plein texte reste sur les produits, qui portent son index.
+        """
+        return CarteCatalogue.actif() and not extraire_termes(filtres.q)
+
+    @staticmethod
+    def _paginer_cartes(
+        queryset: QuerySet[CarteCatalogue], curseur: str, tri: str
+    ) -> tuple[list[Produit], str]:
+        """Page de cartes par curseur, relue en produits sans autre requete."""
+        cartes, curseur_suivant = CatalogueService._paginer_produits(queryset, curseur, tri)
+        return ProjectionCatalogue.hydrater(cartes), curseur_suivant
+
+    @staticmethod
+    def _get_cartes_disponibles(filtres: CatalogueFiltres) -> QuerySet[CarteCatalogue]:
+        """Cartes restreintes par le prix, avant facettes."""
+        queryset = CarteCatalogue.objects.all()
+        if filtres.prix_min is not None:
+            queryset = queryset.filter(prix__gte=filtres.prix_min)
+        if filtres.prix_max is not None:
+            queryset = queryset.filter(prix__lte=filtres.prix_max)
+        return queryset
 
+    @staticmethod
+    def _get_conditions_cartes(filtres: CatalogueFiltres) -> dict[str, Q]:
+        """Une condition par facette active, sur les colonnes des cartes.
+
+        La categorie filtre le chemin de slugs de chaque carte: aucune
+        jointure sur la fermeture des categories. Une categorie inconnue est
+        ignoree, comme sur les produits.
+        """
+        conditions: dict[str, Q] = {}
+        if filtres.categorie and CatalogueService._get_categorie_by_slug(filtres.categorie):
+            conditions["categorie"] = Q(chemin_categorie__contains=f"/{filtres.categorie}/")
+        for facette in ("region", "ville", "etat", "region_origine"):
+            valeur = getattr(filtres, facette)
+            if valeur:
+                conditions[facette] = Q(**{ProjectionCatalogue.COLONNES[facette]: valeur})
+        return conditions
+
+    @staticmethod
+    def _filtrer_cartes(
+        filtres: CatalogueFiltres, conditions: dict[str, Q] | None = None
+    ) -> QuerySet[CarteCatalogue]:
+        """Cartes filtrees et ordonnees comme ``_filtrer_produits``, sur une seule table."""
+        if conditions is None:
+            conditions = CatalogueService._get_conditions_cartes(filtres)
+        champ, descendant = CatalogueService.ORDRES[filtres.tri]
+        sens = "-" if descendant else ""
+        queryset = CatalogueService._get_cartes_disponibles(filtres).order_by(f"{sens}{champ}", f"{sens}id")
+        for condition in conditions.values():
+            queryset = queryset.filter(condition)
+        return queryset
+
+    @staticmethod
+    def _get_produits_disponibles(filtres: CatalogueFiltres | None = None) -> QuerySet[Produit]:
+        """Retourne les produits disponibles, restreints par la recherche et le prix mais avant facettes."""
+        queryset = Produit.objects.filter(statut=Produit.StatutChoices.DISPONIBLE)
+        if filtres is None:
+            return queryset
+        if extraire_termes(filtres.q):
+            queryset = queryset.filter(get_backend_recherche(queryset.db).condition(filtres.q))
+        if filtres.prix_min is not None:
+            queryset = queryset.filter(prix__gte=filtres.prix_min)
+        if filtres.prix_max is not None:
+            queryset = queryset.filter(prix__lte=filtres.prix_max)
+        return queryset
+
+    @staticmethod
+    def _get_conditions_facettes(filtres: CatalogueFiltres) -> dict[str, Q]:
+        """Traduit les filtres actifs en une condition par facette."""
+        conditions: dict[str, Q] = {}
         if filtres.categorie:
             categorie = CatalogueService._get_categorie_by_slug(filtres.categorie)
             if categorie:
-                ids_categories = CatalogueService._get_descendant_ids(categorie.id)
-                queryset = queryset.filter(categorie_id__in=ids_categories)
-
+                conditions["categorie"] = Q(
+                    categorie_id__in=CategorieFermeture.objects.filter(
+                        ancetre_id=categorie.id
+                    ).values("descendant_id")
+                )
         if filtres.region:
-            queryset = queryset.filter(lieu_vente__region=filtres.region)
+            conditions["region"] = Q(lieu_vente__region=filtres.region)
         if filtres.ville:
-            queryset = queryset.filter(lieu_vente__ville=filtres.ville)
-
+            conditions["ville"] = Q(lieu_vente__ville=filtres.ville)
         if filtres.etat:
-            queryset = queryset.filter(produit_retail__etat=filtres.etat)
+            conditions["etat"] = Q(produit_retail__etat=filtres.etat)
         if filtres.region_origine:
-            queryset = queryset.filter(produit_agricole__region_origine=filtres.region_origine)
+            conditions["region_origine"] = Q(
+                produit_agricole__region_origine=filtres.region_origine
+            )
+        return conditions
 
+    @staticmethod
+    def _filtrer_produits(
+        filtres: CatalogueFiltres, conditions: dict[str, Q] | None = None
+    ) -> QuerySet[Produit]:
+        """Applique les filtres principaux et contextuels sur les produits."""
+        if conditions is None:
+            conditions = CatalogueService._get_conditions_facettes(filtres)
+
+        # Les images ne sont pas prechargees ici: seules les cartes absentes du
+        # cache de fragments en ont besoin (voir acceuil.services.CarteProduitService).
+        queryset = CatalogueService._get_produits_disponibles(filtres).select_related(
+            *CatalogueService.RELATIONS_CARTE
+        )
+        if filtres.tri == "pertinence":
+            queryset = queryset.annotate(
+                pertinence=get_backend_recherche(queryset.db).pertinence(filtres.q)
+            )
+        champ, descendant = CatalogueService.ORDRES[filtres.tri]
+        sens = "-" if descendant else ""
+        queryset = queryset.order_by(f"{sens}{champ}", f"{sens}id")
+        for condition in conditions.values():
+            queryset = queryset.filter(condition)
         return queryset
 
     @staticmethod
-    def _build_sidebar_categories(filtres: CatalogueFiltres) -> list[dict[str, Any]]:
+    def _get_tri_options(filtres: CatalogueFiltres) -> list[dict[str, str]]:
+        """Liste les modes de tri proposes, la pertinence seulement avec une recherche."""
+        return [
+            {"valeur": valeur, "libelle": libelle}
+            for valeur, libelle in CatalogueService.TRI_OPTIONS
+            if valeur != "pertinence" or extraire_termes(filtres.q)
+        ]
+
+    @staticmethod
+    def _get_options_facette(
+        facettes: ResultatFacettes,
+        facette: str,
+        selection: str,
+        ordre: list[str] | None = None,
+    ) -> list[dict[str, Any]]:
+        """Construit les options d'une liste deroulante avec leur compte.
+
+        La valeur selectionnee reste proposee meme sans resultat afin que la
+        liste deroulante conserve la selection courante.
+        """
+        comptes = dict(facettes.valeurs(facette))
+        if selection and selection not in comptes:
+            comptes[selection] = 0
+        valeurs = sorted(comptes)
+        if ordre is not None:
+            rang = {valeur: index for index, valeur in enumerate(ordre)}
+            valeurs.sort(key=lambda valeur: rang.get(valeur, len(rang)))
+        return [{"valeur": valeur, "total": comptes[valeur]} for valeur in valeurs]
+
+    @staticmethod
+    def _build_sidebar_categories(
+        filtres: CatalogueFiltres,
+        counts_map: dict[int, int],
+        categories: list[Categorie],
+        ids_actifs: set[int],
+    ) -> list[dict[str, Any]]:
         """Construit la structure parent/enfants avec compte de produits."""
-        categories = list(Categorie.objects.select_related("parent").all())
         if not categories:
             return []
 
-        counts_map = CatalogueService._get_counts_by_categorie(filtres)
         children_map: dict[int | None, list[Categorie]] = defaultdict(list)
-        by_id = {categorie.id: categorie for categorie in categories}
         for categorie in categories:
             children_map[categorie.parent_id].append(categorie)
 
@@ -142,110 +585,120 @@ class CatalogueService:
 
         for element in sidebar:
             element["is_active"] = CatalogueService._is_category_active(
-                element["categorie"], filtres.categorie, by_id
+                element["categorie"], ids_actifs
             )
             for child in element["children"]:
                 child["is_active"] = child["categorie"].slug == filtres.categorie
 
         return sidebar
 
+    @staticmethod
+    def _get_categories() -> list[Categorie]:
+        """Charge toutes les categories de la sidebar."""
+        return list(Categorie.objects.all())
+
+    @staticmethod
+    def _compteurs_applicables(filtres: CatalogueFiltres) -> bool:
+        """Indique si les comptes par categorie peuvent venir des compteurs.
+
+        Les compteurs ne connaissent que la categorie et la localisation: tout
+        autre filtre actif, recherche et prix compris, impose de compter sur la
+        table des produits.
+        """
+        return not (
+            filtres.etat
+            or filtres.region_origine
+            or extraire_termes(filtres.q)
+            or filtres.prix_min is not None
+            or filtres.prix_max is not None
+        )
+
     @staticmethod
     def _get_counts_by_categorie(filtres: CatalogueFiltres) -> dict[int, int]:
         """Retourne le nombre de produits disponibles par categorie directe."""
-        queryset = Produit.objects.filter(statut=Produit.StatutChoices.DISPONIBLE)
+        queryset = CompteurDisponibilite.objects.filter(total__gt=0)
         if filtres.region:
-            queryset = queryset.filter(lieu_vente__region=filtres.region)
+            queryset = queryset.filter(region=filtres.region)
         if filtres.ville:
-            queryset = queryset.filter(lieu_vente__ville=filtres.ville)
+            queryset = queryset.filter(ville=filtres.ville)
         return dict(
             queryset.values("categorie_id")
-            .annotate(total=Count("id"))
+            .annotate(total=Sum("total"))
             .values_list("categorie_id", "total")
+            .order_by()
         )
 
     @staticmethod
     def _get_descendant_ids(categorie_id: int) -> list[int]:
         """Retourne tous les ids descendants, categorie source incluse."""
-        parent_by_id = dict(Categorie.objects.values_list("id", "parent_id"))
-        descendants: list[int] = []
-        queue = [categorie_id]
-        while queue:
-            current = queue.pop(0)
-            descendants.append(current)
-            for enfant_id, parent_id in parent_by_id.items():
-                if parent_id == current:
-                    queue.append(enfant_id)
-        return descendants
-
-    @staticmethod
-    def _is_category_active(
-        categorie: Categorie, selected_slug: str, by_id: dict[int, Categorie]
-    ) -> bool:
+        return list(
+            CategorieFermeture.objects.filter(ancetre_id=categorie_id).values_list(
+                "descendant_id", flat=True
+            )
+        )
+
+    @staticmethod
+    def _get_descendant_ids_by_slug(slug: str) -> list[int]:
+        """Retourne les ids descendants d'une categorie designee par son slug (vide si inconnue)."""
+        if not slug:
+            return []
+        return list(
+            CategorieFermeture.objects.filter(ancetre__slug=slug).values_list(
+                "descendant_id", flat=True
+            )
+        )
+
+    @staticmethod
+    def _get_ancestor_ids_by_slug(slug: str) -> set[int]:
+        """Retourne les ids des ancetres d'une categorie, categorie incluse."""
+        if not slug:
+            return set()
+        return set(
+            CategorieFermeture.objects.filter(descendant__slug=slug).values_list(
+                "ancetre_id", flat=True
+            )
+        )
+
+    @staticmethod
+    def _is_category_active(categorie: Categorie, ids_actifs: set[int]) -> bool:
         """Indique si la categorie est active ou ancetre de la categorie active."""
-        if not selected_slug:
-            return False
-        current = next((item for item in by_id.values() if item.slug == selected_slug), None)
-        while current:
-            if current.id == categorie.id:
-                return True
-            current = by_id.get(current.parent_id)
-        return False
+        return categorie.id in ids_actifs
 
     @staticmethod
-    def _show_retail_filters(categorie: Categorie | None) -> bool:
+    def _show_retail_filters(racine_slug: str | None) -> bool:
         """Determine si les filtres retail doivent etre affiches."""
-        if categorie is None:
+        if racine_slug is None:
             return True
-        return CatalogueService._get_root_slug(categorie) == "retail"
+        return racine_slug == "retail"
 
     @staticmethod
-    def _show_agricole_filters(categorie: Categorie | None) -> bool:
+    def _show_agricole_filters(racine_slug: str | None) -> bool:
         """Determine si les filtres agricoles doivent etre affiches."""
-        if categorie is None:
+        if racine_slug is None:
             return True
-        return CatalogueService._get_root_slug(categorie) == "agricole"
+        return racine_slug == "agricole"
 
     @staticmethod
     def _get_root_slug(categorie: Categorie) -> str:
         """Retourne le slug de la racine de la categorie."""
-        current = categorie
-        while current.parent_id:
-            current = current.parent
-        return current.slug
-
-    @staticmethod
-    def _get_regions_disponibles() -> list[str]:
-        """Retourne la liste des regions disponibles pour le selecteur."""
-        return list(
-            Localisation.objects.order_by("region")
-            .values_list("region", flat=True)
-            .distinct()
-        )
-
-    @staticmethod
-    def _get_villes_disponibles(region: str) -> list[str]:
-        """Retourne les villes disponibles, optionnellement filtrees par region."""
-        queryset = Localisation.objects.order_by("ville")
-        if region:
-            queryset = queryset.filter(region=region)
-        return list(queryset.values_list("ville", flat=True).distinct())
-
-    @staticmethod
-    def _get_retail_etats() -> list[str]:
-        """Retourne les etats retail presents dans le catalogue."""
-        return list(
-            ProduitRetail.objects.filter(produit__statut=Produit.StatutChoices.DISPONIBLE)
-            .values_list("etat", flat=True)
-            .distinct()
+        return (
+            CategorieFermeture.objects.filter(descendant_id=categorie.id)
+            .order_by("-profondeur")
+            .values_list("ancetre__slug", flat=True)
+            .first()
+            or categorie.slug
         )
 
     @staticmethod
-    def _get_regions_origine() -> list[str]:
-        """Retourne les regions d'origine disponibles pour les produits agricoles."""
-        return list(
-            ProduitAgricole.objects.filter(produit__statut=Produit.StatutChoices.DISPONIBLE)
-            .values_list("region_origine", flat=True)
-            .distinct()
+    def _get_root_slug_by_slug(slug: str) -> str | None:
+        """Retourne le slug racine d'une categorie designee par son slug, None sinon."""
+        if not slug:
+            return None
+        return (
+            CategorieFermeture.objects.filter(descendant__slug=slug)
+            .order_by("-profondeur")
+            .values_list("ancetre__slug", flat=True)
+            .first()
         )
 
     @staticmethod
@@ -0,0 +1,333 @@
+"""Signaux de maintenance des donnees derivees du catalogue."""
+
+from __future__ import annotations
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from .images import generer_derivees, supprimer_derivees
+from .models import (
+    Categorie,
+    CompteurDisponibilite,
+    EvenementCatalogue,
+    FichierContenu,
+    ImageProduit,
+    Localisation,
+    Produit,
+    VersionCatalogue,
+)
+from .projection import ProjectionCatalogue
+from .recherche import get_backend_recherche
+from .stockage import champs_contenu
+
+CleCompteur = tuple[int, str, str]
+CHAMPS_INDEXES = {"titre", "description"}
+
+
+def _cle_compteur(statut: str, categorie_id: int, region: str, ville: str) -> CleCompteur | None:
+    """Retourne la cle de compteur d'un produit, None s'il n'est pas disponible."""
+    if statut != Produit.StatutChoices.DISPONIBLE:
+        return None
+    return categorie_id, region, ville
+
+
+def _cle_compteur_produit(produit: Produit) -> CleCompteur | None:
+    """Calcule la cle de compteur courante d'une instance de produit."""
+    if produit.statut != Produit.StatutChoices.DISPONIBLE:
+        return None
+    if Produit.lieu_vente.is_cached(produit):
+        region, ville = produit.lieu_vente.region, produit.lieu_vente.ville
+    else:
+        region, ville = Localisation.objects.values_list("region", "ville").get(
+            pk=produit.lieu_vente_id
+        )
+    return _cle_compteur(produit.statut, produit.categorie_id, region, ville)
+
+
+@receiver(pre_save, sender=Produit, dispatch_uid="catalogue_compteur_produit_pre_save")
+def memoriser_cle_compteur(sender, instance: Produit, raw: bool = False, **kwargs) -> None:
+    """Memorise la cle de compteur persistee avant la mise a jour."""
+    instance._cle_compteur_initiale = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    ancien = (
+        Produit.objects.filter(pk=instance.pk)
+        .values_list("statut", "categorie_id", "lieu_vente__region", "lieu_vente__ville")
+        .first()
+    )
+    if ancien is not None:
+        instance._cle_compteur_initiale = _cle_compteur(*ancien)
+
+
+@receiver(post_save, sender=Produit, dispatch_uid="catalogue_compteur_produit_post_save")
+def ajuster_compteur_apres_enregistrement(
+    sender, instance: Produit, raw: bool = False, **kwargs
+) -> None:
+    """Deplace le produit entre compteurs si sa cle a change."""
+    if raw:
+        return
+    ancienne_cle = getattr(instance, "_cle_compteur_initiale", None)
+    nouvelle_cle = _cle_compteur_produit(instance)
+    if ancienne_cle == nouvelle_cle:
+        return
+    if ancienne_cle is not None:
+        CompteurDisponibilite.ajuster(*ancienne_cle, delta=-1)
+    if nouvelle_cle is not None:
+        CompteurDisponibilite.ajuster(*nouvelle_cle, delta=1)
+
+
+@receiver(post_delete, sender=Produit, dispatch_uid="catalogue_compteur_produit_post_delete")
+def ajuster_compteur_apres_suppression(sender, instance: Produit, **kwargs) -> None:
+    """Retire le produit supprime de son compteur."""
+    cle = _cle_compteur_produit(instance)
+    if cle is not None:
+        CompteurDisponibilite.ajuster(*cle, delta=-1)
+
+
+@receiver(pre_save, sender=Localisation, dispatch_uid="catalogue_compteur_lieu_pre_save")
+def memoriser_lieu_initial(sender, instance: Localisation, raw: bool = False, **kwargs) -> None:
+    """Memorise region et ville avant la modification d'une localisation."""
+    instance._lieu_initial = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._lieu_initial = (
+        Localisation.objects.filter(pk=instance.pk).values_list("region", "ville").first()
+    )
+
+
+@receiver(post_save, sender=Localisation, dispatch_uid="catalogue_compteur_lieu_post_save")
+def deplacer_compteurs_lieu(sender, instance: Localisation, raw: bool = False, **kwargs) -> None:
+    """Reporte les produits d'une localisation renommee sur leurs nouveaux compteurs."""
+    lieu_initial = getattr(instance, "_lieu_initial", None)
+    if raw or lieu_initial is None or lieu_initial == (instance.region, instance.ville):
+        return
+    # Tous les produits du lieu changent de region ou de ville: rechargement complet.
+    EvenementCatalogue.enregistrer(None)
+    totaux = (
+        Produit.objects.filter(lieu_vente=instance, statut=Produit.StatutChoices.DISPONIBLE)
+        .values_list("categorie_id")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    with transaction.atomic():
+        for categorie_id, total in totaux:
+            CompteurDisponibilite.ajuster(categorie_id, *lieu_initial, delta=-total)
+            CompteurDisponibilite.ajuster(
+                categorie_id, instance.region, instance.ville, delta=total
+            )
+
+
+@receiver(post_save, sender=Produit, dispatch_uid="catalogue_recherche_produit_post_save")
+def indexer_produit(
+    sender, instance: Produit, raw: bool = False, update_fields=None, using: str = "default", **kwargs
+) -> None:
+    """Met a jour le document de recherche du produit enregistre."""
+    if raw or (update_fields is not None and not CHAMPS_INDEXES & set(update_fields)):
+        return
+    get_backend_recherche(using).indexer([instance])
+
+
+@receiver(post_delete, sender=Produit, dispatch_uid="catalogue_recherche_produit_post_delete")
+def desindexer_produit(sender, instance: Produit, using: str = "default", **kwargs) -> None:
+    """Retire le produit supprime de l'index de recherche."""
+    get_backend_recherche(using).supprimer([instance.pk])
+
+
+@receiver(post_save, sender=ImageProduit, dispatch_uid="catalogue_derivees_image_post_save")
+def generer_derivees_image(sender, instance: ImageProduit, raw: bool = False, **kwargs) -> None:
+    """Produit les derivees responsive d'une image nouvelle ou remplacee."""
+    if raw or not instance.image or instance.derivees.get("source") == instance.image.name:
+        return
+    anciennes = instance.derivees
+    # Un fichier deja reference (meme contenu) a deja ses derivees: aucune E/S.
+    instance.derivees = (
+        ImageProduit.objects.filter(image=instance.image.name, derivees__source=instance.image.name)
+        .exclude(pk=instance.pk)
+        .values_list("derivees", flat=True)
+        .first()
+    ) or generer_derivees(instance.image, default_storage)
+    # update() evite un second post_save (et une seconde invalidation des cartes).
+    ImageProduit.objects.filter(pk=instance.pk).update(derivees=instance.derivees)
+    if anciennes:
+        nouvelles = instance.derivees
+        transaction.on_commit(lambda: _supprimer_derivees_orphelines(anciennes, nouvelles))
+
+
+@receiver(post_delete, sender=ImageProduit, dispatch_uid="catalogue_derivees_image_post_delete")
+def supprimer_derivees_image(sender, instance: ImageProduit, **kwargs) -> None:
+    """Supprime les derivees d'une image retiree, une fois la suppression validee."""
+    if instance.derivees:
+        manifeste = instance.derivees
+        transaction.on_commit(lambda: _supprimer_derivees_orphelines(manifeste))
+
+
+def _supprimer_derivees_orphelines(manifeste: dict, conserver: dict | None = None) -> None:
+    """Supprime les derivees d'un fichier que plus aucune image ne reference."""
+    if ImageProduit.objects.filter(image=manifeste.get("source")).exists():
+        return
+    supprimer_derivees(manifeste, default_storage, conserver=conserver)
+
+
+def _champs_contenu(sender) -> list:
+    """Champs du modele servis par le stockage par contenu."""
+    return [champ for champ in champs_contenu() if champ.model is sender]
+
+
+def memoriser_fichiers_contenu(sender, instance, raw: bool = False, **kwargs) -> None:
+    """Memorise les fichiers references avant la mise a jour."""
+    instance._fichiers_contenu_initiaux = {}
+    champs = _champs_contenu(sender)
+    if raw or not champs or instance._state.adding or instance.pk is None:
+        return
+    valeurs = (
+        sender._default_manager.filter(pk=instance.pk)
+        .values_list(*[champ.attname for champ in champs])
+        .first()
+    )
+    if valeurs is not None:
+        instance._fichiers_contenu_initiaux = dict(zip([champ.attname for champ in champs], valeurs))
+
+
+def referencer_fichiers_contenu(sender, instance, raw: bool = False, **kwargs) -> None:
+    """Reporte les changements de fichier sur les compteurs de references."""
+    if raw:
+        return
+    initiaux = getattr(instance, "_fichiers_contenu_initiaux", {})
+    for champ in _champs_contenu(sender):
+        ancien = initiaux.get(champ.attname) or None
+        nouveau = getattr(instance, champ.attname).name or None
+        if ancien != nouveau:
+            FichierContenu.ajuster(nouveau, 1)
+            FichierContenu.ajuster(ancien, -1)
+
+
+def dereferencer_fichiers_contenu(sender, instance, **kwargs) -> None:
+    """Retire les references d'une ligne supprimee."""
+    for champ in _champs_contenu(sender):
+        FichierContenu.ajuster(getattr(instance, champ.attname).name or None, -1)
+
+
+MODELES_CONTENU = ("catalogue.ImageProduit", "profil.ProfilUtilisateur")
+
+for modele in MODELES_CONTENU:
+    pre_save.connect(
+        memoriser_fichiers_contenu, sender=modele, dispatch_uid=f"catalogue_contenu_{modele}_pre_save"
+    )
+    post_save.connect(
+        referencer_fichiers_contenu, sender=modele, dispatch_uid=f"catalogue_contenu_{modele}_save"
+    )
+    post_delete.connect(
+        dereferencer_fichiers_contenu, sender=modele, dispatch_uid=f"catalogue_contenu_{modele}_delete"
+    )
+
+
+@receiver(post_save, sender=ImageProduit, dispatch_uid="catalogue_version_images_post_save")
+@receiver(post_delete, sender=ImageProduit, dispatch_uid="catalogue_version_images_post_delete")
+def incrementer_version_images(sender, instance: ImageProduit, raw: bool = False, **kwargs) -> None:
+    """Change la version du jeu d'images du produit pour invalider ses fragments en cache."""
+    if raw:
+        return
+    Produit.objects.filter(pk=instance.produit_id).update(version_images=F("version_images") + 1)
+
+
+def incrementer_version_catalogue(sender, raw: bool = False, **kwargs) -> None:
+    """Invalide les ETags du catalogue apres toute ecriture qui s'y affiche."""
+    if not raw:
+        VersionCatalogue.incrementer()
+
+
+@receiver(post_save, sender=Localisation, dispatch_uid="catalogue_version_localisations_post_save")
+@receiver(post_delete, sender=Localisation, dispatch_uid="catalogue_version_localisations_post_delete")
+def incrementer_version_localisations(sender, raw: bool = False, **kwargs) -> None:
+    """Perime l'instantane de RegistreLocalisations dans tous les processus."""
+    if not raw:
+        VersionCatalogue.incrementer(VersionCatalogue.LOCALISATIONS)
+
+
+MODELES_CATALOGUE = (
+    "catalogue.Produit",
+    "catalogue.ProduitRetail",
+    "catalogue.ProduitAgricole",
+    "catalogue.ImageProduit",
+    "catalogue.Categorie",
+    "catalogue.Localisation",
+    "profil.ProfilUtilisateur",
+)
+
+for modele in MODELES_CATALOGUE:
+    post_save.connect(
+        incrementer_version_catalogue, sender=modele, dispatch_uid=f"catalogue_version_{modele}_save"
+    )
+    post_delete.connect(
+        incrementer_version_catalogue, sender=modele, dispatch_uid=f"catalogue_version_{modele}_delete"
+    )
+
+
+def journaliser_produit(sender, instance, raw: bool = False, **kwargs) -> None:
+    """Note le produit touche pour les moteurs de selection en memoire."""
+    if not raw:
+        EvenementCatalogue.enregistrer(instance.pk if sender is Produit else instance.produit_id)
+
+
+for modele in ("catalogue.Produit", "catalogue.ProduitRetail", "catalogue.ProduitAgricole"):
+    post_save.connect(journaliser_produit, sender=modele, dispatch_uid=f"catalogue_journal_{modele}_save")
+    post_delete.connect(journaliser_produit, sender=modele, dispatch_uid=f"catalogue_journal_{modele}_delete")
+
+
+def projeter_produit(sender, instance, raw: bool = False, **kwargs) -> None:
+    """Reporte le produit touche sur sa carte du modele de lecture."""
+    if not raw:
+        ProjectionCatalogue.rafraichir([instance.pk if sender is Produit else instance.produit_id])
+
+
+# Apres les recepteurs ci-dessus: derivees et version des images deja a jour.
+for modele in (
+    "catalogue.Produit",
+    "catalogue.ProduitRetail",
+    "catalogue.ProduitAgricole",
+    "catalogue.ImageProduit",
+):
+    post_save.connect(projeter_produit, sender=modele, dispatch_uid=f"catalogue_carte_{modele}_save")
+    post_delete.connect(projeter_produit, sender=modele, dispatch_uid=f"catalogue_carte_{modele}_delete")
+
+
+@receiver(post_save, sender=Categorie, dispatch_uid="catalogue_carte_categorie_post_save")
+def projeter_categorie(sender, instance: Categorie, raw: bool = False, created: bool = False, **kwargs) -> None:
+    """Categorie renommee ou deplacee: nom et chemin des cartes de son sous-arbre."""
+    if not raw and not created:
+        ProjectionCatalogue.rafraichir_categorie(instance.pk)
+
+
+@receiver(post_save, sender=Localisation, dispatch_uid="catalogue_carte_lieu_post_save")
+def projeter_lieu(sender, instance: Localisation, raw: bool = False, created: bool = False, **kwargs) -> None:
+    """Localisation modifiee: lieu affiche et filtre des cartes de ses produits."""
+    if not raw and not created:
+        ProjectionCatalogue.rafraichir_lieu(instance.pk)
+
+
+def _valeurs_carte_vendeur(profil) -> tuple:
+    """Champs du profil recopies sur les cartes de ses produits (None si differes)."""
+    return tuple(profil.__dict__.get(champ) for champ in ("type_vendeur", "note_moyenne", "total_avis"))
+
+
+@receiver(post_init, sender="profil.ProfilUtilisateur", dispatch_uid="catalogue_carte_profil_post_init")
+def memoriser_vendeur_initial(sender, instance, **kwargs) -> None:
+    """Memorise sans requete les champs recopies tels que charges."""
+    instance._carte_vendeur_initiale = _valeurs_carte_vendeur(instance)
+
+
+@receiver(post_save, sender="profil.ProfilUtilisateur", dispatch_uid="catalogue_carte_profil_post_save")
+@receiver(post_delete, sender="profil.ProfilUtilisateur", dispatch_uid="catalogue_carte_profil_post_delete")
+def projeter_vendeur(sender, instance, raw: bool = False, created: bool = False, **kwargs) -> None:
+    """Profil cree, supprime ou dont les champs recopies changent: cartes de ses produits."""
+    if raw:
+        return
+    valeurs = _valeurs_carte_vendeur(instance)
+    if kwargs["signal"] is post_delete:
+        ProjectionCatalogue.reporter_vendeur(instance.utilisateur_id, None)
+    elif created or valeurs != instance._carte_vendeur_initiale:
+        ProjectionCatalogue.reporter_vendeur(instance.utilisateur_id, instance)
+    instance._carte_vendeur_initiale = valeurs
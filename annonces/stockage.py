@@ -0,0 +1,108 @@
+"""Stockage adresse par contenu: un fichier par empreinte SHA-256, compte de references."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import posixpath
+from functools import cache as memoiser
+
+from django.apps import apps
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.utils.deconstruct import deconstructible
+
+TAILLE_BLOC = 64 * 1024
+OUVERTURE_EXCLUSIVE = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+
+
+def empreinte_contenu(contenu: File) -> tuple[str, int]:
+    """Calcule l'empreinte SHA-256 et la taille d'un fichier, puis le rembobine."""
+    condensat, taille = hashlib.sha256(), 0
+    if hasattr(contenu, "seek"):
+        contenu.seek(0)
+    for bloc in contenu.chunks(TAILLE_BLOC):
+        condensat.update(bloc)
+        taille += len(bloc)
+    if hasattr(contenu, "seek"):
+        contenu.seek(0)
+    return condensat.hexdigest(), taille
+
+
+@deconstructible
+class StockageContenu(FileSystemStorage):
+    """Range chaque fichier sous ``<dossier>/<aa>/<sha256><ext>``.
+
+    Deux televersements identiques aboutissent au meme chemin: le second
+    n'ecrit rien. Le nom passe par les validations de ``Storage.save``; le
+    fichier est cree en exclusivite, et le perdant d'une course entre deux
+    ecritures du meme contenu garde le fichier du gagnant. Chaque chemin
+    est enregistre dans ``FichierContenu``; les signaux du catalogue y
+    comptent les lignes qui le referencent et le fichier n'est supprime
+    qu'a la disparition de la derniere reference.
+    """
+
+    def save(self, name, content, max_length=None):
+        """Enregistre le contenu a son adresse, sans reecrire un fichier existant."""
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        empreinte, taille = empreinte_contenu(content)
+        dossier, extension = posixpath.dirname(str(name)), posixpath.splitext(str(name))[1].lower()
+        chemin = posixpath.join(dossier, empreinte[:2], f"{empreinte}{extension}")
+        chemin = super().save(chemin, content, max_length=max_length)
+        with transaction.atomic():
+            apps.get_model("catalogue", "FichierContenu").enregistrer(chemin, empreinte, taille)
+            # Une purge validee depuis la creation exclusive a pu retirer le fichier.
+            if not self.exists(chemin):
+                self._save(chemin, content)
+        return chemin
+
+    def get_available_name(self, name, max_length=None):
+        """Garde l'adresse de contenu: un fichier deja present sous ce nom est identique."""
+        if max_length is not None and len(name) > max_length:
+            raise SuspiciousFileOperation(
+                f"L'adresse de contenu {name!r} depasse {max_length} caracteres."
+            )
+        return name
+
+    def _save(self, name, content):
+        """Cree le fichier en exclusivite; s'il existe deja, retourne son adresse."""
+        chemin = self.path(name)
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        try:
+            descripteur = os.open(chemin, OUVERTURE_EXCLUSIVE, 0o666)
+        except FileExistsError:
+            return name
+        try:
+            self._ecrire(descripteur, content)
+        except BaseException:
+            os.remove(chemin)
+            raise
+        if self.file_permissions_mode is not None:
+            os.chmod(chemin, self.file_permissions_mode)
+        return name
+
+    @staticmethod
+    def _ecrire(descripteur: int, content: File) -> None:
+        """Copie le contenu par blocs dans le fichier ouvert, puis le ferme."""
+        with os.fdopen(descripteur, "wb") as fichier:
+            for bloc in content.chunks(TAILLE_BLOC):
+                fichier.write(bloc)
+
+
+@memoiser
+def champs_contenu() -> tuple[models.FileField, ...]:
+    """Champs fichier de tous les modeles servis par un ``StockageContenu``."""
+    return tuple(
+        champ
+        for modele in apps.get_models()
+        for champ in modele._meta.concrete_fields
+        if isinstance(champ, models.FileField) and isinstance(champ.storage, StockageContenu)
+    )
+
+
+stockage_contenu = StockageContenu()
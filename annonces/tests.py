@@ -1,10 +1,53 @@
 """Tests fonctionnels du service de navigation des annonces."""
 
+import base64
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from acceuil.services import CarteProduitService, CatalogueDonneesService
+from profil.models import AvisConfiance, ProfilUtilisateur
 
-from .models import Categorie, Localisation, Produit, ProduitAgricole, ProduitRetail
+from .bitmaps import MoteurBitmaps, depuis_positions, positions
+from .colonnes import MoteurColonnes, numpy_disponible
+from .facettes import FACETTES
+from .generateur import DATE_REFERENCE, GenerateurCatalogue
+from .localisations import RegistreLocalisations
+from .memoire import MoteurMemoire
+from .management.commands.bench_catalogue import centile, parse_taille
+from .models import (
+    CarteCatalogue,
+    Categorie,
+    CategorieFermeture,
+    CompteurDisponibilite,
+    EvenementCatalogue,
+    FichierContenu,
+    ImageProduit,
+    Localisation,
+    Produit,
+    ProduitAgricole,
+    ProduitRetail,
+    VersionCatalogue,
+)
+from .projection import ProjectionCatalogue
+from .recherche import BackendRecherche, RechercheFTS5, RecherchePostgres, RechercheSimple
 from .services import CatalogueService
+from .stockage import StockageContenu, stockage_contenu
 
 
 class TestFonctionnelCase(TestCase):
@@ -123,3 +166,1156 @@ class TestsServiceAnnonces(TestFonctionnelCase):
         )
         self.assertEqual(entree_retail["count"], 1)
 
+
+    def test_pagination_curseur_parcourt_toutes_les_pages(self):
+        """Pagination par curseur sans doublon ni omission."""
+        with mock.patch.object(CatalogueService, "TAILLE_PAGE", 1):
+            premiere_page = CatalogueService.get_catalogue_context({})
+            self.assertEqual(len(premiere_page["produits"]), 1)
+            self.assertTrue(premiere_page["curseur_suivant"])
+
+            seconde_page = CatalogueService.get_page_context(
+                {"curseur": premiere_page["curseur_suivant"]}
+            )
+        self.assertEqual(len(seconde_page["produits"]), 1)
+        self.assertEqual(seconde_page["curseur_suivant"], "")
+        titres = {premiere_page["produits"][0].titre, seconde_page["produits"][0].titre}
+        self.assertEqual(titres, {"Samsung A54", "Sacs de cacao"})
+
+    def test_pagination_curseur_invalide_retourne_premiere_page(self):
+        """Curseur invalide ignore."""
+        contexte = CatalogueService.get_page_context({"curseur": "pas-un-curseur"})
+        self.assertEqual(len(contexte["produits"]), 2)
+        self.assertEqual(contexte["curseur_suivant"], "")
+
+    def test_facettes_disjonctives_ignorent_leur_propre_filtre(self):
+        """Facettes disjonctives region et categorie."""
+        contexte = CatalogueService.get_catalogue_context(
+            {"region": Localisation.RegionChoices.LITTORAL}
+        )
+        facettes = contexte["facettes"]
+        self.assertEqual(facettes.total, 1)
+        self.assertEqual(
+            facettes.valeurs("region"),
+            {Localisation.RegionChoices.LITTORAL: 1, Localisation.RegionChoices.CENTRE: 1},
+        )
+        self.assertEqual(facettes.valeurs("ville"), {"Douala": 1})
+        self.assertEqual(facettes.valeurs("categorie"), {self.categorie_telephones.id: 1})
+        self.assertEqual(facettes.valeurs("etat"), {ProduitRetail.EtatChoices.NEUF: 1})
+        self.assertEqual(facettes.valeurs("region_origine"), {})
+
+    def test_facettes_options_conservent_selection_sans_resultat(self):
+        """Option selectionnee conservee meme sans resultat."""
+        contexte = CatalogueService.get_catalogue_context(
+            {"ville": "Garoua", "etat": ProduitRetail.EtatChoices.NEUF}
+        )
+        self.assertEqual(contexte["total_produits"], 0)
+        self.assertIn({"valeur": "Garoua", "total": 0}, contexte["villes"])
+        self.assertIn(
+            {"valeur": ProduitRetail.EtatChoices.NEUF, "total": 0}, contexte["etat_options"]
+        )
+
+
+class TestsArbreCategories(TestFonctionnelCase):
+    """Valide la maintenance de la table de fermeture des categories."""
+
+    def setUp(self):
+        """Preparation d'un arbre racine > telephones > smartphones."""
+        super().setUp()
+        self.retail = Categorie.objects.create(nom="Retail", slug="retail")
+        self.agricole = Categorie.objects.create(nom="Agricole", slug="agricole")
+        self.telephones = Categorie.objects.create(
+            nom="Telephones", slug="telephones", parent=self.retail
+        )
+        self.smartphones = Categorie.objects.create(
+            nom="Smartphones", slug="smartphones", parent=self.telephones
+        )
+
+    def test_creation_indexe_descendants_et_racine(self):
+        """Descendants et racine lus depuis la fermeture."""
+        self.assertEqual(
+            set(CatalogueService._get_descendant_ids(self.retail.id)),
+            {self.retail.id, self.telephones.id, self.smartphones.id},
+        )
+        self.assertEqual(CatalogueService._get_root_slug(self.smartphones), "retail")
+        self.assertEqual(
+            CatalogueService._get_ancestor_ids_by_slug("smartphones"),
+            {self.retail.id, self.telephones.id, self.smartphones.id},
+        )
+
+    def test_deplacement_rattache_sous_arbre(self):
+        """Deplacement d'un sous-arbre sous une autre racine."""
+        self.telephones.parent = self.agricole
+        self.telephones.save()
+        self.assertEqual(CatalogueService._get_root_slug(self.smartphones), "agricole")
+        self.assertEqual(CatalogueService._get_descendant_ids(self.retail.id), [self.retail.id])
+        lien = CategorieFermeture.objects.get(ancetre=self.agricole, descendant=self.smartphones)
+        self.assertEqual(lien.profondeur, 2)
+
+    def test_deplacement_sous_descendant_refuse(self):
+        """Cycle refuse lors d'un deplacement."""
+        self.retail.parent = self.smartphones
+        with self.assertRaises(ValidationError):
+            self.retail.save()
+
+    def test_suppression_nettoie_liens(self):
+        """Suppression en cascade des liens."""
+        self.telephones.delete()
+        self.assertFalse(
+            CategorieFermeture.objects.filter(descendant_id=self.smartphones.id).exists()
+        )
+        self.assertEqual(CategorieFermeture.objects.filter(ancetre=self.retail).count(), 1)
+
+    def test_reconstruction_equivalente_a_maintenance(self):
+        """Reconstruction complete identique a la maintenance incrementale."""
+        avant = set(CategorieFermeture.objects.values_list("ancetre", "descendant", "profondeur"))
+        CategorieFermeture.reconstruire()
+        apres = set(CategorieFermeture.objects.values_list("ancetre", "descendant", "profondeur"))
+        self.assertEqual(avant, apres)
+
+
+class TestsCompteursDisponibilite(TestFonctionnelCase):
+    """Valide la maintenance incrementale des compteurs de disponibilite."""
+
+    def setUp(self):
+        """Preparation d'un vendeur, de deux lieux et d'une categorie."""
+        super().setUp()
+        self.vendeur = User.objects.create_user(username="vendeur", password="StrongPass123!")
+        self.douala = Localisation.objects.create(
+            region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"
+        )
+        self.yaounde = Localisation.objects.create(
+            region=Localisation.RegionChoices.CENTRE, ville="Yaounde", quartier="Bastos"
+        )
+        self.categorie = Categorie.objects.create(nom="Telephones", slug="telephones")
+        self.produit = Produit.objects.create(
+            vendeur=self.vendeur,
+            categorie=self.categorie,
+            lieu_vente=self.douala,
+            titre="Tecno Spark",
+            prix=60000,
+        )
+
+    def _compteurs(self) -> dict[tuple[str, str], int]:
+        """Retourne les compteurs non nuls indexes par (region, ville)."""
+        return {
+            (compteur.region, compteur.ville): compteur.total
+            for compteur in CompteurDisponibilite.objects.filter(total__gt=0)
+        }
+
+    def test_creation_incremente_compteur(self):
+        """Creation d'un produit disponible."""
+        self.assertEqual(self._compteurs(), {("Littoral", "Douala"): 1})
+
+    def test_changement_statut_et_lieu(self):
+        """Changement de statut puis de lieu de vente."""
+        self.produit.statut = Produit.StatutChoices.VENDU
+        self.produit.save()
+        self.assertEqual(self._compteurs(), {})
+
+        self.produit.statut = Produit.StatutChoices.DISPONIBLE
+        self.produit.lieu_vente = self.yaounde
+        self.produit.save()
+        self.assertEqual(self._compteurs(), {("Centre", "Yaounde"): 1})
+
+    def test_suppression_decremente_compteur(self):
+        """Suppression d'un produit disponible."""
+        self.produit.delete()
+        self.assertEqual(self._compteurs(), {})
+
+    def test_commande_reconstruction(self):
+        """Reconstruction des compteurs par commande."""
+        CompteurDisponibilite.objects.all().delete()
+        call_command("rebuild_compteurs_disponibilite", stdout=StringIO())
+        self.assertEqual(self._compteurs(), {("Littoral", "Douala"): 1})
+
+    def test_sidebar_lit_les_compteurs(self):
+        """Comptes sidebar servis par les compteurs."""
+        contexte = CatalogueService.get_catalogue_context({"ville": "Douala"})
+        self.assertEqual(contexte["categories_sidebar"][0]["count"], 1)
+        contexte = CatalogueService.get_catalogue_context({"ville": "Yaounde"})
+        self.assertEqual(contexte["categories_sidebar"][0]["count"], 0)
+
+
+class TestsRecherchePleinTexte(TestFonctionnelCase):
+    """Valide la recherche plein texte et son index incremental."""
+
+    def setUp(self):
+        """Preparation de produits aux titres et descriptions distincts."""
+        super().setUp()
+        self.vendeur = User.objects.create_user(username="vendeur", password="StrongPass123!")
+        self.douala = Localisation.objects.create(
+            region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"
+        )
+        self.categorie = Categorie.objects.create(nom="Telephones", slug="telephones")
+        self.telephone = self._creer_produit("Telephone Tecno Camon", "Ecran large, etat neuf")
+        self.coque = self._creer_produit("Coque rigide", "Compatible telephone Tecno")
+        self._creer_produit("Sac de cafe", "Cafe arabica de l'Ouest")
+
+    def test_backends_implementent_la_condition(self):
+        """Le socle est abstrait; chaque backend fournit sa condition de recherche."""
+        with self.assertRaises(TypeError):
+            BackendRecherche()
+        for backend in (RechercheFTS5, RecherchePostgres, RechercheSimple):
+            self.assertFalse(backend.__abstractmethods__)
+
+    def _creer_produit(self, titre: str, description: str) -> Produit:
+        """Cree un produit disponible a Douala."""
+        return Produit.objects.create(
+            vendeur=self.vendeur,
+            categorie=self.categorie,
+            lieu_vente=self.douala,
+            titre=titre,
+            description=description,
+            prix=10000,
+        )
+
+    def _titres(self, params: dict[str, str]) -> list[str]:
+        """Retourne les titres de la premiere page pour les parametres donnes."""
+        return [produit.titre for produit in CatalogueService.get_catalogue_context(params)["produits"]]
+
+    def test_classement_par_pertinence(self):
+        """Classement titre avant description."""
+        self.assertEqual(self._titres({"q": "tecno"}), ["Telephone Tecno Camon", "Coque rigide"])
+        contexte = CatalogueService.get_catalogue_context({"q": "tecno"})
+        self.assertEqual(contexte["total_produits"], 2)
+        self.assertEqual(contexte["categories_sidebar"][0]["count"], 2)
+
+    def test_accents_prefixes_et_conjonction(self):
+        """Recherche insensible aux accents, par prefixe et tous termes requis."""
+        self.assertEqual(self._titres({"q": "Café"}), ["Sac de cafe"])
+        self.assertEqual(self._titres({"q": "tel cam"}), ["Telephone Tecno Camon"])
+        self.assertEqual(self._titres({"q": "\"*)"}), self._titres({}))
+
+    def test_index_suit_modification_et_suppression(self):
+        """Index mis a jour a l'enregistrement et a la suppression."""
+        self.coque.titre = "Chargeur rapide"
+        self.coque.description = ""
+        self.coque.save()
+        self.assertEqual(self._titres({"q": "tecno"}), ["Telephone Tecno Camon"])
+        self.assertEqual(self._titres({"q": "chargeur"}), ["Chargeur rapide"])
+
+        self.telephone.delete()
+        self.assertEqual(self._titres({"q": "tecno"}), [])
+
+    def test_pagination_par_pertinence(self):
+        """Pagination keyset sur le score de pertinence."""
+        for numero in range(4):
+            self._creer_produit(f"Tecno Pop {numero}", "")
+        with mock.patch.object(CatalogueService, "TAILLE_PAGE", 2):
+            titres, curseur = [], ""
+            while True:
+                contexte = CatalogueService.get_catalogue_context({"q": "tecno", "curseur": curseur})
+                titres += [produit.titre for produit in contexte["produits"]]
+                curseur = contexte["curseur_suivant"]
+                if not curseur:
+                    break
+        self.assertEqual(len(titres), 6)
+        self.assertEqual(len(set(titres)), 6)
+        self.assertEqual(titres[-1], "Coque rigide")
+
+    def test_commande_reconstruction(self):
+        """Reconstruction de l'index par commande."""
+        sortie = StringIO()
+        call_command("rebuild_index_recherche", stdout=sortie)
+        self.assertIn("3 produits reindexes", sortie.getvalue())
+        self.assertEqual(self._titres({"q": "arabica"}), ["Sac de cafe"])
+
+
+class TestsTriEtPrix(TestFonctionnelCase):
+    """Valide le filtre de prix et les modes de tri du catalogue."""
+
+    def setUp(self):
+        """Preparation de produits a prix distincts."""
+        super().setUp()
+        vendeur = User.objects.create_user(username="vendeur", password="StrongPass123!")
+        douala = Localisation.objects.create(
+            region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"
+        )
+        categorie = Categorie.objects.create(nom="Telephones", slug="telephones")
+        for titre, prix in (("A", 30000), ("B", 10000), ("C", 20000), ("D", 20000), ("E", 50000)):
+            Produit.objects.create(
+                vendeur=vendeur, categorie=categorie, lieu_vente=douala, titre=titre, prix=prix
+            )
+
+    def _parcourir(self, params: dict[str, str]) -> list[str]:
+        """Parcourt toutes les pages par curseur et retourne les titres."""
+        titres, curseur = [], ""
+        with mock.patch.object(CatalogueService, "TAILLE_PAGE", 2):
+            while True:
+                contexte = CatalogueService.get_catalogue_context({**params, "curseur": curseur})
+                titres += [produit.titre for produit in contexte["produits"]]
+                curseur = contexte["curseur_suivant"]
+                if not curseur:
+                    return titres
+
+    def test_modes_de_tri_pagines(self):
+        """Chaque mode de tri parcouru par curseur."""
+        self.assertEqual(self._parcourir({"tri": "prix_asc"}), ["B", "C", "D", "A", "E"])
+        self.assertEqual(self._parcourir({"tri": "prix_desc"}), ["E", "A", "D", "C", "B"])
+        self.assertEqual(self._parcourir({"tri": "ancien"}), ["A", "B", "C", "D", "E"])
+        self.assertEqual(self._parcourir({"tri": "recent"}), ["E", "D", "C", "B", "A"])
+
+    def test_filtre_prix(self):
+        """Bornes de prix inclusives et saisies invalides ignorees."""
+        contexte = CatalogueService.get_catalogue_context(
+            {"prix_min": "20000", "prix_max": "30 000", "tri": "prix_asc"}
+        )
+        self.assertEqual([produit.titre for produit in contexte["produits"]], ["C", "D", "A"])
+        self.assertEqual(contexte["total_produits"], 3)
+        self.assertEqual(contexte["categories_sidebar"][0]["count"], 3)
+
+        filtres = CatalogueService.parse_filtres({"prix_min": "abc", "prix_max": "-5", "tri": "x"})
+        self.assertEqual((filtres.prix_min, filtres.prix_max, filtres.tri), (None, None, "recent"))
+
+    def test_curseur_d_un_autre_tri_ignore(self):
+        """Curseur emis pour un autre tri."""
+        with mock.patch.object(CatalogueService, "TAILLE_PAGE", 2):
+            curseur = CatalogueService.get_catalogue_context({"tri": "prix_asc"})["curseur_suivant"]
+            contexte = CatalogueService.get_catalogue_context({"tri": "recent", "curseur": curseur})
+        self.assertEqual([produit.titre for produit in contexte["produits"]], ["E", "D"])
+
+    def test_curseur_non_fini_ignore(self):
+        """Curseur forge avec NaN ou Infinity: premiere page, sans erreur."""
+        for tri, valeur in [("prix_asc", "NaN"), ("prix_desc", "-Infinity"), ("pertinence", float("nan"))]:
+            with self.subTest(tri=tri, valeur=valeur):
+                brut = json.dumps([tri, valeur, 1]).encode("utf-8")
+                curseur = base64.urlsafe_b64encode(brut).decode("ascii").rstrip("=")
+                self.assertIsNone(CatalogueService.decoder_curseur(curseur, tri))
+        curseur = base64.urlsafe_b64encode(b'["prix_asc","NaN",1]').decode("ascii").rstrip("=")
+        response = self.client.get(reverse("acceuil:catalogue_filtrer"), {"tri": "prix_asc", "curseur": curseur})
+        self.assertEqual(response.status_code, 200)
+
+    def test_tri_prix_parcourt_l_index(self):
+        """Tri par prix servi par l'index composite."""
+        filtres = CatalogueService.parse_filtres({"tri": "prix_asc"})
+        plan = CatalogueService._filtrer_produits(filtres).explain()
+        self.assertIn("catalogue_prod_statut_prix_idx", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class TestsGenerateurCatalogue(TestFonctionnelCase):
+    """Valide le generateur synthetique et les utilitaires du banc de charge."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Isole les images factices dans un dossier media temporaire."""
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Supprime le dossier media temporaire."""
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def _instantane(self) -> list[tuple]:
+        """Retourne les champs significatifs des produits, dans l'ordre d'insertion."""
+        return list(
+            Produit.objects.order_by("id").values_list(
+                "titre", "prix", "statut", "categorie__slug", "lieu_vente__ville", "date_creation"
+            )
+        )
+
+    def test_generation_deterministe_et_incrementale(self):
+        """Meme graine, memes donnees; un agrandissement n'ajoute que le manque."""
+        generateur = GenerateurCatalogue(graine=7, taille_lot=4)
+        generateur.generer(produits=6, utilisateurs=3)
+        rapport = generateur.generer(produits=10, utilisateurs=3)
+        self.assertEqual((rapport.produits, rapport.produits_crees, rapport.utilisateurs), (10, 4, 3))
+        instantane = self._instantane()
+
+        Produit.objects.all().delete()
+        GenerateurCatalogue(graine=7, taille_lot=10).generer(produits=10, utilisateurs=3)
+        self.assertEqual(self._instantane(), instantane)
+        self.assertEqual(
+            ProduitRetail.objects.count() + ProduitAgricole.objects.count(), Produit.objects.count()
+        )
+
+    def test_derivees_reconstruites(self):
+        """Compteurs et index de recherche alimentes apres insertion groupee."""
+        GenerateurCatalogue(graine=3).generer(produits=25, utilisateurs=2)
+        disponibles = Produit.objects.filter(statut=Produit.StatutChoices.DISPONIBLE).count()
+        total_compteurs = sum(CompteurDisponibilite.objects.values_list("total", flat=True))
+        self.assertEqual(total_compteurs, disponibles)
+        titre = Produit.objects.filter(statut=Produit.StatutChoices.DISPONIBLE).first().titre
+        contexte = CatalogueService.get_catalogue_context({"q": titre})
+        self.assertIn(titre, [produit.titre for produit in contexte["produits"]])
+
+    def test_dates_historiques_sans_toucher_auto_now(self):
+        """Dates reportees apres insertion; auto_now reste actif pour les autres ecritures."""
+        GenerateurCatalogue(graine=5).generer(produits=12, utilisateurs=4)
+        self.assertFalse(Produit.objects.filter(date_creation__gt=DATE_REFERENCE).exists())
+        self.assertFalse(AvisConfiance.objects.filter(date_creation__gt=DATE_REFERENCE).exists())
+        self.assertGreater(
+            Produit.objects.filter(date_mise_a_jour__gt=F("date_creation")).count(), 0
+        )
+        self.assertTrue(Produit._meta.get_field("date_creation").auto_now_add)
+        self.assertTrue(Produit._meta.get_field("date_mise_a_jour").auto_now)
+        produit = Produit.objects.first()
+        produit.save()
+        produit.refresh_from_db()
+        self.assertGreater(produit.date_mise_a_jour, DATE_REFERENCE)
+
+    def test_produits_saisis_hors_comptage(self):
+        """Les produits deja saisis ne reduisent pas le volume genere."""
+        Produit.objects.create(
+            vendeur=User.objects.create_user(username="alice", password="StrongPass123!"),
+            categorie=Categorie.objects.create(nom="Montres", slug="montres"),
+            lieu_vente=Localisation.objects.create(
+                region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"
+            ),
+            titre="Montre",
+            prix=15000,
+        )
+        rapport = GenerateurCatalogue(graine=2).generer(produits=5, utilisateurs=2)
+        self.assertEqual((rapport.produits, rapport.produits_crees), (6, 5))
+        self.assertEqual(Produit.objects.filter(vendeur__username__startswith="gen2_").count(), 5)
+
+    def test_registre_et_version_apres_generation(self):
+        """Les localisations inserees sans signal sont vues par le registre."""
+        RegistreLocalisations.reinitialiser()
+        self.assertEqual(RegistreLocalisations.regions(), [])
+        version = VersionCatalogue.courante()
+        GenerateurCatalogue(graine=4).generer(produits=3, utilisateurs=2)
+        self.assertGreater(VersionCatalogue.courante(), version)
+        self.assertIn(Localisation.RegionChoices.LITTORAL, RegistreLocalisations.regions())
+        self.assertIn("Douala", RegistreLocalisations.villes(Localisation.RegionChoices.LITTORAL))
+
+    def test_commande_seed_mode_synthetique(self):
+        """--products/--users/--seed remplit profils, avis et images sans reseau."""
+        sortie = StringIO()
+        with mock.patch(
+            "annonces.management.commands.seed_demo_data.urlopen",
+            side_effect=AssertionError("aucun acces reseau attendu"),
+        ):
+            call_command("seed_demo_data", products=30, users=6, seed=11, batch_size=7, stdout=sortie)
+            avis = AvisConfiance.objects.count()
+            call_command("seed_demo_data", products=30, users=6, seed=11, stdout=StringIO())
+
+        self.assertIn("Generation synthetique terminee", sortie.getvalue())
+        self.assertEqual(Produit.objects.count(), 30)
+        self.assertEqual(User.objects.filter(username__startswith="gen11_").count(), 6)
+        self.assertEqual(
+            ProfilUtilisateur.objects.filter(utilisateur__username__startswith="gen11_").count(), 6
+        )
+        self.assertGreater(avis, 0)
+        self.assertEqual(AvisConfiance.objects.count(), avis)
+        self.assertFalse(AvisConfiance.objects.filter(auteur=F("cible")).exists())
+        self.assertTrue(ImageProduit.objects.exists())
+        self.assertEqual(
+            ImageProduit.objects.values("produit_id", "ordre").distinct().count(),
+            ImageProduit.objects.count(),
+        )
+
+    def test_utilitaires_du_banc(self):
+        """Tailles abregees et centiles par rang."""
+        self.assertEqual(
+            [parse_taille(valeur) for valeur in ("1k", "10K", "1M", "500")],
+            [1000, 10000, 1000000, 500],
+        )
+        valeurs = [float(valeur) for valeur in range(1, 101)]
+        self.assertEqual(
+            [centile(valeurs, rang) for rang in (50, 95, 99)], [50.0, 95.0, 99.0]
+        )
+
+
+class TestsDeriveesImages(TestFonctionnelCase):
+    """Valide la generation des derivees responsive des images produit."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Isole les fichiers generes dans un dossier media temporaire."""
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Supprime le dossier media temporaire."""
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        """Preparation d'un produit sans image."""
+        super().setUp()
+        self.produit = Produit.objects.create(
+            vendeur=User.objects.create_user(username="vendeur_images", password="StrongPass123!"),
+            categorie=Categorie.objects.create(nom="Telephones", slug="telephones"),
+            lieu_vente=Localisation.objects.create(
+                region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"
+            ),
+            titre="Tecno Spark",
+            prix=60000,
+        )
+
+    @staticmethod
+    def _fichier_jpeg(largeur: int, hauteur: int, nom: str = "photo.jpg") -> SimpleUploadedFile:
+        """Construit un JPEG en memoire."""
+        tampon = BytesIO()
+        Image.new("RGB", (largeur, hauteur), "#005a2f").save(tampon, format="JPEG")
+        return SimpleUploadedFile(nom, tampon.getvalue(), content_type="image/jpeg")
+
+    def _largeurs(self, image: ImageProduit, extension: str) -> list[int]:
+        """Largeurs declarees par le manifeste pour un format."""
+        return [largeur for largeur, _chemin in image.derivees["variantes"][extension]]
+
+    def test_derivees_generees_au_televersement(self):
+        """Chaque largeur existe en WebP et JPEG, a cote de l'original."""
+        image = ImageProduit.objects.create(produit=self.produit, image=self._fichier_jpeg(1500, 1000))
+        image.refresh_from_db()
+
+        self.assertEqual(image.derivees["source"], image.image.name)
+        self.assertEqual(self._largeurs(image, "webp"), [320, 640, 960, 1280])
+        self.assertEqual(self._largeurs(image, "jpeg"), [320, 640, 960, 1280])
+        largeur, chemin = image.derivees["variantes"]["webp"][0]
+        self.assertRegex(chemin, r"^catalogue/produits/[0-9a-f]{2}/derivees/[0-9a-f]{64}-320w\.webp$")
+        with Image.open(Path(self.media_root) / chemin) as derivee:
+            self.assertEqual((derivee.format, derivee.size), ("WEBP", (320, 213)))
+        self.assertIn("320w", image.srcset_webp)
+        self.assertIn("-640w.jpeg", image.url_affichage)
+
+    def test_original_jamais_agrandi_et_svg_ignore(self):
+        """Petite image limitee a sa largeur; SVG servi tel quel."""
+        petite = ImageProduit.objects.create(produit=self.produit, image=self._fichier_jpeg(400, 300))
+        svg = ImageProduit.objects.create(
+            produit=self.produit,
+            image=SimpleUploadedFile("logo.svg", b"<svg xmlns='http://www.w3.org/2000/svg'/>"),
+        )
+        self.assertEqual(self._largeurs(petite, "jpeg"), [320, 400])
+        self.assertEqual(svg.derivees["variantes"], {})
+        self.assertEqual(svg.srcset_webp, "")
+        self.assertEqual(svg.url_affichage, svg.image.url)
+
+    def test_suppression_et_regeneration(self):
+        """Derivees retirees avec l'image; la commande regenere les manifestes."""
+        image = ImageProduit.objects.create(produit=self.produit, image=self._fichier_jpeg(700, 500))
+        chemins = [Path(self.media_root) / chemin for _l, chemin in image.derivees["variantes"]["jpeg"]]
+        ImageProduit.objects.filter(pk=image.pk).update(derivees={})
+        version = Produit.objects.get(pk=self.produit.pk).version_images
+
+        call_command("generer_derivees_images", stdout=StringIO())
+        image.refresh_from_db()
+        self.assertEqual(self._largeurs(image, "jpeg"), [320, 640, 700])
+        self.assertGreater(Produit.objects.get(pk=self.produit.pk).version_images, version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertFalse(any(chemin.exists() for chemin in chemins))
+
+    def test_srcset_dans_la_carte_catalogue(self):
+        """La carte du catalogue propose WebP et JPEG avec sizes."""
+        ImageProduit.objects.create(produit=self.produit, image=self._fichier_jpeg(1200, 900))
+        response = self.client.get(reverse("acceuil:accueil"))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, "-960w.webp 960w")
+        self.assertContains(response, 'sizes="(min-width: 1400px) 20vw')
+
+
+class TestsStockageContenu(TestFonctionnelCase):
+    """Valide le stockage deduplique par SHA-256 et ses compteurs de references."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Isole les fichiers dans un dossier media temporaire."""
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        """Supprime le dossier media temporaire."""
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        """Preparation de deux produits d'un meme vendeur."""
+        super().setUp()
+        self.vendeur = User.objects.create_user(username="vendeur_pro", password="StrongPass123!")
+        categorie = Categorie.objects.create(nom="Telephones", slug="telephones")
+        lieu = Localisation.objects.create(
+            region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"
+        )
+        self.produits = [
+            Produit.objects.create(
+                vendeur=self.vendeur, categorie=categorie, lieu_vente=lieu, titre=titre, prix=60000
+            )
+            for titre in ("Tecno Spark", "Tecno Camon")
+        ]
+
+    @staticmethod
+    def _photo(couleur: str = "#005a2f", nom: str = "photo.jpg") -> SimpleUploadedFile:
+        """Construit un JPEG en memoire."""
+        tampon = BytesIO()
+        Image.new("RGB", (500, 400), couleur).save(tampon, format="JPEG")
+        return SimpleUploadedFile(nom, tampon.getvalue(), content_type="image/jpeg")
+
+    def test_meme_contenu_stocke_une_fois(self):
+        """Deuxieme televersement identique: meme chemin, ni ecriture ni nouvelles derivees."""
+        premiere = ImageProduit.objects.create(produit=self.produits[0], image=self._photo(nom="a.jpg"))
+        with mock.patch.object(StockageContenu, "_ecrire") as ecriture, mock.patch(
+            "annonces.signals.generer_derivees"
+        ) as derivees:
+            seconde = ImageProduit.objects.create(produit=self.produits[1], image=self._photo(nom="b.jpg"))
+        ecriture.assert_not_called()
+        derivees.assert_not_called()
+
+        self.assertEqual(premiere.image.name, seconde.image.name)
+        self.assertRegex(premiere.image.name, r"^catalogue/produits/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$")
+        self.assertEqual(seconde.derivees, premiere.derivees)
+        self.assertEqual(FichierContenu.objects.get(chemin=premiere.image.name).references, 2)
+
+    def test_nom_valide_par_storage_save(self):
+        """Chemin hors du stockage et adresse trop longue refuses avant toute ecriture."""
+        stockage = StockageContenu()
+        with mock.patch.object(StockageContenu, "_ecrire") as ecriture:
+            with self.assertRaises(SuspiciousFileOperation):
+                stockage.save("../hors/photo.jpg", ContentFile(b"contenu"))
+            with self.assertRaises(SuspiciousFileOperation):
+                stockage.save("catalogue/produits/photo.jpg", ContentFile(b"contenu"), max_length=40)
+        ecriture.assert_not_called()
+
+    def test_fichier_cree_entre_temps_conserve(self):
+        """Creation exclusive perdue: l'adresse du fichier deja ecrit est retournee sans reecriture."""
+        stockage = StockageContenu()
+        chemin = stockage.save("catalogue/produits/a.jpg", ContentFile(b"contenu"))
+        FichierContenu.objects.all().delete()
+        with mock.patch.object(StockageContenu, "_ecrire") as ecriture:
+            self.assertEqual(stockage.save("catalogue/produits/b.jpg", ContentFile(b"contenu")), chemin)
+        ecriture.assert_not_called()
+        self.assertEqual((Path(self.media_root) / chemin).read_bytes(), b"contenu")
+        self.assertTrue(FichierContenu.objects.filter(chemin=chemin).exists())
+
+    def test_televersement_pendant_la_purge_de_la_derniere_reference(self):
+        """Contenu identique televerse pendant que sa derniere reference disparait."""
+        premiere = ImageProduit.objects.create(produit=self.produits[0], image=self._photo(nom="a.jpg"))
+        chemin = premiere.image.name
+        fichier = Path(self.media_root) / chemin
+
+        # Purge apres la reservation du televersement: le fichier est epargne.
+        nom = stockage_contenu.save("catalogue/produits/b.jpg", self._photo())
+        with self.captureOnCommitCallbacks(execute=True):
+            premiere.delete()
+        self.assertEqual(nom, chemin)
+        self.assertTrue(fichier.exists())
+        seconde = ImageProduit.objects.create(produit=self.produits[1], image=nom)
+        self.assertEqual(FichierContenu.objects.get(chemin=chemin).references, 1)
+
+        # Purge validee entre la creation exclusive et la reservation: le fichier est reecrit.
+        with self.captureOnCommitCallbacks(execute=True):
+            seconde.delete()
+        self.assertFalse(fichier.exists())
+        FichierContenu.enregistrer(chemin, "0" * 64, 1)
+        ecriture_exclusive = StockageContenu._save
+        ecritures = []
+
+        def purge_concurrente(stockage, name, content):
+            resultat = ecriture_exclusive(stockage, name, content)
+            ecritures.append(name)
+            if len(ecritures) == 1:
+                FichierContenu.objects.filter(chemin=name).update(reserve_le=None)
+                FichierContenu.purger([name])
+            return resultat
+
+        with mock.patch.object(StockageContenu, "_save", autospec=True, side_effect=purge_concurrente):
+            nom = stockage_contenu.save("catalogue/produits/c.jpg", self._photo())
+        self.assertEqual(ecritures, [chemin, chemin])
+        self.assertTrue(fichier.exists())
+        ImageProduit.objects.create(produit=self.produits[0], image=nom)
+        self.assertEqual(FichierContenu.objects.get(chemin=chemin).references, 1)
+
+    def test_reference_recree_si_ligne_absente(self):
+        """Une reference comptee sur une ligne disparue recree la ligne."""
+        FichierContenu.ajuster("catalogue/produits/ab/" + "ab" * 32 + ".jpg", 1)
+        fichier = FichierContenu.objects.get()
+        self.assertEqual((fichier.empreinte, fichier.references), ("ab" * 32, 1))
+
+    def test_fichier_supprime_avec_la_derniere_reference(self):
+        """Le fichier et ses derivees survivent tant qu'une ligne les reference."""
+        images = [
+            ImageProduit.objects.create(produit=produit, image=self._photo()) for produit in self.produits
+        ]
+        fichier = Path(self.media_root) / images[0].image.name
+        derivee = Path(self.media_root) / images[0].derivees["variantes"]["webp"][0][1]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            images[0].delete()
+        self.assertTrue(fichier.exists() and derivee.exists())
+        self.assertEqual(FichierContenu.objects.get().references, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            images[1].delete()
+        self.assertFalse(fichier.exists() or derivee.exists())
+        self.assertFalse(FichierContenu.objects.exists())
+
+    def test_photo_profil_remplacee(self):
+        """L'ancienne photo de profil est liberee a son remplacement."""
+        profil = ProfilUtilisateur.objects.create(utilisateur=self.vendeur, photo_profil=self._photo())
+        ancienne = profil.photo_profil.name
+        self.assertTrue(ancienne.startswith("profil/photos/"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profil.photo_profil = self._photo(couleur="#ef4444")
+            profil.save()
+        self.assertFalse((Path(self.media_root) / ancienne).exists())
+        self.assertEqual(
+            list(FichierContenu.objects.values_list("chemin", "references")),
+            [(profil.photo_profil.name, 1)],
+        )
+
+    def test_reseed_sans_entree_sortie(self):
+        """Relancer seed_demo_data ne reecrit aucun fichier ni aucune ligne image."""
+        tampon = BytesIO()
+        Image.new("RGB", (64, 48), "#0ea5e9").save(tampon, format="JPEG")
+        with mock.patch(
+            "annonces.management.commands.seed_demo_data.Command._download_or_placeholder",
+            return_value=(tampon.getvalue(), "jpg"),
+        ):
+            call_command("seed_demo_data", stdout=StringIO())
+            images = list(ImageProduit.objects.order_by("id").values_list("id", "image"))
+            with mock.patch.object(StockageContenu, "_ecrire") as ecriture:
+                call_command("seed_demo_data", stdout=StringIO())
+        ecriture.assert_not_called()
+        self.assertEqual(list(ImageProduit.objects.order_by("id").values_list("id", "image")), images)
+        self.assertEqual(FichierContenu.objects.get().references, len(images))
+
+
+class TestsRegistreLocalisations(TestFonctionnelCase):
+    """Valide le registre en memoire des localisations."""
+
+    def setUp(self):
+        """Preparation de trois localisations sur deux regions."""
+        super().setUp()
+        RegistreLocalisations.reinitialiser()
+        self.akwa = Localisation.objects.create(
+            region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"
+        )
+        self.bonanjo = Localisation.objects.create(
+            region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Bonanjo"
+        )
+        self.bastos = Localisation.objects.create(
+            region=Localisation.RegionChoices.CENTRE, ville="Yaounde", quartier="Bastos"
+        )
+
+    @override_settings(CACHE_PARTAGE=True)
+    def test_arbre_et_lectures_sans_requete(self):
+        """Arbre, villes et identifiants servis depuis la memoire apres un chargement."""
+        self.assertEqual(
+            RegistreLocalisations.arbre(),
+            {"Centre": {"Yaounde": ["Bastos"]}, "Littoral": {"Douala": ["Akwa", "Bonanjo"]}},
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(RegistreLocalisations.regions(), ["Centre", "Littoral"])
+            self.assertEqual(RegistreLocalisations.villes("Littoral"), ["Douala"])
+            self.assertEqual(RegistreLocalisations.villes(), ["Douala", "Yaounde"])
+            self.assertEqual(
+                RegistreLocalisations.identifiant("Littoral", "Douala", "Akwa"), self.akwa.pk
+            )
+            self.assertEqual(
+                RegistreLocalisations.lieu(self.bastos.pk), ("Centre", "Yaounde", "Bastos")
+            )
+            self.assertEqual(RegistreLocalisations.interner("Littoral", "Douala", "Bonanjo"), self.bonanjo.pk)
+
+    @override_settings(CACHE_PARTAGE=True)
+    def test_interner_cree_puis_invalide(self):
+        """Un lieu inconnu est cree une fois et l'instantane est recharge."""
+        empreinte = RegistreLocalisations.empreinte()
+        with self.captureOnCommitCallbacks(execute=True):
+            localisation_id = RegistreLocalisations.interner("Ouest", "Dschang", "Foto")
+
+        self.assertEqual(Localisation.objects.get(pk=localisation_id).ville, "Dschang")
+        self.assertEqual(RegistreLocalisations.villes("Ouest"), ["Dschang"])
+        self.assertNotEqual(RegistreLocalisations.empreinte(), empreinte)
+        with self.assertNumQueries(0):
+            self.assertEqual(RegistreLocalisations.interner("Ouest", "Dschang", "Foto"), localisation_id)
+
+    def test_suppression_et_ecriture_sans_signal(self):
+        """Suppression et ecriture groupee invalidee perimant l'instantane du processus."""
+        RegistreLocalisations.instantane()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bastos.delete()
+        self.assertEqual(RegistreLocalisations.regions(), ["Littoral"])
+
+        Localisation.objects.filter(pk=self.bonanjo.pk).update(quartier="Bali")
+        with self.captureOnCommitCallbacks(execute=True):
+            RegistreLocalisations.invalider()
+        self.assertEqual(RegistreLocalisations.arbre()["Littoral"]["Douala"], ["Akwa", "Bali"])
+
+    def test_version_relue_en_base(self):
+        """Sans cache partage, une ecriture d'un autre processus est vue a la lecture suivante."""
+        self.assertEqual(RegistreLocalisations.identifiant("Centre", "Yaounde", "Bastos"), self.bastos.pk)
+        # Autre processus: la ligne et la version changent en base, rien en cache.
+        Localisation.objects.filter(pk=self.bastos.pk).update(quartier="Mvan")
+        VersionCatalogue.objects.update_or_create(
+            pk=VersionCatalogue.LOCALISATIONS,
+            defaults={"valeur": VersionCatalogue.courante(VersionCatalogue.LOCALISATIONS) + 1},
+        )
+        with self.assertNumQueries(2):
+            self.assertIsNone(RegistreLocalisations.identifiant("Centre", "Yaounde", "Bastos"))
+        with self.assertNumQueries(1):
+            self.assertEqual(RegistreLocalisations.lieu(self.bastos.pk), ("Centre", "Yaounde", "Mvan"))
+
+    def test_instantane_garde_apres_ecriture_hors_localisations(self):
+        """Une ecriture du catalogue sans localisation ne recharge pas l'instantane."""
+        instantane = RegistreLocalisations.instantane()
+        with self.captureOnCommitCallbacks(execute=True):
+            VersionCatalogue.incrementer()
+        with self.assertNumQueries(1):
+            self.assertIs(RegistreLocalisations.instantane(), instantane)
+
+    def test_export_json_stable(self):
+        """Export JSON compact, trie et d'empreinte stable a contenu egal."""
+        contenu = RegistreLocalisations.contenu_json()
+        self.assertEqual(json.loads(contenu), RegistreLocalisations.arbre())
+        self.assertNotIn(b" ", contenu)
+        empreinte = RegistreLocalisations.empreinte()
+
+        RegistreLocalisations.reinitialiser()
+        self.assertEqual(RegistreLocalisations.empreinte(), empreinte)
+
+
+class VerificationsMoteurMemoire:
+    """Verifications communes d'un moteur en memoire contre le moteur SQL."""
+
+    moteur = None
+    nom = ""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Catalogue synthetique partage, sans images."""
+        GenerateurCatalogue(graine=3, taille_lot=100).generer(produits=160, utilisateurs=6, avec_images=False)
+
+    def setUp(self):
+        """Version du catalogue relue en base et instantane vide."""
+        super().setUp()
+        cache.clear()
+        self.moteur.reinitialiser()
+        self.addCleanup(self.moteur.reinitialiser)
+        self.memoire = override_settings(CATALOGUE_MOTEUR=self.nom)
+
+    def test_interface_complete(self):
+        """Le moteur implemente toutes les methodes abstraites du socle."""
+        self.assertEqual(
+            MoteurMemoire.__abstractmethods__,
+            {"selectionner", "facettes", "_construire", "_appliquer"},
+        )
+        self.assertFalse(self.moteur.__abstractmethods__)
+
+    def _catalogue(self, params: dict, moteur: str) -> tuple:
+        """Ids de la page, curseur et facettes du catalogue calcule par un moteur."""
+        with override_settings(CATALOGUE_MOTEUR=moteur):
+            contexte = CatalogueService.get_catalogue_context(params)
+        facettes = contexte["facettes"]
+        return (
+            [produit.id for produit in contexte["produits"]],
+            contexte["curseur_suivant"],
+            facettes.total,
+            {facette: facettes.valeurs(facette) for facette in FACETTES},
+        )
+
+    def _parcourir(self, params: dict, moteur: str) -> list[int]:
+        """Ids de toutes les pages, en suivant les curseurs."""
+        ids, curseur = [], ""
+        with override_settings(CATALOGUE_MOTEUR=moteur):
+            while True:
+                contexte = CatalogueService.get_page_context({**params, "curseur": curseur})
+                ids += [produit.id for produit in contexte["produits"]]
+                curseur = contexte["curseur_suivant"]
+                if not curseur:
+                    return ids
+
+    def _combinaisons(self) -> list[dict]:
+        """Filtres representatifs tires du jeu genere."""
+        produit = Produit.objects.select_related("lieu_vente").filter(produit_retail__isnull=False).first()
+        agricole = ProduitAgricole.objects.first()
+        racine = Categorie.objects.filter(parent=None).first()
+        return [
+            {},
+            {"region": produit.lieu_vente.region},
+            {"region": produit.lieu_vente.region, "ville": produit.lieu_vente.ville, "tri": "ancien"},
+            {"categorie": racine.slug, "etat": ProduitRetail.EtatChoices.OCCASION},
+            {"categorie": produit.categorie.slug, "tri": "prix_desc"},
+            {"region_origine": agricole.region_origine, "tri": "prix_asc"},
+            {"prix_min": "5000", "prix_max": "80000,5", "tri": "prix_asc"},
+            {"ville": "Inconnue"},
+            {"categorie": "inconnue"},
+        ]
+
+    def test_resultats_identiques_au_sql(self):
+        """Pages, curseurs, totaux et facettes identiques au moteur SQL."""
+        for params in self._combinaisons():
+            with self.subTest(params=params):
+                self.assertEqual(self._catalogue(params, self.nom), self._catalogue(params, "sql"))
+
+    def test_defilement_complet_identique(self):
+        """Le parcours par curseur enumere les memes produits dans le meme ordre."""
+        for params in [{"tri": "prix_asc"}, {"tri": "recent"}, {"tri": "prix_desc", "region": "Littoral"}]:
+            with self.subTest(params=params):
+                ids = self._parcourir(params, self.nom)
+                self.assertEqual(ids, self._parcourir(params, "sql"))
+                self.assertEqual(len(ids), len(set(ids)))
+
+    @override_settings(CACHE_PARTAGE=True)
+    def test_page_chargee_par_ids(self):
+        """Une fois l'instantane charge, seule la page visible est lue en base."""
+        with self.memoire:
+            CatalogueService.get_page_context({})
+            with self.assertNumQueries(1):
+                contexte = CatalogueService.get_page_context({"tri": "prix_asc"})
+        self.assertEqual(len(contexte["produits"]), CatalogueService.TAILLE_PAGE)
+
+    def test_mise_a_jour_incrementale(self):
+        """Les produits modifies sont relus depuis le journal, sans rechargement complet."""
+        with self.memoire:
+            CatalogueService.get_catalogue_context({})
+            vendu, reduit = Produit.objects.filter(statut=Produit.StatutChoices.DISPONIBLE)[:2]
+            EvenementCatalogue.objects.all().delete()
+            with self.captureOnCommitCallbacks(execute=True):
+                vendu.statut = Produit.StatutChoices.VENDU
+                vendu.save()
+                reduit.prix = 1
+                reduit.save()
+            self.assertEqual(EvenementCatalogue.objects.count(), 2)
+
+            with mock.patch.object(self.moteur, "_charger", wraps=self.moteur._charger) as charger:
+                resultat = self._catalogue({"tri": "prix_asc"}, self.nom)
+            charger.assert_not_called()
+        self.assertEqual(resultat[0][0], reduit.id)
+        self.assertNotIn(vendu.id, self._parcourir({}, self.nom))
+        self.assertEqual(resultat, self._catalogue({"tri": "prix_asc"}, "sql"))
+
+    def test_lieu_renomme_recharge_tout(self):
+        """Une localisation renommee impose un rechargement complet."""
+        with self.memoire:
+            CatalogueService.get_catalogue_context({})
+            lieu = Localisation.objects.filter(produits__statut=Produit.StatutChoices.DISPONIBLE).first()
+            with self.captureOnCommitCallbacks(execute=True):
+                lieu.ville = "Nouvelle-Ville"
+                lieu.save()
+
+            with mock.patch.object(self.moteur, "_charger", wraps=self.moteur._charger) as charger:
+                resultat = self._catalogue({"ville": "Nouvelle-Ville"}, self.nom)
+            charger.assert_called_once()
+        self.assertEqual(resultat, self._catalogue({"ville": "Nouvelle-Ville"}, "sql"))
+        self.assertTrue(resultat[0])
+
+    def test_recherche_reste_en_sql(self):
+        """La recherche plein texte ne passe pas par l'instantane."""
+        with self.memoire, mock.patch.object(self.moteur, "instantane") as instantane:
+            CatalogueService.get_catalogue_context({"q": "tomate"})
+        instantane.assert_not_called()
+
+    def test_journal_inactif_et_purge(self):
+        """Sans moteur en memoire rien n'est journalise; la purge retire les vieux evenements."""
+        produit = Produit.objects.first()
+        EvenementCatalogue.objects.all().delete()
+        with override_settings(CATALOGUE_MOTEUR="sql"):
+            produit.save()
+        self.assertFalse(EvenementCatalogue.objects.exists())
+
+        with self.memoire:
+            produit.save()
+        EvenementCatalogue.objects.update(date=F("date") - timedelta(days=2))
+        with self.memoire:
+            produit.save()
+        call_command("purger_evenements_catalogue", stdout=StringIO())
+        self.assertEqual(EvenementCatalogue.objects.count(), 1)
+
+
+@skipUnless(numpy_disponible(), "numpy n'est pas installe")
+class TestsMoteurColonnes(VerificationsMoteurMemoire, TestFonctionnelCase):
+    """Valide le moteur en colonnes contre le moteur SQL."""
+
+    moteur = MoteurColonnes
+    nom = "colonnes"
+
+
+class TestsMoteurBitmaps(VerificationsMoteurMemoire, TestFonctionnelCase):
+    """Valide l'index bitmap contre le moteur SQL."""
+
+    moteur = MoteurBitmaps
+    nom = "bitmaps"
+
+    def test_bitsets_et_positions(self):
+        """Les rangs des bits survivent a l'aller-retour par un bitset."""
+        rangs = [0, 3, 64, 65, 200]
+        bitset = depuis_positions(rangs, 201)
+        self.assertEqual(positions(bitset), rangs)
+        self.assertEqual(bitset.bit_count(), len(rangs))
+        self.assertEqual(positions(0), [])
+
+    def test_parcours_des_prix_par_bits(self):
+        """Au-dela du seuil de tri, la page par prix parcourt l'ordre des prix."""
+        with mock.patch.object(MoteurBitmaps, "SEUIL_TRI", 0):
+            for params in [{"tri": "prix_asc"}, {"tri": "prix_desc", "categorie": Categorie.objects.first().slug}]:
+                with self.subTest(params=params):
+                    self.assertEqual(self._parcourir(params, "bitmaps"), self._parcourir(params, "sql"))
+
+    def test_combinaisons_memorisees(self):
+        """Les memes filtres reutilisent les bitsets combines de l'instantane."""
+        produit = Produit.objects.select_related("lieu_vente").first()
+        params = {"region": produit.lieu_vente.region, "categorie": Categorie.objects.first().slug}
+        with self.memoire:
+            CatalogueService.get_catalogue_context(params)
+            with mock.patch.object(MoteurBitmaps, "_intervalle_prix") as intervalle:
+                CatalogueService.get_catalogue_context(params)
+                CatalogueService.get_page_context(params)
+        intervalle.assert_not_called()
+
+    def test_produit_remis_en_vente_recharge_tout(self):
+        """Un produit ancien redevenu disponible ne peut pas etre ajoute en fin de lignes."""
+        ancien = Produit.objects.order_by("date_creation", "id").first()
+        with self.captureOnCommitCallbacks(execute=True):
+            ancien.statut = Produit.StatutChoices.VENDU
+            ancien.save()
+        with self.memoire:
+            CatalogueService.get_catalogue_context({})
+            with self.captureOnCommitCallbacks(execute=True):
+                ancien.statut = Produit.StatutChoices.DISPONIBLE
+                ancien.save()
+
+            with mock.patch.object(MoteurBitmaps, "_charger", wraps=MoteurBitmaps._charger) as charger:
+                resultat = self._catalogue({"tri": "ancien"}, "bitmaps")
+            charger.assert_called_once()
+        self.assertEqual(resultat[0][0], ancien.id)
+        self.assertEqual(resultat, self._catalogue({"tri": "ancien"}, "sql"))
+
+
+@override_settings(CATALOGUE_MOTEUR="cartes")
+class TestsModeleLecture(TestFonctionnelCase):
+    """Valide le modele de lecture CarteCatalogue contre le moteur SQL."""
+
+    @classmethod
+    def setUpTestData(cls):
+        """Catalogue synthetique partage et cartes reconstruites."""
+        GenerateurCatalogue(graine=3, taille_lot=100).generer(produits=160, utilisateurs=6, avec_images=False)
+        ProjectionCatalogue.reconstruire()
+
+    def setUp(self):
+        """Caches vides entre les moteurs compares."""
+        super().setUp()
+        cache.clear()
+
+    _catalogue = VerificationsMoteurMemoire._catalogue
+    _parcourir = VerificationsMoteurMemoire._parcourir
+    _combinaisons = VerificationsMoteurMemoire._combinaisons
+
+    def _cartes(self) -> list[tuple]:
+        """Contenu de la table des cartes, hors dates."""
+        return list(
+            CarteCatalogue.objects.order_by("id").values_list(
+                "id", "titre", "prix", "chemin_categorie", "ville", "type_vendeur", "total_avis", "etat", "images"
+            )
+        )
+
+    def test_resultats_identiques_au_sql(self):
+        """Pages, curseurs, totaux et facettes identiques au moteur SQL."""
+        for params in self._combinaisons():
+            with self.subTest(params=params):
+                self.assertEqual(self._catalogue(params, "cartes"), self._catalogue(params, "sql"))
+
+    def test_defilement_complet_identique(self):
+        """Le parcours par curseur enumere les memes produits dans le meme ordre."""
+        for params in [{"tri": "prix_asc"}, {"tri": "recent"}, {"tri": "prix_desc", "region": "Littoral"}]:
+            with self.subTest(params=params):
+                ids = self._parcourir(params, "cartes")
+                self.assertEqual(ids, self._parcourir(params, "sql"))
+                self.assertEqual(len(ids), len(set(ids)))
+
+    def test_page_lue_sur_une_table(self):
+        """La page et le rendu des cartes tiennent en une requete sur les cartes."""
+        with self.assertNumQueries(1) as requetes:
+            contexte = CatalogueService.get_page_context({"tri": "prix_asc"})
+            produits = contexte["produits"]
+            CarteProduitService.rendre_cartes(produits)
+            CatalogueDonneesService.construire(contexte, {}, avec_facettes=False)
+        self.assertIn(CarteCatalogue._meta.db_table, requetes.captured_queries[0]["sql"])
+        self.assertNotIn("JOIN", requetes.captured_queries[0]["sql"])
+        self.assertEqual(len(produits), CatalogueService.TAILLE_PAGE)
+        produit = produits[0]
+        self.assertEqual(produit.categorie.nom, Produit.objects.get(pk=produit.pk).categorie.nom)
+
+    def test_mise_a_jour_dans_la_transaction(self):
+        """Vente, prix, image et reputation sont reportes sur les cartes."""
+        vendu, reduit = Produit.objects.filter(statut=Produit.StatutChoices.DISPONIBLE)[:2]
+        vendu.statut = Produit.StatutChoices.VENDU
+        vendu.save()
+        reduit.prix = 1
+        reduit.save()
+        self.assertFalse(CarteCatalogue.objects.filter(pk=vendu.pk).exists())
+        self.assertEqual(CarteCatalogue.objects.get(pk=reduit.pk).prix, 1)
+
+        ImageProduit.objects.create(produit=reduit, image="produits/test.jpg", ordre=99)
+        self.assertEqual(CarteCatalogue.objects.get(pk=reduit.pk).images[-1][0], "/media/produits/test.jpg")
+
+        auteur = User.objects.exclude(pk=reduit.vendeur_id).first()
+        AvisConfiance.objects.filter(auteur=auteur, cible=reduit.vendeur).delete()
+        AvisConfiance.objects.create(auteur=auteur, cible=reduit.vendeur, note=5)
+        carte = CarteCatalogue.objects.get(pk=reduit.pk)
+        profil = ProfilUtilisateur.objects.get(utilisateur=reduit.vendeur)
+        self.assertEqual((carte.total_avis, carte.note_moyenne), (profil.total_avis, profil.note_moyenne))
+
+        instantane = self._cartes()
+        ProjectionCatalogue.reconstruire()
+        self.assertEqual(self._cartes(), instantane)
+        self.assertEqual(self._catalogue({"tri": "prix_asc"}, "cartes"), self._catalogue({"tri": "prix_asc"}, "sql"))
+
+    def test_categorie_et_lieu_renommes(self):
+        """Renommer une categorie ou un lieu met a jour les cartes de leurs produits."""
+        racine = Categorie.objects.filter(parent=None).first()
+        racine.slug = "racine-renommee"
+        racine.save()
+        lieu = Localisation.objects.filter(produits__statut=Produit.StatutChoices.DISPONIBLE).first()
+        lieu.ville = "Nouvelle-Ville"
+        lieu.save()
+
+        self.assertTrue(CarteCatalogue.objects.filter(chemin_categorie__startswith="/racine-renommee/").exists())
+        for params in [{"categorie": "racine-renommee"}, {"ville": "Nouvelle-Ville"}]:
+            with self.subTest(params=params):
+                resultat = self._catalogue(params, "cartes")
+                self.assertTrue(resultat[0])
+                self.assertEqual(resultat, self._catalogue(params, "sql"))
+
+    def test_categorie_deplacee(self):
+        """Deplacer une categorie met a jour le chemin des cartes de son sous-arbre."""
+        categorie = (
+            Categorie.objects.filter(parent__isnull=False, produits__statut=Produit.StatutChoices.DISPONIBLE)
+            .distinct()
+            .first()
+        )
+        ancien_parent = categorie.parent
+        categorie.parent = None
+        categorie.save()
+
+        self.assertTrue(CarteCatalogue.objects.filter(chemin_categorie__startswith=f"/{categorie.slug}/").exists())
+        for params in [{"categorie": ancien_parent.slug}, {"categorie": categorie.slug}]:
+            with self.subTest(params=params):
+                self.assertEqual(self._catalogue(params, "cartes"), self._catalogue(params, "sql"))
+
+    def test_recherche_et_autres_moteurs(self):
+        """La recherche reste sur les produits; hors mode cartes la table n'est pas tenue."""
+        with mock.patch.object(ProjectionCatalogue, "hydrater") as hydrater:
+            CatalogueService.get_catalogue_context({"q": "tomate"})
+        hydrater.assert_not_called()
+
+        produit = Produit.objects.first()
+        with override_settings(CATALOGUE_MOTEUR="sql"):
+            produit.prix = 3
+            produit.save()
+        self.assertNotEqual(CarteCatalogue.objects.get(pk=produit.pk).prix, 3)
+
+    def test_commande_reconstruction(self):
+        """La commande recopie tous les produits disponibles."""
+        CarteCatalogue.objects.all().delete()
+        sortie = StringIO()
+        call_command("rebuild_cartes_catalogue", stdout=sortie)
+        total = Produit.objects.filter(statut=Produit.StatutChoices.DISPONIBLE).count()
+        self.assertEqual(CarteCatalogue.objects.count(), total)
+        self.assertIn(str(total), sortie.getvalue())
@@ -0,0 +1,57 @@
+"""Backend d'authentification par adresse e-mail, index insensible a la casse."""
+
+from __future__ import annotations
+
+from functools import cache as memoiser
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+from django.db.models import Func, Value
+from django.utils.crypto import get_random_string
+
+
+class EmailNormalise(Func):
+    """``NULLIF(LOWER(email), '')``: expression exacte de l'index unique.
+
+    Le litteral vide est ecrit dans le gabarit et non passe en parametre,
+    sans quoi SQLite ne reconnait plus l'expression indexee.
+    """
+
+    template = "NULLIF(LOWER(%(expressions)s), '')"
+
+
+NOM_INDEX_EMAIL = "connexion_auth_user_email_ci"
+
+
+@memoiser
+def condensat_factice() -> str:
+    """Mot de passe chiffre avec le hacheur par defaut, pour les e-mails inconnus."""
+    return make_password(get_random_string(32))
+
+
+class EmailBackend(ModelBackend):
+    """Authentifie par e-mail en une seule lecture de l'utilisateur.
+
+    La recherche passe par l'index unique ``NOM_INDEX_EMAIL``. Un e-mail
+    inconnu verifie quand meme le mot de passe contre un condensat factice
+    du hacheur courant: l'echec coute le meme temps qu'un vrai controle.
+    Les appels sans ``email`` (admin, ``username``) sont laisses au
+    ``ModelBackend`` suivant.
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if email is None or password is None:
+            return None
+        modele = get_user_model()
+        utilisateur = (
+            modele._default_manager.alias(cle_email=EmailNormalise("email"))
+            .filter(cle_email=EmailNormalise(Value(email)))
+            .first()
+        )
+        if utilisateur is None:
+            check_password(password, condensat_factice())
+            return None
+        if utilisateur.check_password(password) and self.user_can_authenticate(utilisateur):
+            return utilisateur
+        return None
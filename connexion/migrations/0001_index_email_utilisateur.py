@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+
+from connexion.backends import NOM_INDEX_EMAIL, EmailNormalise
+
+
+def creer_index_email(apps, schema_editor):
+    """Index unique sur l'e-mail normalise; les e-mails vides restent libres (NULL)."""
+    modele = apps.get_model(settings.AUTH_USER_MODEL)
+    doublons = list(
+        modele.objects.annotate(cle_email=EmailNormalise("email"))
+        .exclude(cle_email=None)
+        .values("cle_email")
+        .annotate(total=Count("pk"))
+        .filter(total__gt=1)
+        .values_list("cle_email", flat=True)[:10]
+    )
+    if doublons:
+        raise RuntimeError(
+            "Adresses e-mail en double (a la casse pres) a corriger avant migration: "
+            + ", ".join(doublons)
+        )
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f"CREATE UNIQUE INDEX {quote(NOM_INDEX_EMAIL)} ON {quote(modele._meta.db_table)} "
+        f"((NULLIF(LOWER({quote('email')}), '')))"
+    )
+
+
+def supprimer_index_email(apps, schema_editor):
+    schema_editor.execute(f"DROP INDEX {schema_editor.quote_name(NOM_INDEX_EMAIL)}")
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index_email, supprimer_index_email),
+    ]
@@ -1,5 +1,4 @@
 from django.contrib.auth import authenticate, login
-from django.contrib.auth.models import User
 
 class AuthenticationService:
     """
@@ -19,17 +18,9 @@ class AuthenticationService:
         Returns:
             bool: True si l'authentification réussit, False sinon.
         """
-        # Django's authenticate function uses 'username', not 'email'.
-        # We need to fetch the user by email first.
-        try:
-            user = User.objects.get(email=email)
-            # Now we can authenticate with the username
-            authenticated_user = authenticate(request, username=user.username, password=password)
-            if authenticated_user is not None:
-                login(request, authenticated_user)
-                return True
-        except User.DoesNotExist:
-            # User with this email does not exist
-            return False
-        
+        # EmailBackend: une seule lecture de l'utilisateur via l'index e-mail.
+        authenticated_user = authenticate(request, email=email, password=password)
+        if authenticated_user is not None:
+            login(request, authenticated_user)
+            return True
         return False
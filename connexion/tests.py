@@ -1,7 +1,13 @@
+from unittest import mock
+
 from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Value
 from django.test import TestCase
 from django.urls import reverse
 
+from .backends import NOM_INDEX_EMAIL, EmailBackend, EmailNormalise
+
 
 class ConnexionViewTests(TestCase):
     """Tests des flux de connexion/deconnexion."""
@@ -62,3 +68,56 @@ class ConnexionViewTests(TestCase):
         response = self.client.get(self.deconnexion_url)
         self.assertRedirects(response, self.connexion_url)
         self.assertNotIn("_auth_user_id", self.client.session)
+
+
+class EmailBackendTests(TestCase):
+    """Tests du backend e-mail: index insensible a la casse et temps constant."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="bob",
+            email="Bob@Example.com",
+            password="StrongPass123!",
+        )
+        self.backend = EmailBackend()
+
+    def test_authenticate_is_case_insensitive_with_single_query(self):
+        with self.assertNumQueries(1):
+            user = self.backend.authenticate(None, email="bob@EXAMPLE.com", password="StrongPass123!")
+        self.assertEqual(user, self.user)
+        self.assertIsNone(self.backend.authenticate(None, email="bob@example.com", password="WrongPass!"))
+
+    def test_inactive_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save(update_fields=["is_active"])
+        self.assertIsNone(
+            self.backend.authenticate(None, email="bob@example.com", password="StrongPass123!")
+        )
+
+    def test_unknown_email_still_runs_password_hasher(self):
+        with mock.patch("connexion.backends.check_password", return_value=False) as verification:
+            user = self.backend.authenticate(None, email="nobody@example.com", password="StrongPass123!")
+        self.assertIsNone(user)
+        verification.assert_called_once()
+
+    def test_username_login_is_left_to_model_backend(self):
+        self.assertIsNone(self.backend.authenticate(None, username="bob", password="StrongPass123!"))
+        self.assertTrue(self.client.login(username="bob", password="StrongPass123!"))
+
+    def test_email_unique_index_ignores_case_and_blank(self):
+        User.objects.create_user(username="sans_email_1", password="StrongPass123!")
+        User.objects.create_user(username="sans_email_2", password="StrongPass123!")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user(username="bob2", email="BOB@example.COM", password="x")
+
+    def test_lookup_uses_email_index_on_sqlite(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("Plan de requete propre a SQLite.")
+        requete = User.objects.alias(cle_email=EmailNormalise("email")).filter(
+            cle_email=EmailNormalise(Value("bob@example.com"))
+        )
+        sql, params = requete.query.sql_with_params()
+        with connection.cursor() as curseur:
+            curseur.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(str(ligne[-1]) for ligne in curseur.fetchall())
+        self.assertIn(NOM_INDEX_EMAIL, plan)
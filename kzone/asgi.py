@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'kzone.settings')
+# Vues asynchrones du catalogue et de la page detail (acceuil/urls.py).
+os.environ.setdefault('VUES_ASYNC', '1')
 
 application = get_asgi_application()
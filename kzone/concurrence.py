@@ -0,0 +1,58 @@
+"""Execution concurrente de travaux synchrones independants depuis une vue asynchrone.
+
+Les connexions Django sont propres a chaque thread: des requetes SQL ne se
+chevauchent que si elles partent de threads distincts. ``en_parallele``
+confie chaque tache a un thread du pool de la boucle (``thread_sensitive=False``),
+chacun avec sa connexion persistante ou empruntee au pool, et attend le tout.
+Dans une transaction ouverte (``atomic``, ``TestCase``), les autres
+connexions ne verraient pas les ecritures non validees: les taches
+s'executent alors l'une apres l'autre sur la connexion de la requete.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from contextlib import ExitStack
+from typing import Any
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connections
+
+
+def transaction_en_cours() -> bool:
+    """Vrai si une connexion du thread courant est dans un bloc atomique."""
+    return any(connexion.in_atomic_block for connexion in connections.all(initialized_only=True))
+
+
+def _isoler(tache: Callable[[], Any], mesure: Callable | None) -> Callable[[], Any]:
+    """Enveloppe une tache pour un thread du pool: instrumentation puis recyclage des connexions."""
+
+    def executer():
+        try:
+            with ExitStack() as pile:
+                if mesure is not None:
+                    for connexion in connections.all():
+                        pile.enter_context(connexion.execute_wrapper(mesure))
+                return tache()
+        finally:
+            # Respecte CONN_MAX_AGE: la connexion du thread reste reutilisable
+            # ou retourne au pool, comme en fin de requete.
+            close_old_connections()
+
+    return executer
+
+
+async def en_parallele(*taches: Callable[[], Any], mesure: Callable | None = None) -> list[Any]:
+    """Execute des fonctions synchrones independantes et retourne leurs resultats dans l'ordre.
+
+    ``mesure`` est l'``execute_wrapper`` de la requete (``request.mesure_sql``):
+    les requetes des threads du pool restent comptees dans son budget.
+    """
+    if await sync_to_async(transaction_en_cours)():
+        return [await sync_to_async(tache)() for tache in taches]
+    return list(
+        await asyncio.gather(
+            *(sync_to_async(_isoler(tache, mesure), thread_sensitive=False)() for tache in taches)
+        )
+    )
@@ -0,0 +1,134 @@
+"""Configuration des connexions base de donnees pilotee par l'environnement.
+
+Trois strategies, du plus simple au plus economique en connexions:
+
+- SQLite (defaut): connexion persistante par thread, ``DB_CONN_MAX_AGE``;
+- PostgreSQL (``USE_POSTGRES=1``): connexions persistantes verifiees avant
+  reutilisation (``CONN_HEALTH_CHECKS``), une par thread worker;
+- PostgreSQL avec ``DB_POOL=1``: pool cote client ``psycopg_pool`` partage
+  par les threads du processus, borne par ``DB_POOL_MIN_SIZE`` et
+  ``DB_POOL_MAX_SIZE``. Django impose alors ``CONN_MAX_AGE=0``: chaque
+  requete rend sa connexion au pool au lieu de la fermer.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import os
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+def _entier(env: Mapping[str, str], nom: str, defaut: int) -> int:
+    """Lit un entier d'environnement, avec un message clair si invalide."""
+    valeur = env.get(nom, "")
+    try:
+        return int(valeur) if valeur != "" else defaut
+    except ValueError as exc:
+        raise ImproperlyConfigured(f"{nom} doit etre un entier (recu {valeur!r}).") from exc
+
+
+def _flottant(env: Mapping[str, str], nom: str, defaut: float) -> float:
+    """Lit un nombre decimal d'environnement."""
+    valeur = env.get(nom, "")
+    try:
+        return float(valeur) if valeur != "" else defaut
+    except ValueError as exc:
+        raise ImproperlyConfigured(f"{nom} doit etre un nombre (recu {valeur!r}).") from exc
+
+
+def _booleen(env: Mapping[str, str], nom: str, defaut: bool) -> bool:
+    """Lit un drapeau ``1``/``0`` d'environnement."""
+    return env.get(nom, "1" if defaut else "0") == "1"
+
+
+def options_pool(env: Mapping[str, str]) -> dict[str, Any]:
+    """Parametres ``psycopg_pool.ConnectionPool`` (tailles et delais en secondes)."""
+    options = {
+        "min_size": _entier(env, "DB_POOL_MIN_SIZE", 2),
+        "max_size": _entier(env, "DB_POOL_MAX_SIZE", 10),
+        "timeout": _flottant(env, "DB_POOL_TIMEOUT", 10.0),
+        "max_idle": _flottant(env, "DB_POOL_MAX_IDLE", 300.0),
+        "max_lifetime": _flottant(env, "DB_POOL_MAX_LIFETIME", 3600.0),
+        "max_waiting": _entier(env, "DB_POOL_MAX_WAITING", 0),
+    }
+    if not 0 <= options["min_size"] <= options["max_size"] or options["max_size"] < 1:
+        raise ImproperlyConfigured("DB_POOL_MIN_SIZE doit etre compris entre 0 et DB_POOL_MAX_SIZE (>= 1).")
+    return options
+
+
+def configuration_base(env: Mapping[str, str] = os.environ, base_dir: Path | None = None) -> dict[str, Any]:
+    """Entree ``DATABASES['default']`` pour l'environnement donne."""
+    health_checks = _booleen(env, "DB_CONN_HEALTH_CHECKS", True)
+    conn_max_age = _entier(env, "DB_CONN_MAX_AGE", 60)
+
+    if not _booleen(env, "USE_POSTGRES", False):
+        return {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": base_dir / "db.sqlite3" if base_dir is not None else "db.sqlite3",
+            "CONN_MAX_AGE": conn_max_age,
+            "CONN_HEALTH_CHECKS": health_checks,
+        }
+
+    configuration = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": env.get("POSTGRES_DB", "cam_retail"),
+        "USER": env.get("POSTGRES_USER", "postgres"),
+        "PASSWORD": env.get("POSTGRES_PASSWORD", "admin"),
+        "HOST": env.get("POSTGRES_HOST", "localhost"),
+        "PORT": env.get("POSTGRES_PORT", "5432"),
+        "CONN_MAX_AGE": conn_max_age,
+        "CONN_HEALTH_CHECKS": health_checks,
+        "OPTIONS": {"connect_timeout": _entier(env, "POSTGRES_CONNECT_TIMEOUT", 5)},
+    }
+    if _booleen(env, "DB_POOL", False):
+        if importlib.util.find_spec("psycopg_pool") is None:
+            raise ImproperlyConfigured("DB_POOL=1 requiert psycopg 3 et psycopg_pool (psycopg[pool]).")
+        configuration["CONN_MAX_AGE"] = 0
+        configuration["OPTIONS"]["pool"] = options_pool(env)
+    return configuration
+
+
+def configuration_replica(
+    env: Mapping[str, str] = os.environ, base_dir: Path | None = None
+) -> dict[str, Any] | None:
+    """Entree ``DATABASES['replica']`` si ``DB_REPLICA=1``, sinon None.
+
+    Le replica reprend la configuration du primaire: fichier
+    ``DB_REPLICA_NAME`` sous SQLite, hote ``REPLICA_POSTGRES_HOST`` (et port
+    ``REPLICA_POSTGRES_PORT``) sous PostgreSQL. Sous les tests, l'alias
+    reflete la base de test du primaire (``TEST MIRROR``): les transactions
+    de ``TestCase`` y sont visibles.
+    """
+    if not _booleen(env, "DB_REPLICA", False):
+        return None
+    configuration = configuration_base(env, base_dir)
+    if configuration["ENGINE"] == "django.db.backends.sqlite3":
+        defaut = base_dir / "db-replica.sqlite3" if base_dir is not None else "db-replica.sqlite3"
+        configuration["NAME"] = env.get("DB_REPLICA_NAME") or defaut
+    else:
+        configuration["HOST"] = env.get("REPLICA_POSTGRES_HOST", configuration["HOST"])
+        configuration["PORT"] = env.get("REPLICA_POSTGRES_PORT", configuration["PORT"])
+    configuration["TEST"] = {"MIRROR": "default"}
+    return configuration
+
+
+def statistiques_connexions() -> dict[str, dict[str, Any]]:
+    """Etat des connexions de chaque alias: pool (compteurs psycopg_pool) ou persistance."""
+    from django.db import connections
+
+    statistiques = {}
+    for connexion in connections.all(initialized_only=True):
+        pool = getattr(connexion, "pool", None)
+        if pool is not None:
+            statistiques[connexion.alias] = {"mode": "pool", **pool.get_stats()}
+        else:
+            statistiques[connexion.alias] = {
+                "mode": "persistante" if connexion.settings_dict["CONN_MAX_AGE"] else "par_requete",
+                "ouverte": connexion.connection is not None,
+                "conn_max_age": connexion.settings_dict["CONN_MAX_AGE"],
+            }
+    return statistiques
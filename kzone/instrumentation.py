@@ -0,0 +1,203 @@
+"""Instrumentation SQL par requete HTTP: volume, duree et budgets par vue."""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+from kzone.database import statistiques_connexions
+
+logger = logging.getLogger("kzone.sql")
+
+
+class BudgetRequetesDepasse(AssertionError):
+    """Une vue a execute plus de requetes SQL que son budget declare."""
+
+
+@dataclass
+class MesureSQL:
+    """Statistiques SQL cumulees pendant le traitement d'une requete."""
+
+    nombre: int = 0
+    duree: float = 0.0
+    plus_lente_duree: float = 0.0
+    plus_lente_sql: str = ""
+    # Les vues asynchrones executent des requetes depuis plusieurs threads.
+    _verrou: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def __call__(self, execute, sql, params, many, context):
+        """Wrapper ``execute_wrapper``: chronometre chaque instruction executee."""
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duree = time.perf_counter() - debut
+            with self._verrou:
+                self.nombre += 1
+                self.duree += duree
+                if duree >= self.plus_lente_duree:
+                    self.plus_lente_duree = duree
+                    self.plus_lente_sql = sql
+
+    def server_timing(self) -> str:
+        """Valeur de l'en-tete ``Server-Timing`` (durees en millisecondes)."""
+        return (
+            f'sql;dur={self.duree * 1000:.2f};desc="{self.nombre} requetes", '
+            f"sql-max;dur={self.plus_lente_duree * 1000:.2f}"
+        )
+
+
+def budget_requetes(limite: int | dict[str, int]):
+    """Decore une vue fonction avec son budget de requetes SQL.
+
+    Le budget est un entier ou un dict par methode HTTP (``{"GET": 5}``).
+    Les vues classe declarent simplement l'attribut ``budget_requetes``.
+    """
+
+    def decorateur(vue):
+        vue.budget_requetes = limite
+        return vue
+
+    return decorateur
+
+
+class InstrumentationSQLMiddleware:
+    """Mesure les requetes SQL de chaque requete HTTP.
+
+    Le middleware installe un ``execute_wrapper`` sur toutes les connexions,
+    expose la mesure dans ``request.mesure_sql``, dans l'en-tete
+    ``Server-Timing`` et dans un journal structure (``kzone.sql``) qui porte
+    aussi l'etat des connexions ou du pool. Quand la vue declare
+    ``budget_requetes``, un depassement est journalise; avec
+    ``SQL_BUDGETS_STRICTS`` (actif sous le lanceur de tests, voir
+    ``kzone.testing``) il leve ``BudgetRequetesDepasse`` et fait echouer le
+    test. Les budgets comptent une requete anonyme: une requete portant le
+    cookie de session dispose en plus de ``SQL_BUDGET_AUTHENTIFICATION``
+    requetes (lecture de la session et de l'utilisateur).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """Memorise la suite de la chaine de middlewares."""
+        self.get_response = get_response
+        self.est_async = iscoroutinefunction(get_response)
+        if self.est_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """Traite la requete sous instrumentation SQL."""
+        if self.est_async:
+            return self.__acall__(request)
+        mesure, debut = self._demarrer(request)
+        with ExitStack() as pile:
+            self._instrumenter(pile, mesure)
+            response = self.get_response(request)
+        return self._terminer(request, response, mesure, debut)
+
+    async def __acall__(self, request):
+        """Variante ASGI: les connexions vivent dans le thread des appels ``sync_to_async``."""
+        mesure, debut = self._demarrer(request)
+        pile = ExitStack()
+        await sync_to_async(self._instrumenter)(pile, mesure)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(pile.close)()
+        return await sync_to_async(self._terminer)(request, response, mesure, debut)
+
+    @staticmethod
+    def _demarrer(request) -> tuple[MesureSQL, float]:
+        """Attache une mesure vierge a la requete."""
+        request.mesure_sql = MesureSQL()
+        request.budget_requetes = None
+        return request.mesure_sql, time.perf_counter()
+
+    @staticmethod
+    def _instrumenter(pile: ExitStack, mesure: MesureSQL) -> None:
+        """Installe la mesure sur toutes les connexions du thread courant."""
+        # Le wrapper est porte par l'objet connexion de Django, il survit
+        # donc aux (re)connexions effectuees pendant la requete.
+        for connexion in connections.all():
+            pile.enter_context(connexion.execute_wrapper(mesure))
+
+    def _terminer(self, request, response, mesure: MesureSQL, debut: float):
+        """Publie la mesure (en-tete, journal) et controle le budget."""
+        duree_totale = time.perf_counter() - debut
+        response["Server-Timing"] = (
+            f"{mesure.server_timing()}, total;dur={duree_totale * 1000:.2f}"
+        )
+        self._journaliser(request, response, mesure, duree_totale)
+        self._verifier_budget(request, mesure)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Retient le budget declare par la vue resolue."""
+        vue = getattr(view_func, "view_class", view_func)
+        budget = getattr(vue, "budget_requetes", None)
+        if isinstance(budget, dict):
+            budget = budget.get(request.method)
+        if budget is not None and not isinstance(budget, int):
+            raise ImproperlyConfigured(
+                f"budget_requetes de {vue!r} doit etre un entier ou un dict par methode HTTP."
+            )
+        request.budget_requetes = budget
+        request.nom_vue = getattr(vue, "__qualname__", repr(vue))
+        return None
+
+    @staticmethod
+    def _journaliser(request, response, mesure: MesureSQL, duree_totale: float) -> None:
+        """Ecrit une ligne JSON par requete HTTP."""
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        logger.info(
+            json.dumps(
+                {
+                    "methode": request.method,
+                    "chemin": request.path,
+                    "vue": getattr(request, "nom_vue", ""),
+                    "statut": response.status_code,
+                    "requetes": mesure.nombre,
+                    "duree_sql_ms": round(mesure.duree * 1000, 2),
+                    "duree_totale_ms": round(duree_totale * 1000, 2),
+                    "plus_lente_ms": round(mesure.plus_lente_duree * 1000, 2),
+                    "plus_lente_sql": mesure.plus_lente_sql[:500],
+                    "budget": InstrumentationSQLMiddleware._budget_effectif(request),
+                    "connexions": statistiques_connexions(),
+                },
+                ensure_ascii=False,
+            )
+        )
+
+    @staticmethod
+    def _budget_effectif(request) -> int | None:
+        """Budget de la vue, plus la part de l'authentification si la session est envoyee."""
+        budget = request.budget_requetes
+        if budget is not None and settings.SESSION_COOKIE_NAME in request.COOKIES:
+            budget += getattr(settings, "SQL_BUDGET_AUTHENTIFICATION", 0)
+        return budget
+
+    @classmethod
+    def _verifier_budget(cls, request, mesure: MesureSQL) -> None:
+        """Signale, ou leve en mode strict, un depassement du budget de la vue."""
+        budget = cls._budget_effectif(request)
+        if budget is None or mesure.nombre <= budget:
+            return
+        message = (
+            f"{getattr(request, 'nom_vue', request.path)}: {mesure.nombre} requetes SQL "
+            f"pour un budget de {budget} ({request.method} {request.path})"
+        )
+        if getattr(settings, "SQL_BUDGETS_STRICTS", False):
+            raise BudgetRequetesDepasse(message)
+        logger.warning(message)
+
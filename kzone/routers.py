@@ -0,0 +1,173 @@
+"""Routage des lectures du catalogue vers un replica, ecritures sur le primaire.
+
+Seules les lectures executees dans une portee ``lecture_replica`` (contextes
+du catalogue et de la page detail) vont au replica, et seulement si l'alias
+``replica`` est configure. Une ecriture, une methode HTTP non sure ou le
+cookie d'epinglage pose apres une ecriture ramenent les lectures sur le
+primaire: un visiteur relit ce qu'il vient d'ecrire malgre le retard de
+replication, pendant ``REPLICA_EPINGLAGE_SECONDES``.
+
+Essai local avec deux fichiers SQLite::
+
+    cp db.sqlite3 db-replica.sqlite3
+    DB_REPLICA=1 python manage.py runserver
+"""
+
+from __future__ import annotations
+
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ALIAS_REPLICA = "replica"
+COOKIE_EPINGLAGE = "kzone_primaire"
+METHODES_SURES = {"GET", "HEAD", "OPTIONS", "TRACE"}
+INSTRUCTIONS_ECRITURE = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+_lecture_replica: ContextVar[bool] = ContextVar("kzone_lecture_replica", default=False)
+_epingle: ContextVar[bool] = ContextVar("kzone_primaire_epingle", default=False)
+_ecriture: ContextVar[bool] = ContextVar("kzone_ecriture", default=False)
+
+
+def _cible(configuration: dict) -> tuple:
+    """Serveur et base designes par une configuration ``DATABASES``."""
+    return tuple(configuration.get(cle) for cle in ("HOST", "PORT", "NAME"))
+
+
+def replica_disponible() -> bool:
+    """Vrai si l'alias ``replica`` est declare et designe une autre base que le primaire.
+
+    Sous les tests, l'alias en miroir (TEST MIRROR) designe la base du
+    primaire: les lectures y restent, dans la transaction du test.
+    """
+    replica = settings.DATABASES.get(ALIAS_REPLICA)
+    return replica is not None and _cible(replica) != _cible(settings.DATABASES[DEFAULT_DB_ALIAS])
+
+
+@contextmanager
+def lecture_replica():
+    """Portee (ou decorateur) dont les lectures peuvent aller au replica."""
+    jeton = _lecture_replica.set(True)
+    try:
+        yield
+    finally:
+        _lecture_replica.reset(jeton)
+
+
+def lecture_au_replica() -> bool:
+    """Vrai si les lectures de la portee courante sont routees au replica."""
+    return _lecture_replica.get() and not _epingle.get() and replica_disponible()
+
+
+def noter_ecriture() -> None:
+    """Epingle la suite de la requete sur le primaire apres une ecriture."""
+    _epingle.set(True)
+    _ecriture.set(True)
+
+
+def detecter_ecriture(execute, sql, params, many, context):
+    """Wrapper ``execute_wrapper`` du primaire: note les instructions d'ecriture."""
+    if sql.lstrip()[:7].upper().startswith(INSTRUCTIONS_ECRITURE):
+        noter_ecriture()
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def portee_requete(epingle: bool = False):
+    """Etat d'epinglage propre a une requete, restaure a la sortie.
+
+    Produit une fonction indiquant si une ecriture a eu lieu dans la portee.
+    """
+    jetons = (_epingle.set(epingle), _ecriture.set(False))
+    try:
+        yield _ecriture.get
+    finally:
+        _ecriture.reset(jetons[1])
+        _epingle.reset(jetons[0])
+
+
+class RouteurReplica:
+    """Routeur Django: lectures du catalogue au replica, tout le reste au primaire."""
+
+    def db_for_read(self, model, **hints):
+        if lecture_au_replica():
+            return ALIAS_REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, ALIAS_REPLICA}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Le replica recoit le schema par replication, jamais par migration.
+        return db != ALIAS_REPLICA
+
+
+class EpinglagePrimaireMiddleware:
+    """Epingle sur le primaire les requetes qui suivent de pres une ecriture.
+
+    Les instructions d'ecriture executees sur le primaire pendant la requete
+    sont detectees par un ``execute_wrapper`` (``detecter_ecriture``): la
+    suite de la requete lit le primaire. Une requete non sure ou ayant ecrit
+    pose le cookie ``COOKIE_EPINGLAGE`` pour ``REPLICA_EPINGLAGE_SECONDES``;
+    tant qu'il est present, les lectures du navigateur restent sur le
+    primaire.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """Memorise la suite de la chaine de middlewares."""
+        self.get_response = get_response
+        self.est_async = iscoroutinefunction(get_response)
+        if self.est_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """Traite la requete dans sa propre portee d'epinglage."""
+        if self.est_async:
+            return self.__acall__(request)
+        non_sure = request.method not in METHODES_SURES
+        with portee_requete(epingle=non_sure or COOKIE_EPINGLAGE in request.COOKIES) as a_ecrit:
+            with ExitStack() as pile:
+                self._detecter(pile)
+                response = self.get_response(request)
+            ecriture = a_ecrit()
+        return self._epingler(response, non_sure or ecriture)
+
+    async def __acall__(self, request):
+        """Variante ASGI: la portee suit le contexte de la tache de la requete."""
+        non_sure = request.method not in METHODES_SURES
+        with portee_requete(epingle=non_sure or COOKIE_EPINGLAGE in request.COOKIES) as a_ecrit:
+            pile = ExitStack()
+            await sync_to_async(self._detecter)(pile)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(pile.close)()
+            ecriture = a_ecrit()
+        return self._epingler(response, non_sure or ecriture)
+
+    @staticmethod
+    def _detecter(pile: ExitStack) -> None:
+        """Installe la detection des ecritures sur la connexion primaire du thread courant."""
+        pile.enter_context(connections[DEFAULT_DB_ALIAS].execute_wrapper(detecter_ecriture))
+
+    @staticmethod
+    def _epingler(response, epingler: bool):
+        """Pose le cookie d'epinglage apres une ecriture ou une requete non sure."""
+        if replica_disponible() and epingler:
+            response.set_cookie(
+                COOKIE_EPINGLAGE,
+                "1",
+                max_age=settings.REPLICA_EPINGLAGE_SECONDES,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
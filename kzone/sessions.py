@@ -0,0 +1,49 @@
+"""Strategie de session: aucune session ni ``Vary: Cookie`` pour la navigation anonyme."""
+
+from __future__ import annotations
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.utils.cache import patch_cache_control
+
+
+def session_lecture_seule(vue):
+    """Marque une vue fonction comme consultable sans session par les anonymes.
+
+    Les vues classe declarent simplement l'attribut ``session_lecture_seule``.
+    """
+    vue.session_lecture_seule = True
+    return vue
+
+
+class SessionStrategieMiddleware(SessionMiddleware):
+    """``SessionMiddleware`` qui ignore la session des anonymes sur les vues de lecture.
+
+    Sur une vue ``session_lecture_seule``, une requete sans cookie de session
+    dont la session n'a pas ete modifiee ne cree aucune ligne et ne recoit
+    pas ``Vary: Cookie``: la lecture de ``request.user`` par les gabarits ne
+    suffit plus a rendre la reponse dependante des cookies. La reponse passe
+    en ``Cache-Control: private`` pour qu'un cache partage ne la serve pas a
+    un visiteur connecte. Ailleurs, comportement standard de Django; le
+    moteur de stockage reste celui de ``SESSION_ENGINE``.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """Retient si la vue resolue se passe de session pour les anonymes."""
+        vue = getattr(view_func, "view_class", view_func)
+        request.session_lecture_seule = getattr(vue, "session_lecture_seule", False)
+        return None
+
+    def process_response(self, request, response):
+        """Neutralise la session d'une lecture anonyme avant l'enregistrement standard."""
+        session = getattr(request, "session", None)
+        if (
+            session is not None
+            and getattr(request, "session_lecture_seule", False)
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and not session.modified
+        ):
+            if session.accessed:
+                patch_cache_control(response, private=True)
+            session.accessed = False
+        return super().process_response(request, response)
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 import os
 from pathlib import Path
 
+from kzone.database import configuration_base, configuration_replica
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,8 +47,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'kzone.instrumentation.InstrumentationSQLMiddleware',
+    'kzone.routers.EpinglagePrimaireMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'kzone.sessions.SessionStrategieMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -73,25 +77,120 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'kzone.wsgi.application'
 
+# Variantes asynchrones des vues catalogue et detail: actives par defaut sous
+# ASGI (kzone/asgi.py), ou VUES_ASYNC=1. Sous WSGI, chaque requete devrait
+# sinon demarrer sa propre boucle d'evenements.
+
+VUES_ASYNC = os.getenv('VUES_ASYNC', '0') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Connexions persistantes verifiees, ou pool psycopg_pool (DB_POOL=1) sous
+# PostgreSQL: voir kzone/database.py pour les variables d'environnement.
+
 DATABASES = {
+    'default': configuration_base(os.environ, BASE_DIR),
+}
+
+# Replica optionnel (DB_REPLICA=1) pour les lectures du catalogue et de la
+# page detail; une ecriture epingle le visiteur sur le primaire quelques
+# secondes (kzone/routers.py). Sous les tests, l'alias reflete la base de
+# test du primaire (TEST MIRROR).
+
+if replica := configuration_replica(os.environ, BASE_DIR):
+    DATABASES['replica'] = replica
+
+DATABASE_ROUTERS = ['kzone.routers.RouteurReplica']
+
+REPLICA_EPINGLAGE_SECONDES = int(os.getenv('DB_REPLICA_PIN_SECONDS', '5'))
+
+# Cache des fragments HTML du catalogue: memoire locale par defaut,
+# Redis partage entre processus si REDIS_URL est defini.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql'
-        if os.getenv('USE_POSTGRES', '0') == '1'
-        else 'django.db.backends.sqlite3',
-        'NAME': os.getenv('POSTGRES_DB', 'cam_retail')
-        if os.getenv('USE_POSTGRES', '0') == '1'
-        else BASE_DIR / 'db.sqlite3',
-        'USER': os.getenv('POSTGRES_USER', 'postgres'),
-        'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'admin'),
-        'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
-        'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache'
+        if os.getenv('REDIS_URL')
+        else 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.getenv('REDIS_URL', 'kzone-catalogue'),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', '86400')),
     }
 }
 
+# Les caches qui ne s'invalident que par suppression (pages detail) exigent un
+# cache vu par tous les processus: en memoire locale, un autre worker servirait
+# l'ancienne page jusqu'a expiration.
+CACHE_PARTAGE = os.getenv('CACHE_PARTAGE', '1' if os.getenv('REDIS_URL') else '0') == '1'
+
+
+# Moteur de selection du catalogue: "sql" interroge la base a chaque filtre;
+# "colonnes" garde par processus un instantane NumPy des produits disponibles
+# (annonces/colonnes.py, requiert numpy); "bitmaps" un bitset par valeur de
+# facette et tranche de prix (annonces/bitmaps.py). Les deux sont tenus a
+# jour par le journal EvenementCatalogue, la base ne chargeant plus que la
+# page visible. "cartes" lit la liste sur la table denormalisee CarteCatalogue,
+# tenue a jour a chaque ecriture (annonces/projection.py); la reconstruire
+# avec manage.py rebuild_cartes_catalogue a l'activation.
+
+CATALOGUE_MOTEUR = os.getenv('CATALOGUE_MOTEUR', 'sql')
+CATALOGUE_EVENEMENTS_RETENTION = int(os.getenv('CATALOGUE_EVENEMENTS_RETENTION', '86400'))
+
+
+# Sessions: les vues de lecture du catalogue n'en creent pas pour les
+# anonymes (kzone.sessions). Avec un cache partage (Redis), les sessions des
+# utilisateurs connectes sont lues dans le cache et ecrites a travers lui en
+# base; un cache memoire local, propre a chaque processus, garderait une
+# session deconnectee ailleurs: la base seule est alors utilisee.
+
+SESSION_ENGINE = os.getenv(
+    'SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db'
+    if os.getenv('REDIS_URL')
+    else 'django.contrib.sessions.backends.db',
+)
+
+
+# Instrumentation SQL par requete: un depassement des budgets de requetes
+# declares par les vues est journalise. Le lanceur de tests (TEST_RUNNER) le
+# rend bloquant, comme SQL_BUDGETS_STRICTS=1 en integration continue.
+
+SQL_BUDGETS_STRICTS = os.getenv('SQL_BUDGETS_STRICTS', '0') == '1'
+
+# Les budgets des vues comptent une requete anonyme; une requete portant le
+# cookie de session lit en plus la session et l'utilisateur.
+SQL_BUDGET_AUTHENTIFICATION = 2
+
+TEST_RUNNER = 'kzone.testing.LanceurTests'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'brut': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'brut'},
+    },
+    'loggers': {
+        'kzone.sql': {
+            'handlers': ['console'],
+            'level': os.getenv('SQL_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+
+# Connexion par e-mail (index unique insensible a la casse); le ModelBackend
+# reste en place pour l'admin, qui s'authentifie par nom d'utilisateur.
+
+AUTHENTICATION_BACKENDS = [
+    'connexion.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
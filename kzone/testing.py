@@ -0,0 +1,24 @@
+"""Lanceur de tests du projet."""
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class LanceurTests(DiscoverRunner):
+    """Lanceur par defaut, budgets de requetes SQL stricts pendant les tests.
+
+    Un depassement de ``budget_requetes`` leve ``BudgetRequetesDepasse`` et
+    fait echouer le test; hors tests (serveur de developpement compris), il
+    est seulement journalise sauf ``SQL_BUDGETS_STRICTS=1``.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        """Active le mode strict pour toute la session de tests."""
+        super().setup_test_environment(**kwargs)
+        self._budgets_stricts = settings.SQL_BUDGETS_STRICTS
+        settings.SQL_BUDGETS_STRICTS = True
+
+    def teardown_test_environment(self, **kwargs):
+        """Restaure le reglage d'origine."""
+        settings.SQL_BUDGETS_STRICTS = self._budgets_stricts
+        super().teardown_test_environment(**kwargs)
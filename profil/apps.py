@@ -9,3 +9,7 @@ class ProfilConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "profil"
 
+
+    def ready(self) -> None:
+        """Branche les signaux de maintenance de la reputation."""
+        from . import signals  # noqa: F401
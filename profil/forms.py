@@ -4,6 +4,7 @@ from __future__ import annotations
 
 from django import forms
 
+from annonces.localisations import RegistreLocalisations
 from annonces.models import Localisation
 
 from .models import ProfilUtilisateur
@@ -46,11 +47,13 @@ class ProfilIdentiteForm(forms.ModelForm):
         self.user = user
         if user:
             self.fields["full_name"].initial = f"{user.first_name} {user.last_name}".strip()
-        if self.instance and self.instance.localisation_defaut:
-            localisation = self.instance.localisation_defaut
-            self.fields["region"].initial = localisation.region
-            self.fields["ville"].initial = localisation.ville
-            self.fields["quartier"].initial = localisation.quartier
+        if self.instance and self.instance.localisation_defaut_id:
+            lieu = RegistreLocalisations.lieu(self.instance.localisation_defaut_id)
+            if lieu is not None:
+                region, ville, quartier = lieu
+                self.fields["region"].initial = region
+                self.fields["ville"].initial = ville
+                self.fields["quartier"].initial = quartier
 
     def clean_full_name(self) -> str:
         """Verifie qu'un nom complet est present."""
@@ -73,12 +76,7 @@ class ProfilIdentiteForm(forms.ModelForm):
         ville = self.cleaned_data.get("ville", "").strip()
         quartier = self.cleaned_data.get("quartier", "").strip()
         if region and ville and quartier:
-            localisation, _ = Localisation.objects.get_or_create(
-                region=region,
-                ville=ville,
-                quartier=quartier,
-            )
-            profil.localisation_defaut = localisation
+            profil.localisation_defaut_id = RegistreLocalisations.interner(region, ville, quartier)
 
         if commit:
             profil.save()
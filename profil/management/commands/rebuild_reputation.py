@@ -0,0 +1,15 @@
+"""Commande de reconstruction de la reputation denormalisee des vendeurs."""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from profil.models import ProfilUtilisateur
+
+
+class Command(BaseCommand):
+    help = "Recalcule note moyenne, nombre d'avis et histogramme des notes de chaque profil."
+
+    def handle(self, *args, **options):
+        total = ProfilUtilisateur.reconstruire_reputation()
+        self.stdout.write(self.style.SUCCESS(f"{total} profils de reputation reconstruits."))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:06
+
+import annonces.stockage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profil', '0002_profilutilisateur_type_vendeur'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profilutilisateur',
+            name='photo_profil',
+            field=models.FileField(blank=True, null=True, storage=annonces.stockage.StockageContenu(), upload_to='profil/photos/'),
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+def initialiser_reputation(apps, schema_editor):
+    """Calcule la reputation des profils a partir des avis existants, par lots."""
+    AvisConfiance = apps.get_model("profil", "AvisConfiance")
+    ProfilUtilisateur = apps.get_model("profil", "ProfilUtilisateur")
+    agregats = {
+        ligne.pop("cible_id"): ligne
+        for ligne in AvisConfiance.objects.values("cible_id")
+        .annotate(
+            total=models.Count("id"),
+            somme=models.Sum("note"),
+            **{f"avis_{note}": models.Count("id", filter=models.Q(note=note)) for note in range(1, 6)},
+        )
+        .order_by()
+    }
+    ProfilUtilisateur.objects.bulk_create(
+        [ProfilUtilisateur(utilisateur_id=cible_id) for cible_id in agregats],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    profils = list(ProfilUtilisateur.objects.filter(utilisateur_id__in=list(agregats)))
+    for profil in profils:
+        ligne = agregats[profil.utilisateur_id]
+        profil.total_avis = ligne["total"]
+        profil.note_moyenne = ligne["somme"] / ligne["total"]
+        for note in range(1, 6):
+            setattr(profil, f"avis_{note}", ligne[f"avis_{note}"])
+    ProfilUtilisateur.objects.bulk_update(
+        profils,
+        ["note_moyenne", "total_avis", *(f"avis_{note}" for note in range(1, 6))],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profil', '0003_alter_profilutilisateur_photo_profil'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilutilisateur',
+            name='avis_1',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profilutilisateur',
+            name='avis_2',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profilutilisateur',
+            name='avis_3',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profilutilisateur',
+            name='avis_4',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profilutilisateur',
+            name='avis_5',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profilutilisateur',
+            name='note_moyenne',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='profilutilisateur',
+            name='total_avis',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(initialiser_reputation, migrations.RunPython.noop),
+    ]
@@ -2,9 +2,10 @@
 
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
 
 from annonces.models import Localisation
+from annonces.stockage import stockage_contenu
 
 User = get_user_model()
 
@@ -30,7 +31,12 @@ class ProfilUtilisateur(models.Model):
         on_delete=models.CASCADE,
         related_name="profil_utilisateur",
     )
-    photo_profil = models.FileField(upload_to="profil/photos/", blank=True, null=True)
+    photo_profil = models.FileField(
+        upload_to="profil/photos/",
+        storage=stockage_contenu,
+        blank=True,
+        null=True,
+    )
     localisation_defaut = models.ForeignKey(
         Localisation,
         on_delete=models.SET_NULL,
@@ -52,10 +58,119 @@ class ProfilUtilisateur(models.Model):
     badge_trustcam = models.BooleanField(default=False)
     date_mise_a_jour = models.DateTimeField(auto_now=True)
 
+    # Reputation denormalisee, tenue par les signaux de AvisConfiance et
+    # reconstructible via ``manage.py rebuild_reputation``.
+    note_moyenne = models.FloatField(default=0, editable=False)
+    total_avis = models.PositiveIntegerField(default=0, editable=False)
+    avis_1 = models.PositiveIntegerField(default=0, editable=False)
+    avis_2 = models.PositiveIntegerField(default=0, editable=False)
+    avis_3 = models.PositiveIntegerField(default=0, editable=False)
+    avis_4 = models.PositiveIntegerField(default=0, editable=False)
+    avis_5 = models.PositiveIntegerField(default=0, editable=False)
+
+    NOTES = range(1, 6)
+    CHAMPS_REPUTATION = ("note_moyenne", "total_avis", *(f"avis_{note}" for note in NOTES))
+
     def __str__(self) -> str:
         """Retourne une representation concise du profil."""
         return f"Profil de {self.utilisateur.username}"
 
+    def save(self, *args, **kwargs) -> None:
+        """Enregistre le profil sans reecrire la reputation.
+
+        La reputation n'est ecrite que par ``ajuster_reputation`` (UPDATE
+        atomique) et ``reconstruire_reputation``: un profil charge avant un
+        ajustement concurrent ne doit pas ecraser les compteurs.
+        """
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            differes = self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                champ.name
+                for champ in self._meta.concrete_fields
+                if not champ.primary_key
+                and champ.attname not in differes
+                and champ.name not in self.CHAMPS_REPUTATION
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def repartition_notes(self) -> list[dict[str, int]]:
+        """Histogramme des notes, de 5 a 1 etoile, avec la part de chaque note."""
+        return [
+            {
+                "note": note,
+                "total": getattr(self, f"avis_{note}"),
+                "pourcentage": round(100 * getattr(self, f"avis_{note}") / self.total_avis)
+                if self.total_avis
+                else 0,
+            }
+            for note in reversed(self.NOTES)
+        ]
+
+    @classmethod
+    def ajuster_reputation(cls, utilisateur_id: int, note: int, delta: int) -> None:
+        """Ajoute ou retire un avis de ``note`` en une seule mise a jour atomique.
+
+        La moyenne est recalculee dans le meme UPDATE a partir de l'histogramme:
+        deux avis concurrents ne peuvent pas s'ecraser. Sans profil, un retrait
+        n'a rien a retirer (le profil peut avoir ete supprime en cascade avec
+        son utilisateur); un ajout cree le profil si l'utilisateur existe.
+        """
+        total = models.F("total_avis") + delta
+        somme = sum(valeur * models.F(f"avis_{valeur}") for valeur in cls.NOTES) + note * delta
+        mis_a_jour = cls.objects.filter(utilisateur_id=utilisateur_id).update(
+            **{f"avis_{note}": models.F(f"avis_{note}") + delta},
+            total_avis=total,
+            note_moyenne=models.Case(
+                models.When(total_avis__lte=-delta, then=models.Value(0.0)),
+                default=models.ExpressionWrapper(
+                    somme * 1.0 / total, output_field=models.FloatField()
+                ),
+            ),
+        )
+        if mis_a_jour or delta < 0 or not User.objects.filter(pk=utilisateur_id).exists():
+            return
+        cls.objects.get_or_create(utilisateur_id=utilisateur_id)
+        cls.reconstruire_reputation([utilisateur_id])
+
+    @classmethod
+    def reconstruire_reputation(cls, utilisateur_ids=None) -> int:
+        """Recalcule la reputation depuis les avis, retourne le nombre de profils mis a jour."""
+        avis = AvisConfiance.objects.all()
+        profils = cls.objects.all()
+        if utilisateur_ids is not None:
+            avis = avis.filter(cible_id__in=utilisateur_ids)
+            profils = profils.filter(utilisateur_id__in=utilisateur_ids)
+        agregats = {
+            ligne.pop("cible_id"): ligne
+            for ligne in avis.values("cible_id")
+            .annotate(
+                total=models.Count("id"),
+                somme=models.Sum("note"),
+                **{
+                    f"avis_{note}": models.Count("id", filter=models.Q(note=note))
+                    for note in cls.NOTES
+                },
+            )
+            .order_by()
+        }
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(utilisateur_id=utilisateur_id) for utilisateur_id in agregats],
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+            a_jour = []
+            for profil in profils.only("id", "utilisateur_id", *cls.CHAMPS_REPUTATION):
+                ligne = agregats.get(profil.utilisateur_id, {})
+                profil.total_avis = ligne.get("total", 0)
+                profil.note_moyenne = ligne["somme"] / ligne["total"] if ligne else 0.0
+                for note in cls.NOTES:
+                    setattr(profil, f"avis_{note}", ligne.get(f"avis_{note}", 0))
+                a_jour.append(profil)
+            cls.objects.bulk_update(a_jour, cls.CHAMPS_REPUTATION, batch_size=1000)
+        return len(a_jour)
+
 
 class AvisConfiance(models.Model):
     """Avis de confiance permettant de calculer la note moyenne d'un utilisateur."""
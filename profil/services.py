@@ -5,9 +5,8 @@ from __future__ import annotations
 from typing import Any
 
 from django.contrib.auth import get_user_model
-from django.db.models import Avg
 
-from .models import AvisConfiance, ProfilUtilisateur
+from .models import ProfilUtilisateur
 
 User = get_user_model()
 
@@ -25,15 +24,10 @@ class ProfilService:
     def get_dashboard_context(utilisateur: User) -> dict[str, Any]:
         """Construit le contexte du tableau de bord de confiance."""
         profil = ProfilService.get_or_create_profil(utilisateur)
-        moyenne = (
-            AvisConfiance.objects.filter(cible=utilisateur).aggregate(moyenne=Avg("note"))[
-                "moyenne"
-            ]
-            or 0
-        )
         return {
             "profil": profil,
-            "note_moyenne": round(float(moyenne), 2),
-            "total_avis": AvisConfiance.objects.filter(cible=utilisateur).count(),
+            "note_moyenne": round(profil.note_moyenne, 2),
+            "total_avis": profil.total_avis,
+            "repartition_notes": profil.repartition_notes,
         }
 
@@ -0,0 +1,53 @@
+"""Signaux de maintenance de la reputation denormalisee des vendeurs."""
+
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from annonces.models import VersionCatalogue
+from annonces.projection import ProjectionCatalogue
+
+from .models import AvisConfiance, ProfilUtilisateur
+
+
+@receiver(pre_save, sender=AvisConfiance, dispatch_uid="profil_reputation_avis_pre_save")
+def memoriser_avis_initial(sender, instance: AvisConfiance, raw: bool = False, **kwargs) -> None:
+    """Memorise la cible et la note persistees avant la mise a jour."""
+    instance._avis_initial = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._avis_initial = (
+        AvisConfiance.objects.filter(pk=instance.pk).values_list("cible_id", "note").first()
+    )
+
+
+@receiver(post_save, sender=AvisConfiance, dispatch_uid="profil_reputation_avis_post_save")
+def ajuster_reputation_apres_enregistrement(
+    sender, instance: AvisConfiance, raw: bool = False, **kwargs
+) -> None:
+    """Deplace l'avis dans l'histogramme de sa cible si sa note ou sa cible change."""
+    if raw:
+        return
+    initial = getattr(instance, "_avis_initial", None)
+    courant = (instance.cible_id, int(instance.note))
+    if initial == courant:
+        return
+    with transaction.atomic():
+        if initial is not None:
+            ProfilUtilisateur.ajuster_reputation(*initial, delta=-1)
+        ProfilUtilisateur.ajuster_reputation(*courant, delta=1)
+        # La reputation s'affiche sur les cartes: invalider les ETags du catalogue.
+        VersionCatalogue.incrementer()
+        # ajuster_reputation ecrit par update(): aucun signal du profil.
+        ProjectionCatalogue.rafraichir_vendeurs({courant[0], initial[0] if initial else courant[0]})
+
+
+@receiver(post_delete, sender=AvisConfiance, dispatch_uid="profil_reputation_avis_post_delete")
+def ajuster_reputation_apres_suppression(sender, instance: AvisConfiance, **kwargs) -> None:
+    """Retire l'avis supprime de l'histogramme de sa cible."""
+    with transaction.atomic():
+        ProfilUtilisateur.ajuster_reputation(instance.cible_id, int(instance.note), delta=-1)
+        VersionCatalogue.incrementer()
+        ProjectionCatalogue.rafraichir_vendeurs([instance.cible_id])
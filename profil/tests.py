@@ -1,10 +1,17 @@
 """Tests fonctionnels de l'application profil."""
 
+from io import StringIO
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from annonces.models import Localisation
+from annonces.localisations import RegistreLocalisations
+from annonces.models import Categorie, Localisation, Produit
 
 from .models import AvisConfiance, ProfilUtilisateur
 
@@ -54,6 +61,9 @@ class TestsFonctionnelsDashboardProfil(TestFonctionnelCase):
     def setUp(self):
         """Preparation des utilisateurs de test."""
         super().setUp()
+        # Le registre des localisations est valide par la version des localisations,
+        # revenue a une valeur anterieure au rollback du test precedent.
+        RegistreLocalisations.reinitialiser()
         self.utilisateur = User.objects.create_user(
             username="luc",
             email="luc@example.com",
@@ -129,3 +139,99 @@ class TestsFonctionnelsDashboardProfil(TestFonctionnelCase):
         self.assertEqual(response.context["note_moyenne"], 4.0)
         self.assertEqual(response.context["total_avis"], 1)
 
+
+class TestsReputationDenormalisee(TestFonctionnelCase):
+    """Valide la reputation stockee sur le profil et tenue par les avis."""
+
+    def setUp(self):
+        """Preparation d'un vendeur et de trois acheteurs."""
+        super().setUp()
+        self.vendeur = User.objects.create_user(username="vendeur", password="StrongPass123!")
+        self.autre_vendeur = User.objects.create_user(username="autre", password="StrongPass123!")
+        self.acheteurs = [
+            User.objects.create_user(username=f"acheteur{index}", password="StrongPass123!")
+            for index in range(3)
+        ]
+
+    def _reputation(self, utilisateur: User) -> tuple:
+        """Lit la reputation persistee d'un utilisateur."""
+        return ProfilUtilisateur.objects.values_list(
+            "note_moyenne", "total_avis", "avis_1", "avis_2", "avis_3", "avis_4", "avis_5"
+        ).get(utilisateur=utilisateur)
+
+    def test_creation_modification_suppression(self):
+        """Moyenne, total et histogramme suivent chaque ecriture d'avis."""
+        avis = [
+            AvisConfiance.objects.create(auteur=acheteur, cible=self.vendeur, note=note)
+            for acheteur, note in zip(self.acheteurs, (5, 4, 4))
+        ]
+        self.assertEqual(self._reputation(self.vendeur), (13 / 3, 3, 0, 0, 0, 2, 1))
+
+        avis[0].note = 1
+        avis[0].save()
+        self.assertEqual(self._reputation(self.vendeur), (3.0, 3, 1, 0, 0, 2, 0))
+
+        avis[1].cible = self.autre_vendeur
+        avis[1].save()
+        self.assertEqual(self._reputation(self.vendeur), (2.5, 2, 1, 0, 0, 1, 0))
+        self.assertEqual(self._reputation(self.autre_vendeur), (4.0, 1, 0, 0, 0, 1, 0))
+
+        for element in avis:
+            element.delete()
+        self.assertEqual(self._reputation(self.vendeur), (0.0, 0, 0, 0, 0, 0, 0))
+
+    def test_suppression_d_un_utilisateur_note(self):
+        """Supprimer un vendeur note ne recree pas son profil en cascade."""
+        for acheteur, note in zip(self.acheteurs, (5, 3)):
+            AvisConfiance.objects.create(auteur=acheteur, cible=self.vendeur, note=note)
+        AvisConfiance.objects.create(auteur=self.vendeur, cible=self.autre_vendeur, note=4)
+        vendeur_id = self.vendeur.id
+
+        self.vendeur.delete()
+        connection.check_constraints()
+        self.assertFalse(ProfilUtilisateur.objects.filter(utilisateur_id=vendeur_id).exists())
+        self.assertEqual(self._reputation(self.autre_vendeur), (0.0, 0, 0, 0, 0, 0, 0))
+
+    def test_enregistrement_sans_ecraser_la_reputation(self):
+        """Un profil charge avant un nouvel avis ne reecrit pas les compteurs."""
+        AvisConfiance.objects.create(auteur=self.acheteurs[0], cible=self.vendeur, note=5)
+        profil = ProfilUtilisateur.objects.get(utilisateur=self.vendeur)
+        AvisConfiance.objects.create(auteur=self.acheteurs[1], cible=self.vendeur, note=3)
+
+        profil.numero_paiement = "677000000"
+        profil.save()
+        self.assertEqual(self._reputation(self.vendeur), (4.0, 2, 0, 0, 1, 0, 1))
+        self.assertEqual(ProfilUtilisateur.objects.get(pk=profil.pk).numero_paiement, "677000000")
+
+    def test_commande_de_reconstruction(self):
+        """La commande recalcule une reputation desynchronisee."""
+        for acheteur, note in zip(self.acheteurs, (2, 3, 5)):
+            AvisConfiance.objects.create(auteur=acheteur, cible=self.vendeur, note=note)
+        attendu = self._reputation(self.vendeur)
+        ProfilUtilisateur.objects.update(note_moyenne=0, total_avis=0, avis_5=9)
+
+        call_command("rebuild_reputation", stdout=StringIO())
+        self.assertEqual(self._reputation(self.vendeur), attendu)
+        repartition = ProfilUtilisateur.objects.get(utilisateur=self.vendeur).repartition_notes
+        self.assertEqual(
+            [(ligne["note"], ligne["pourcentage"]) for ligne in repartition],
+            [(5, 33), (4, 0), (3, 33), (2, 33), (1, 0)],
+        )
+
+    def test_detail_sans_agregat_sur_les_avis(self):
+        """La page detail lit la reputation sur le profil du vendeur."""
+        cache.clear()
+        AvisConfiance.objects.create(auteur=self.acheteurs[0], cible=self.vendeur, note=4)
+        produit = Produit.objects.create(
+            vendeur=self.vendeur,
+            categorie=Categorie.objects.create(nom="Telephones", slug="telephones"),
+            lieu_vente=Localisation.objects.create(
+                region=Localisation.RegionChoices.LITTORAL, ville="Douala", quartier="Akwa"
+            ),
+            titre="Tecno Spark",
+            prix=60000,
+        )
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse("acceuil:annonce_detail", args=[produit.id]))
+        self.assertEqual((response.context["note_moyenne"], response.context["total_avis"]), (4.0, 1))
+        self.assertFalse(any("profil_avisconfiance" in requete["sql"] for requete in requetes))
@@ -13,6 +13,12 @@ class ProfilDashboardView(LoginRequiredMixin, View):
     """Affiche et met a jour les informations profil et finance."""
 
     template_name = "profil/dashboard.html"
+    # Hors lecture de la session et de l'utilisateur (SQL_BUDGET_AUTHENTIFICATION).
+    # POST: 22 requetes pour le formulaire et ses signaux, plus la version des
+    # localisations relue par leur registre et le rechargement de son
+    # instantane (quand le formulaire vient de creer une localisation), plus
+    # le report du profil sur les cartes du catalogue (CATALOGUE_MOTEUR=cartes).
+    budget_requetes = {"GET": 14, "POST": 25}
 
     def get(self, request, *args, **kwargs):
         """Affiche le tableau de bord profil avec les formulaires."""